@@ -4,9 +4,35 @@ Handles formatting and comparison of attendance data.
 
 Attendance shape (from browser.py):
   { subject_name: { "present": int, "total": int } }
+
+Every function accepts either that dict or a snapshot.Snapshot (the
+compact form scrapes and the store hand out); iter_rows() hides the
+difference.
 """
 
 import math
+from datetime import datetime
+
+from snapshot import Snapshot
+
+
+def iter_rows(attendance):
+    """(subject, present, total) from a Snapshot or a plain dict."""
+    if isinstance(attendance, Snapshot):
+        return attendance.rows()
+    return ((subject, data['present'], data['total']) for subject, data in attendance.items())
+
+
+def _counts_lookup(attendance):
+    """subject -> (present, total) or None, for either representation."""
+    if isinstance(attendance, Snapshot):
+        return attendance.counts_map().get
+
+    def counts(subject):
+        data = attendance.get(subject)
+        return (data['present'], data['total']) if data is not None else None
+
+    return counts
 
 
 # ─── Short name helper ────────────────────────────────────────────────────────
@@ -46,8 +72,7 @@ def format_attendance_short(attendance: dict) -> str:
     lines.append(f"{'Sub':<10} {'P/T':<8} {'Pct':>5}")
     lines.append("─" * 26)
 
-    for subject, data in attendance.items():
-        present, total = data['present'], data['total']
+    for subject, present, total in iter_rows(attendance):
         short = to_short_name(subject)
         emoji = get_emoji(present, total)
         pct = get_pct(present, total)
@@ -62,6 +87,9 @@ def format_attendance_short(attendance: dict) -> str:
 # ─── Total percentage ─────────────────────────────────────────────────────────
 
 def total_percentage(attendance: dict) -> str:
+    if isinstance(attendance, Snapshot):
+        return get_pct(*attendance.totals())
+
     total_present = 0
     total_classes = 0
 
@@ -76,8 +104,7 @@ def total_percentage(attendance: dict) -> str:
 
 def format_attendance_full(attendance: dict) -> str:
     lines = []
-    for subject, data in attendance.items():
-        present, total = data['present'], data['total']
+    for subject, present, total in iter_rows(attendance):
         emoji = get_emoji(present, total)
         pct = get_pct(present, total)
         lines.append(f"{emoji} {subject}: {present}/{total} ({pct})")
@@ -92,17 +119,16 @@ def format_attendance_full(attendance: dict) -> str:
 
 def format_low_attendance(attendance: dict, threshold: int = 75) -> str | None:
     low = [
-        (subject, data)
-        for subject, data in attendance.items()
-        if data['total'] > 0 and (data['present'] / data['total']) * 100 < threshold
+        (subject, present, total)
+        for subject, present, total in iter_rows(attendance)
+        if total > 0 and (present / total) * 100 < threshold
     ]
 
     if not low:
         return None
 
     lines = []
-    for subject, data in low:
-        present, total = data['present'], data['total']
+    for subject, present, total in low:
         short = to_short_name(subject)
         pct = get_pct(present, total)
         needed = lectures_needed_for_75(present, total)
@@ -126,11 +152,101 @@ def compare_attendance(old_att: dict, new_att: dict) -> list:
     Returns list of changed subjects:
     [{ 'subject': str, 'old': {present, total}, 'current': {present, total} }]
     """
+    # The common case for a poll: nothing moved at all
+    if isinstance(old_att, Snapshot) and isinstance(new_att, Snapshot) and old_att.data == new_att.data:
+        return []
+
     changes = []
+    old_counts = _counts_lookup(old_att)
 
-    for subject, current in new_att.items():
-        old = old_att.get(subject, {'present': 0, 'total': 0})
-        if old['present'] == current['present'] and old['total'] != current['total']:
-            changes.append({'subject': subject, 'old': old, 'current': current})
+    for subject, present, total in iter_rows(new_att):
+        old_present, old_total = old_counts(subject) or (0, 0)
+        if old_present == present and old_total != total:
+            changes.append({
+                'subject': subject,
+                'old': {'present': old_present, 'total': old_total},
+                'current': {'present': present, 'total': total},
+            })
 
     return changes
+
+
+# ─── History: delta between snapshots ────────────────────────────────────────
+
+def attendance_delta(old_att: dict, new_att: dict) -> dict:
+    """Subjects from new_att whose present/total differ from old_att."""
+    old_counts = _counts_lookup(old_att)
+    return {
+        subject: {'present': present, 'total': total}
+        for subject, present, total in iter_rows(new_att)
+        if old_counts(subject) != (present, total)
+    }
+
+
+# ─── Format: history of changes (/history) ───────────────────────────────────
+
+def describe_change(old: dict | None, current: dict) -> str:
+    if old is None:
+        return 'first seen'
+    attended = current['present'] - old['present']
+    missed = (current['total'] - old['total']) - attended
+    parts = []
+    if attended:
+        parts.append(f"+{attended} attended")
+    if missed:
+        parts.append(f"{missed} missed" if missed > 0 else f"{-missed} corrected")
+    return ', '.join(parts) or 'no change'
+
+
+def format_history(events: list, subject: str | None = None) -> str:
+    """events: newest first, as returned by UserStore.history()."""
+    if not events:
+        return 'No attendance history recorded yet.'
+
+    title = f"🕘 *History — {to_short_name(subject)}*" if subject else "🕘 *Recent Attendance Changes*"
+    lines = []
+    for event in events:
+        present, total = event['present'], event['total']
+        when = datetime.fromtimestamp(event['ts']).strftime('%d %b %H:%M')
+        emoji = get_emoji(present, total)
+        short = to_short_name(event['subject'])
+        change = describe_change(event['old'], event)
+        lines.append(f"`{when}` {emoji} *{short}* {present}/{total} — {change}")
+
+    return title + "\n\n" + '\n'.join(lines)
+
+
+# ─── Format: trend since first record (/history) ─────────────────────────────
+
+def format_trend(trend: list) -> str:
+    """trend: as returned by UserStore.trend()."""
+    if not trend:
+        return 'No attendance history recorded yet.'
+
+    lines = ["📈 *Trend since first record*\n", "```"]
+    lines.append(f"{'Sub':<10} {'Then':>5} {'Now':>5}  Missed")
+    lines.append("─" * 30)
+
+    for entry in trend:
+        first, last = entry['first'], entry['last']
+        short = to_short_name(entry['subject'])
+        missed = (last['total'] - first['total']) - (last['present'] - first['present'])
+        then_pct = get_pct(first['present'], first['total'])
+        now_pct = get_pct(last['present'], last['total'])
+        arrow = _trend_arrow(first, last)
+        lines.append(f"{arrow}{short:<9} {then_pct:>5} {now_pct:>5}  {missed}")
+
+    lines.append("```")
+    return '\n'.join(lines)
+
+
+def _trend_arrow(first: dict, last: dict) -> str:
+    if first['total'] == 0 or last['total'] == 0:
+        return '➖'
+    before = first['present'] / first['total']
+    after = last['present'] / last['total']
+    if after > before:
+        return '⬆️'
+    if after < before:
+        return '⬇️'
+    return '➖'
@@ -0,0 +1,91 @@
+"""
+bench_extract.py
+Per-row locator extraction vs. the single-round-trip extract_attendance.
+
+Loads a fixture #attendanceDiv table with 10..50 subjects into a blank
+page and times both approaches. Round trips are counted at each awaited
+Playwright call.
+
+Run from the repo root:
+    python -m benchmarks.bench_extract [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import time
+
+from browser import extract_attendance
+from erp import FRACTION_RE, ROWS_SELECTOR
+from pool import browser_pool
+
+SIZES = (10, 20, 30, 40, 50)
+
+
+def fixture_html(subjects: int) -> str:
+    rows = ''.join(
+        f'<tr><td>{i + 1}</td><td>Subject Number {i} Theory</td>'
+        f'<td><a href="#">{i % 9}/{9 + i % 5}</a></td></tr>'
+        for i in range(subjects)
+    )
+    return (
+        '<html><body><div id="attendanceDiv"><table>'
+        '<thead><tr><th>#</th><th>Course</th><th>Attendance</th></tr></thead>'
+        f'<tbody>{rows}</tbody></table></div></body></html>'
+    )
+
+
+async def legacy_extract(page) -> tuple:
+    """The old per-row loop; returns (attendance, round_trips)."""
+    trips = 0
+    rows = page.locator(ROWS_SELECTOR)
+    count = await rows.count()
+    trips += 1
+    attendance = {}
+
+    for i in range(count):
+        row = rows.nth(i)
+        cell_count = await row.locator('td').count()
+        trips += 1
+        if cell_count < 3:
+            continue
+
+        course = (await row.locator('td').nth(1).inner_text()).strip()
+        raw = (await row.locator('td').nth(2).locator('a').inner_text()).strip()
+        trips += 2
+
+        match = FRACTION_RE.search(raw)
+        if match:
+            attendance[course] = {
+                'present': int(match.group(1)),
+                'total': int(match.group(2)),
+            }
+
+    return attendance, trips
+
+
+async def main(repeat: int) -> None:
+    print(f"{'subjects':>8} {'legacy trips':>12} {'legacy ms':>10} {'new trips':>9} {'new ms':>8}")
+    async with browser_pool.page() as page:
+        for size in SIZES:
+            await page.set_content(fixture_html(size))
+
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                old, trips = await legacy_extract(page)
+            legacy_ms = (time.perf_counter() - t0) / repeat * 1000
+
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                new = await extract_attendance(page)
+            new_ms = (time.perf_counter() - t0) / repeat * 1000
+
+            assert old == new, 'extractors disagree'
+            print(f"{size:>8} {trips:>12} {legacy_ms:>10.1f} {1:>9} {new_ms:>8.1f}")
+
+    await browser_pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--repeat', type=int, default=20)
+    asyncio.run(main(parser.parse_args().repeat))
@@ -0,0 +1,226 @@
+"""
+bench_pipeline.py
+Offline load test of scrape_attendance, /verify registration and the poll pipeline.
+
+Starts benchmarks.mock_erp in a subprocess, points the bot at it through
+ERP_BASE_URL and uses throwaway USERS_DB / SESSION_DIR locations, then
+reports:
+  - scrape_attendance latency percentiles (cold login and cached session)
+  - registration latency percentiles (workers.dispatch_login_and_fetch,
+    as /verify calls it)
+  - poll throughput through bot.poll_users for 10/100/1000 simulated users
+    (in-process, or spread over --workers scrape worker processes)
+  - peak RSS of this process and its reaped children
+
+Run from the repo root:
+    python -m benchmarks.bench_pipeline [--engine http] [--users 10,100]
+    python -m benchmarks.bench_pipeline --workers 4   # sweep through worker processes
+    python -m benchmarks.bench_pipeline --json bench.json
+
+Mock server options (--latency-ms, --error-rate, ...) are passed through.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks import mock_erp
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _percentiles(values: list) -> dict:
+    if not values:
+        return {'n': 0}
+    ordered = sorted(values)
+
+    def pick(pct):
+        return ordered[max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))] * 1000
+
+    return {
+        'n': len(ordered),
+        'p50_ms': round(pick(50), 1),
+        'p95_ms': round(pick(95), 1),
+        'p99_ms': round(pick(99), 1),
+        'max_ms': round(ordered[-1] * 1000, 1),
+    }
+
+
+def _peak_rss_mb() -> dict:
+    # ru_maxrss is KiB on Linux
+    return {
+        'self_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'children_mb': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+    }
+
+
+def start_mock(port: int, passthrough: list) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.mock_erp', '--port', str(port), *passthrough],
+        cwd=REPO_ROOT,
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError('mock ERP did not start')
+
+
+async def timed(coro_factory, count: int, concurrency: int = 1) -> tuple:
+    """Runs coro_factory(i) count times; returns (durations, failures)."""
+    durations, failures = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            t0 = time.perf_counter()
+            try:
+                await coro_factory(i)
+                durations.append(time.perf_counter() - t0)
+            except Exception:
+                failures += 1
+
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return durations, failures
+
+
+async def run(args) -> dict:
+    # Imported late: these read ERP_BASE_URL / USERS_DB / SESSION_DIR at import time
+    import bot
+    from browser import scrape_attendance
+    from pool import browser_pool
+    from workers import dispatch_login_and_fetch
+    import http_engine
+
+    results: dict = {
+        'engine': os.environ.get('SCRAPE_ENGINE', 'playwright'),
+        'workers': args.workers,
+    }
+
+    # Scrape latency: first pass logs in, second pass reuses cached sessions
+    cold, cold_failed = await timed(lambda i: scrape_attendance(f'lat{i}', 'pass'), args.samples)
+    warm, warm_failed = await timed(lambda i: scrape_attendance(f'lat{i}', 'pass'), args.samples)
+    results['scrape_cold'] = {**_percentiles(cold), 'failed': cold_failed}
+    results['scrape_warm'] = {**_percentiles(warm), 'failed': warm_failed}
+
+    await bot.scrape_workers.start()
+
+    async def register_one(i):
+        if await dispatch_login_and_fetch(f'reg{i}', 'pass') is None:
+            raise RuntimeError('login_and_fetch rejected the login')
+
+    register, register_failed = await timed(register_one, args.samples)
+    results['register'] = {**_percentiles(register), 'failed': register_failed}
+
+    # Poll throughput through the real batch runner (no Telegram: the
+    # notification queue is never started, so messages just accumulate)
+    results['poll'] = {}
+    for size in args.users:
+        users = {}
+        for i in range(size):
+            user = {
+                'chat_id': f'{size}-{i}',
+                'username': f'poll{size}-{i}',
+                'password': 'pass',
+                'lastAttendance': {},
+                'notificationsEnabled': True,
+            }
+            bot.users_store.upsert(user)
+            users[user['chat_id']] = user
+
+        t0 = time.perf_counter()
+        await bot.poll_users(None, users)
+        wall = time.perf_counter() - t0
+        results['poll'][size] = {
+            'wall_s': round(wall, 2),
+            'users_per_s': round(size / wall, 1) if wall else None,
+        }
+
+    await bot.scrape_workers.stop()
+    await browser_pool.close()
+    await http_engine.close()
+    results['peak_rss'] = _peak_rss_mb()
+    return results
+
+
+def print_results(results: dict) -> None:
+    print(f"engine: {results['engine']}, scrape workers: {results['workers']}")
+    for name in ('scrape_cold', 'scrape_warm', 'register'):
+        r = results[name]
+        if r['n']:
+            print(f"{name:<14} n={r['n']:<4} p50={r['p50_ms']:>7.1f}ms p95={r['p95_ms']:>7.1f}ms "
+                  f"p99={r['p99_ms']:>7.1f}ms max={r['max_ms']:>7.1f}ms failed={r['failed']}")
+        else:
+            print(f"{name:<14} all {r['failed']} failed")
+    for size, r in results['poll'].items():
+        print(f"poll {size:>5} users  wall={r['wall_s']:>7.2f}s  {r['users_per_s']} users/s")
+    rss = results['peak_rss']
+    print(f"peak RSS: self {rss['self_mb']} MB, children {rss['children_mb']} MB")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--engine', choices=('playwright', 'http'), default=None)
+    parser.add_argument('--samples', type=int, default=20)
+    parser.add_argument('--users', default='10,100,1000',
+                        type=lambda s: [int(n) for n in s.split(',') if n])
+    parser.add_argument('--workers', type=int, default=0,
+                        help='scrape worker processes for the poll sweep (0 = in-process)')
+    parser.add_argument('--json', type=Path, help='also write results to this file')
+    mock_erp.add_arguments(parser)
+    args = parser.parse_args()
+
+    passthrough = [
+        '--password', args.password,
+        '--latency-ms', str(args.latency_ms),
+        '--jitter-ms', str(args.jitter_ms),
+        '--error-rate', str(args.error_rate),
+        '--change-rate', str(args.change_rate),
+        '--session-ttl', str(args.session_ttl),
+        '--subjects', str(args.subjects),
+    ]
+
+    port = _free_port()
+    workdir = tempfile.TemporaryDirectory(prefix='erp-bench-')
+    os.environ['ERP_BASE_URL'] = f'http://127.0.0.1:{port}'
+    os.environ['USERS_DB'] = str(Path(workdir.name) / 'users.db')
+    os.environ['SESSION_DIR'] = str(Path(workdir.name) / 'sessions')
+    if args.engine:
+        os.environ['SCRAPE_ENGINE'] = args.engine
+    os.environ['SCRAPE_WORKERS'] = str(args.workers)
+
+    proc = start_mock(port, passthrough)
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        proc.terminate()
+        proc.wait()
+        workdir.cleanup()
+
+    print_results(results)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
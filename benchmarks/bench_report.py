@@ -0,0 +1,87 @@
+"""
+bench_report.py
+Vectorised cohort report (report.py) vs. looping over users in Python.
+
+Builds N users (default 5,000) like bench_snapshot does and times:
+  - load_matrix: Snapshots -> users x subjects arrays
+  - cohort_report on the matrix
+  - the same per-subject figures computed with a plain per-user loop
+    over the attendance.py helpers, as a baseline
+and checks that both give the same below-threshold counts and lectures.
+
+Run from the repo root:
+    python -m benchmarks.bench_report [--users 5000] [--subjects 8]
+"""
+
+import argparse
+import statistics
+import time
+
+from attendance import iter_rows, lectures_needed_for_75
+from benchmarks.bench_snapshot import make_documents
+from report import cohort_report, load_matrix, subjects_csv
+from snapshot import Snapshot
+
+
+def python_report(rows: list) -> dict:
+    """Per-subject students / below 75% / lectures needed, one user at a time."""
+    by_subject: dict = {}
+    for _chat_id, _username, attendance in rows:
+        for subject, present, total in iter_rows(attendance):
+            if total == 0:
+                continue
+            entry = by_subject.setdefault(subject, {'pcts': [], 'below': 0, 'needed': 0})
+            pct = present / total * 100
+            entry['pcts'].append(pct)
+            if pct < 75:
+                entry['below'] += 1
+                entry['needed'] += lectures_needed_for_75(present, total)
+    for entry in by_subject.values():
+        entry['mean'] = statistics.fmean(entry['pcts'])
+        entry['median'] = statistics.median(entry['pcts'])
+    return by_subject
+
+
+def best_ms(fn, repeat: int) -> tuple:
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--users', type=int, default=5_000)
+    parser.add_argument('--subjects', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = [
+        (str(i), f"user{i}", Snapshot.from_json(doc))
+        for i, doc in enumerate(make_documents(args.users, args.subjects))
+    ]
+
+    load_ms, matrix = best_ms(lambda: load_matrix(rows), args.repeat)
+    report_ms, report = best_ms(lambda: cohort_report(matrix, threshold=75), args.repeat)
+    csv_ms, _ = best_ms(lambda: subjects_csv(report), args.repeat)
+    python_ms, baseline = best_ms(lambda: python_report(rows), args.repeat)
+
+    for row in report['subjects']:
+        expected = baseline[row['subject']]
+        assert row['below'] == expected['below'], row['subject']
+        assert row['lectures_needed'] == expected['needed'], row['subject']
+        assert abs(row['mean'] - expected['mean']) < 0.051, row['subject']
+        assert abs(row['median'] - expected['median']) < 0.051, row['subject']
+
+    users, subjects = matrix.shape
+    print(f"{users} users x {subjects} subjects, {len(report['at_risk']['chat_id'])} at-risk rows:")
+    print(f"  load_matrix      {load_ms:8.2f} ms")
+    print(f"  cohort_report    {report_ms:8.2f} ms")
+    print(f"  subjects_csv     {csv_ms:8.2f} ms")
+    print(f"  python loop      {python_ms:8.2f} ms  (per-subject figures only)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+bench_shards.py
+Local check of lease-based sharding: several instances, one SQLite file.
+
+Starts benchmarks.mock_erp, registers --users users in a throwaway
+USERS_DB and runs --instances child processes against it. Each one starts
+and stops through bot.post_init / post_stop / post_shutdown, so they all
+contend for the same METRICS_PORT as on one host, and drives the real poll
+path (shard leases, bot.start_poll_batch, outbox draining, delivery
+flushes) with every user due once per --interval seconds. Partway through,
+one child is SIGKILLed to show its shards (and leadership, if it led)
+being taken over.
+
+Afterwards it reads every user's page fetch times from the mock ERP and
+checks that:
+  - no user was polled twice within half an interval, apart from the
+    killed instance's last in-flight polls, which it never checkpointed
+  - every user was polled in the last sweep, after the takeover
+  - there was never more than one live leader lease
+  - the leader delivered the outbox
+
+Run from the repo root:
+    python -m benchmarks.bench_shards [--instances 3] [--users 300] [--duration 60]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from pathlib import Path
+from types import SimpleNamespace
+
+from benchmarks.bench_pipeline import REPO_ROOT, _free_port, start_mock
+
+
+# ─── Child: one bot instance ─────────────────────────────────────────────────
+
+class NullBot:
+    """Accepts every notification, so delivered outbox rows get cleared."""
+
+    async def set_my_commands(self, commands) -> None:
+        pass
+
+    async def send_message(self, **kwargs) -> None:
+        pass
+
+
+class NullUpdater:
+    """Stands in for long polling Telegram while an instance leads."""
+
+    async def start_polling(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class NullApp:
+    """Just enough of telegram.ext.Application for bot's lifecycle hooks."""
+
+    def __init__(self):
+        self.bot = NullBot()
+        self.updater = NullUpdater()
+
+
+async def child(duration: float) -> None:
+    # Imported here: bot reads USERS_DB, SHARD_COUNT, ... from the environment
+    import bot
+
+    app = NullApp()
+    context = SimpleNamespace(application=app)
+    await bot.post_init(app)
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        await bot.start_poll_batch(app)
+        await bot.drain_outbox(context)
+        await bot.flush_delivered(context)
+        await asyncio.sleep(0.5)
+
+    await bot.post_stop(app)
+    await bot.post_shutdown(app)
+
+
+# ─── Parent ──────────────────────────────────────────────────────────────────
+
+def register_users(db_path: Path, count: int) -> None:
+    from store import UserStore
+
+    store = UserStore(db_path)
+    for i in range(count):
+        store.upsert({
+            'chat_id': str(100000 + i),
+            'username': f'shard{i}',
+            'password': 'pass',
+            'lastAttendance': {},
+            'notificationsEnabled': True,
+        })
+    store.close()
+
+
+def sample_leases(db_path: Path) -> dict:
+    conn = sqlite3.connect(db_path, timeout=5)
+    try:
+        now = time.time()
+        rows = conn.execute('SELECT name, owner FROM leases WHERE expires >= ?', (now,)).fetchall()
+        outbox = conn.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+    finally:
+        conn.close()
+    leaders = [owner for name, owner in rows if name == 'leader']
+    shards: dict = {}
+    for name, owner in rows:
+        if name.startswith('shard:'):
+            shards[owner] = shards.get(owner, 0) + 1
+    return {'leaders': leaders, 'shards': shards, 'outbox': outbox}
+
+
+def check_fetches(fetches: dict, users: int, interval: float, kill_at: float, end: float) -> dict:
+    min_gap = interval / 2
+    doubles, crash_repolls, missing = [], 0, 0
+    for i in range(users):
+        times = sorted(fetches.get(f'shard{i}', []))
+        for earlier, later in zip(times, times[1:]):
+            if later - earlier >= min_gap:
+                continue
+            if earlier <= kill_at <= later:
+                crash_repolls += 1  # polled by the killed instance, not checkpointed
+            else:
+                doubles.append((f'shard{i}', round(later - earlier, 2)))
+        # The last full sweep: everyone should have been polled in it
+        if not times or times[-1] < end - interval * 1.5:
+            missing += 1
+    return {'doubles': doubles, 'crash_repolls': crash_repolls, 'missing_last_sweep': missing}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--instances', type=int, default=3)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--shards', type=int, default=16)
+    parser.add_argument('--interval', type=int, default=15, help='seconds between polls of a user')
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--lease-ttl', type=float, default=5)
+    parser.add_argument('--no-kill', action='store_true', help="don't kill an instance partway")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        asyncio.run(child(args.duration))
+        return
+
+    port = _free_port()
+    workdir = Path(tempfile.mkdtemp(prefix='shard-bench-'))
+    db_path = workdir / 'users.db'
+    register_users(db_path, args.users)
+
+    env = {
+        **os.environ,
+        'ERP_BASE_URL': f'http://127.0.0.1:{port}',
+        'USERS_DB': str(db_path),
+        'SCRAPE_ENGINE': 'http',
+        'SHARD_COUNT': str(args.shards),
+        'LEASE_TTL_SECONDS': str(args.lease_ttl),
+        'LEASE_RENEW_SECONDS': str(args.lease_ttl / 4),
+        'POLL_BASE_INTERVAL_SECONDS': str(args.interval),
+        'POLL_MIN_INTERVAL_SECONDS': str(args.interval),
+        'POLL_MAX_INTERVAL_SECONDS': str(args.interval),
+        'POLL_JITTER': '0',
+        'RESUME_SPREAD_SECONDS': str(args.interval // 3),
+        # Cohort promotion polls classmates early on purpose; keep it out of
+        # a check for double polls
+        'COHORT_COOLDOWN_SECONDS': str(10 ** 10),
+    }
+
+    mock = start_mock(port, ['--latency-ms', '20', '--jitter-ms', '10', '--change-rate', '0.02'])
+    children = []
+    for i in range(args.instances):
+        log = open(workdir / f'instance{i}.log', 'w')
+        children.append(subprocess.Popen(
+            [sys.executable, '-m', 'benchmarks.bench_shards', '--child', '--duration', str(args.duration)],
+            cwd=REPO_ROOT,
+            env={**env, 'INSTANCE_ID': f'inst{i}', 'SESSION_DIR': str(workdir / f'sessions{i}')},
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        ))
+
+    started = time.time()
+    kill_at = started + args.duration * 0.4
+    killed = None
+    max_leaders, samples = 0, []
+    try:
+        while any(proc.poll() is None for proc in children):
+            now = time.time()
+            if killed is None and not args.no_kill and now >= kill_at:
+                leader = sample_leases(db_path)['leaders']
+                # Kill the leader if there is one, to exercise failover too
+                killed = int(leader[0][len('inst'):]) if leader else 0
+                children[killed].send_signal(signal.SIGKILL)
+                kill_at = now
+                print(f"[{now - started:5.1f}s] killed inst{killed}")
+            sample = sample_leases(db_path)
+            max_leaders = max(max_leaders, len(sample['leaders']))
+            samples.append((now - started, sample))
+            time.sleep(1)
+        end = time.time()
+
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/_fetches') as response:
+            fetches = json.load(response)
+    finally:
+        for proc in children:
+            if proc.poll() is None:
+                proc.kill()
+        mock.terminate()
+        mock.wait()
+
+    for t, sample in samples[::5]:
+        owners = ', '.join(f"{owner}={n}" for owner, n in sorted(sample['shards'].items()))
+        print(f"[{t:5.1f}s] leader={','.join(sample['leaders']) or '-'}  shards: {owners}  outbox={sample['outbox']}")
+
+    result = check_fetches(fetches, args.users, args.interval, kill_at if killed is not None else 0, end)
+    polls = sum(len(times) for times in fetches.values())
+    outbox_left = samples[-1][1]['outbox'] if samples else 0
+    print(f"{polls} polls of {args.users} users by {args.instances} instances over {end - started:.0f}s")
+    print(f"  polled twice within {args.interval / 2:.1f}s:  {len(result['doubles'])} {result['doubles'][:5]}")
+    print(f"  re-polled after the kill:   {result['crash_repolls']}")
+    print(f"  missed in the last sweep:   {result['missing_last_sweep']}")
+    print(f"  most live leaders at once:  {max_leaders}")
+    print(f"  outbox rows left:           {outbox_left}")
+
+    ok = not result['doubles'] and not result['missing_last_sweep'] and max_leaders <= 1
+    if ok:
+        print("OK")
+        shutil.rmtree(workdir)
+    else:
+        print(f"FAILED (instance logs in {workdir})")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
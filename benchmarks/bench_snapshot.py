@@ -0,0 +1,108 @@
+"""
+bench_snapshot.py
+Plain attendance dicts vs. interned snapshot.Snapshot.
+
+Builds N users (default 10,000), each with --subjects courses drawn from
+the mock ERP's subject list, the way the store loads them (one JSON
+document per user), and reports:
+  - memory held by all snapshots (tracemalloc)
+  - compare_attendance time for an unchanged and a changed poll
+  - format_attendance_short / total_percentage time
+
+Run from the repo root:
+    python -m benchmarks.bench_snapshot [--users 10000] [--subjects 8]
+"""
+
+import argparse
+import gc
+import json
+import random
+import time
+import tracemalloc
+
+from attendance import compare_attendance, format_attendance_short, total_percentage
+from benchmarks.mock_erp import SUBJECTS
+from snapshot import Snapshot
+
+
+def make_documents(users: int, subjects: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    documents = []
+    for _ in range(users):
+        picked = rng.sample(SUBJECTS, min(subjects, len(SUBJECTS)))
+        attendance = {}
+        for name in picked:
+            total = rng.randint(10, 60)
+            attendance[name] = {'present': rng.randint(0, total), 'total': total}
+        documents.append(json.dumps(attendance))
+    return documents
+
+
+def measure_memory(documents: list, load) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    loaded = [load(doc) for doc in documents]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del loaded
+    return (after - before) / (1024 * 1024)
+
+
+def bump_one(attendance: dict) -> dict:
+    """Same snapshot with one absence added to the first subject."""
+    changed = {subject: dict(counts) for subject, counts in attendance.items()}
+    first = next(iter(changed))
+    changed[first]['total'] += 1
+    return changed
+
+
+def per_call_us(fn, pairs: list, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        for args in pairs:
+            fn(*args)
+    return (time.perf_counter() - t0) / (repeat * len(pairs)) * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--subjects', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    documents = make_documents(args.users, args.subjects)
+
+    dict_mb = measure_memory(documents, json.loads)
+    snap_mb = measure_memory(documents, Snapshot.from_json)
+    print(f"memory for {args.users} users x {args.subjects} subjects:")
+    print(f"  dict      {dict_mb:7.2f} MB  ({dict_mb * 1024 * 1024 / args.users:6.0f} B/user)")
+    print(f"  Snapshot  {snap_mb:7.2f} MB  ({snap_mb * 1024 * 1024 / args.users:6.0f} B/user)")
+
+    dicts = [json.loads(doc) for doc in documents]
+    snaps = [Snapshot.from_dict(d) for d in dicts]
+    changed_dicts = [bump_one(d) for d in dicts]
+    changed_snaps = [Snapshot.from_dict(d) for d in changed_dicts]
+    same_dicts = [json.loads(doc) for doc in documents]
+    same_snaps = [Snapshot.from_json(doc) for doc in documents]
+
+    rows = [
+        ('compare, unchanged', compare_attendance,
+         list(zip(dicts, same_dicts)), list(zip(snaps, same_snaps))),
+        ('compare, changed', compare_attendance,
+         list(zip(dicts, changed_dicts)), list(zip(snaps, changed_snaps))),
+        ('format_attendance_short', format_attendance_short,
+         [(d,) for d in dicts], [(s,) for s in snaps]),
+        ('total_percentage', total_percentage,
+         [(d,) for d in dicts], [(s,) for s in snaps]),
+    ]
+    print("time per call:")
+    for name, fn, dict_args, snap_args in rows:
+        dict_us = per_call_us(fn, dict_args, args.repeat)
+        snap_us = per_call_us(fn, snap_args, args.repeat)
+        print(f"  {name:<24} dict {dict_us:6.2f} us   Snapshot {snap_us:6.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+bench_updates.py
+Offline update-to-reply latency of bot.py, polling vs webhook mode.
+
+Runs a stand-in Telegram Bot API (getMe, getUpdates long polling,
+sendMessage, everything else answered with ok) and starts bot.py against
+it through TELEGRAM_BASE_URL. Each sample is a /help message: in polling
+mode it is queued for the next getUpdates, in webhook mode it is POSTed to
+the webhook server with the secret header. Latency is the time until the
+matching sendMessage reaches the fake API.
+
+Run from the repo root:
+    python -m benchmarks.bench_updates [--samples 50] [--modes polling,webhook]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.bench_pipeline import REPO_ROOT, _free_port, _percentiles
+
+TOKEN = '123456:bench'
+SECRET = 'bench-secret'
+
+
+class FakeBotApi:
+    def __init__(self):
+        self.updates: list = []
+        self.update_id = 0
+        self.queued = asyncio.Event()
+        self.replies: dict = {}   # chat_id -> future resolved on sendMessage
+        self.polling = asyncio.Event()
+
+    def make_update(self, chat_id: int, text: str = '/help') -> dict:
+        self.update_id += 1
+        return {
+            'update_id': self.update_id,
+            'message': {
+                'message_id': self.update_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': chat_id, 'is_bot': False, 'first_name': 'Bench'},
+                'text': text,
+                'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(text)}],
+            },
+        }
+
+    def expect_reply(self, chat_id: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.replies[chat_id] = future
+        return future
+
+    def queue(self, update: dict) -> None:
+        self.updates.append(update)
+        self.queued.set()
+
+    async def _params(self, request: web.Request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            try:
+                params[key] = json.loads(value)
+            except (TypeError, ValueError):
+                params[key] = value
+        return params
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await self._params(request)
+
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        elif method == 'getUpdates':
+            self.polling.set()
+            offset = int(params.get('offset') or 0)
+            self.updates = [u for u in self.updates if u['update_id'] >= offset]
+            if not self.updates:
+                self.queued.clear()
+                try:
+                    await asyncio.wait_for(self.queued.wait(), float(params.get('timeout') or 0))
+                except asyncio.TimeoutError:
+                    pass
+            result = list(self.updates)
+        elif method == 'sendMessage':
+            chat_id = int(params['chat_id'])
+            future = self.replies.pop(chat_id, None)
+            if future is not None and not future.done():
+                future.set_result(time.perf_counter())
+            result = {
+                'message_id': 1,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+
+async def start_api(api: FakeBotApi, port: int) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_post('/bot{token}/{method}', api.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    return runner
+
+
+async def wait_for_webhook(session: aiohttp.ClientSession, url: str, timeout: float = 30) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            async with session.post(url, json={}) as response:
+                if response.status == 403:  # up, and rejecting the missing secret
+                    return
+        except aiohttp.ClientError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError('webhook server did not start')
+
+
+async def run_mode(mode: str, samples: int, workdir: Path) -> dict:
+    api = FakeBotApi()
+    api_port, webhook_port = _free_port(), _free_port()
+    runner = await start_api(api, api_port)
+
+    env = {
+        **os.environ,
+        'TELEGRAM_BOT_TOKEN': TOKEN,
+        'TELEGRAM_BASE_URL': f'http://127.0.0.1:{api_port}/bot',
+        'BOT_MODE': mode,
+        'WEBHOOK_PORT': str(webhook_port),
+        'WEBHOOK_SECRET': SECRET,
+        'WEBHOOK_URL': '',
+        'USERS_DB': str(workdir / f'{mode}.db'),
+        'SESSION_DIR': str(workdir / 'sessions'),
+        'SCRAPE_ENGINE': 'http',
+        'SCRAPE_WORKERS': '0',
+        'METRICS_PORT': '0',
+    }
+    bot = subprocess.Popen(
+        [sys.executable, 'bot.py'], cwd=REPO_ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    webhook_url = f'http://127.0.0.1:{webhook_port}/telegram'
+    durations = []
+    try:
+        async with aiohttp.ClientSession() as session:
+            if mode == 'webhook':
+                await wait_for_webhook(session, webhook_url)
+            else:
+                await asyncio.wait_for(api.polling.wait(), 30)
+
+            for i in range(samples):
+                chat_id = 1000 + i
+                update = api.make_update(chat_id)
+                reply = api.expect_reply(chat_id)
+                t0 = time.perf_counter()
+                if mode == 'webhook':
+                    headers = {'X-Telegram-Bot-Api-Secret-Token': SECRET}
+                    async with session.post(webhook_url, json=update, headers=headers) as response:
+                        response.raise_for_status()
+                else:
+                    api.queue(update)
+                durations.append(await asyncio.wait_for(reply, 10) - t0)
+    finally:
+        bot.terminate()
+        bot.wait(timeout=30)
+        await runner.cleanup()
+    return _percentiles(durations)
+
+
+async def run(args) -> dict:
+    with tempfile.TemporaryDirectory(prefix='bot-bench-') as workdir:
+        return {mode: await run_mode(mode, args.samples, Path(workdir)) for mode in args.modes}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--samples', type=int, default=50)
+    parser.add_argument('--modes', default='polling,webhook',
+                        type=lambda s: [m for m in s.split(',') if m])
+    parser.add_argument('--json', type=Path, help='also write results to this file')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for mode, r in results.items():
+        print(f"{mode:<8} n={r['n']:<4} p50={r['p50_ms']:>7.1f}ms p95={r['p95_ms']:>7.1f}ms "
+              f"p99={r['p99_ms']:>7.1f}ms max={r['max_ms']:>7.1f}ms")
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
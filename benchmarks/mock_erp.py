@@ -0,0 +1,239 @@
+"""
+mock_erp.py
+Self-contained stand-in for the ERP, for offline benchmarks.
+
+Copies the parts of the real site the scrapers touch:
+  - GET  /login.htm (and /login.html) with the "Enter username" /
+    "Enter password" / "Login" form
+  - POST /login.htm: wrong password -> /login.htm?failure=true,
+    otherwise a JSESSIONID cookie and a redirect to /home.htm
+  - GET  /studentCourseFileNew.htm: the #attendanceDiv table, or a
+    redirect to /login.htm when the session is missing or expired
+
+Every account whose password equals --password logs in. Each user gets a
+stable set of subjects; totals tick up with probability --change-rate per
+request so pollers see changes. --latency-ms/--jitter-ms delay responses
+and --error-rate answers a share of requests with HTTP 500. GET /_stats
+gives request counters and GET /_fetches every user's page fetch times.
+
+Run from the repo root:
+    python -m benchmarks.mock_erp --port 8765
+"""
+
+import argparse
+import asyncio
+import random
+import secrets
+import time
+import zlib
+
+from aiohttp import web
+
+SUBJECTS = [
+    'Data Structures and Algorithms',
+    'Database Management Systems',
+    'Operating Systems',
+    'Computer Networks',
+    'Engineering Mathematics III',
+    'Object Oriented Programming',
+    'Theory of Computation',
+    'Software Engineering',
+    'Professional Communication',
+    'Environmental Studies',
+]
+
+LOGIN_PAGE = """<!DOCTYPE html>
+<html><head><title>ERP Login</title>
+<link rel="stylesheet" href="/static/site.css"></head>
+<body>
+<form action="/login.htm" method="post">
+  <input type="hidden" name="_csrf" value="{csrf}">
+  <input type="text" name="j_username" placeholder="Enter username" aria-label="Enter username">
+  <input type="password" name="j_password" placeholder="Enter password" aria-label="Enter password">
+  <button type="submit">Login</button>
+</form>
+{failure}
+</body></html>"""
+
+ATTENDANCE_PAGE = """<!DOCTYPE html>
+<html><head><title>Course File</title>
+<link rel="stylesheet" href="/static/site.css"></head>
+<body>
+<img src="/static/logo.png">
+<div id="attendanceDiv"><table>
+<thead><tr><th>#</th><th>Course</th><th>Attendance</th></tr></thead>
+<tbody>{rows}</tbody>
+</table></div>
+</body></html>"""
+
+
+class MockErp:
+    def __init__(self, password='pass', latency_ms=0, jitter_ms=0, error_rate=0.0,
+                 change_rate=0.0, session_ttl=1800, subjects=8):
+        self.password = password
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.change_rate = change_rate
+        self.session_ttl = session_ttl
+        self.subjects = subjects
+
+        self.sessions: dict = {}    # sid -> (username, created_at)
+        self.attendance: dict = {}  # username -> { subject: [present, total] }
+        self.stats = {'logins': 0, 'failed_logins': 0, 'pages': 0, 'errors': 0, 'expired': 0}
+        self.fetches: dict = {}     # username -> attendance page fetch times
+
+    # ─── Helpers ─────────────────────────────────────────────────────────────
+
+    def _user_attendance(self, username: str) -> dict:
+        if username not in self.attendance:
+            rng = random.Random(zlib.crc32(username.encode()))
+            picked = rng.sample(SUBJECTS, min(self.subjects, len(SUBJECTS)))
+            self.attendance[username] = {}
+            for subject in picked:
+                total = rng.randint(10, 40)
+                self.attendance[username][subject] = [rng.randint(total // 2, total), total]
+        return self.attendance[username]
+
+    def _session_user(self, request) -> str | None:
+        sid = request.cookies.get('JSESSIONID')
+        entry = self.sessions.get(sid)
+        if entry is None:
+            return None
+        username, created_at = entry
+        if time.time() - created_at > self.session_ttl:
+            del self.sessions[sid]
+            self.stats['expired'] += 1
+            return None
+        return username
+
+    @web.middleware
+    async def middleware(self, request, handler):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            raise web.HTTPInternalServerError(text='Injected failure')
+        return await handler(request)
+
+    # ─── Routes ──────────────────────────────────────────────────────────────
+
+    async def login_page(self, request):
+        failure = '<p class="error">Invalid credentials</p>' if request.query.get('failure') else ''
+        return web.Response(
+            text=LOGIN_PAGE.format(csrf=secrets.token_hex(8), failure=failure),
+            content_type='text/html',
+        )
+
+    async def login_submit(self, request):
+        form = await request.post()
+        username = form.get('j_username', '')
+        if not username or form.get('j_password') != self.password:
+            self.stats['failed_logins'] += 1
+            raise web.HTTPFound('/login.htm?failure=true')
+
+        self.stats['logins'] += 1
+        sid = secrets.token_hex(16)
+        self.sessions[sid] = (username, time.time())
+        response = web.HTTPFound('/home.htm')
+        response.set_cookie('JSESSIONID', sid, httponly=True)
+        raise response
+
+    async def home(self, request):
+        if self._session_user(request) is None:
+            raise web.HTTPFound('/login.htm')
+        return web.Response(text='<html><body><h1>Welcome</h1></body></html>', content_type='text/html')
+
+    async def attendance_page(self, request):
+        username = self._session_user(request)
+        if username is None:
+            raise web.HTTPFound('/login.htm')
+
+        self.stats['pages'] += 1
+        self.fetches.setdefault(username, []).append(time.time())
+        subjects = self._user_attendance(username)
+        for counts in subjects.values():
+            if self.change_rate and random.random() < self.change_rate:
+                counts[1] += 1
+                if random.random() < 0.8:
+                    counts[0] += 1
+
+        rows = ''.join(
+            f'<tr><td>{i + 1}</td><td>{subject}</td><td><a href="#">{present}/{total}</a></td></tr>'
+            for i, (subject, (present, total)) in enumerate(subjects.items())
+        )
+        return web.Response(text=ATTENDANCE_PAGE.format(rows=rows), content_type='text/html')
+
+    async def static(self, request):
+        # Stand-in for the images/stylesheets the real pages pull in
+        return web.Response(body=b'\0' * 20_000, content_type='application/octet-stream')
+
+    async def stats_page(self, request):
+        return web.json_response({**self.stats, 'sessions': len(self.sessions)})
+
+    async def fetches_page(self, request):
+        return web.json_response(self.fetches)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        app.add_routes([
+            web.get('/login.htm', self.login_page),
+            web.get('/login.html', self.login_page),
+            web.post('/login.htm', self.login_submit),
+            web.get('/home.htm', self.home),
+            web.get('/studentCourseFileNew.htm', self.attendance_page),
+            web.get('/static/{name}', self.static),
+            web.get('/_stats', self.stats_page),
+            web.get('/_fetches', self.fetches_page),
+        ])
+        return app
+
+
+async def serve(erp: MockErp, host: str = '127.0.0.1', port: int = 8765) -> web.AppRunner:
+    runner = web.AppRunner(erp.app(), access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--password', default='pass')
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=20)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--change-rate', type=float, default=0.05)
+    parser.add_argument('--session-ttl', type=int, default=1800)
+    parser.add_argument('--subjects', type=int, default=8)
+
+
+def from_args(args) -> MockErp:
+    return MockErp(
+        password=args.password,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        change_rate=args.change_rate,
+        session_ttl=args.session_ttl,
+        subjects=args.subjects,
+    )
+
+
+async def main(args) -> None:
+    runner = await serve(from_args(args), args.host, args.port)
+    print(f"Mock ERP on http://{args.host}:{args.port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    add_arguments(parser)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
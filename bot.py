@@ -3,16 +3,23 @@ bot.py
 Telegram bot - Python port of the WhatsApp bot.
 
 Requirements:
-    pip install python-telegram-bot playwright
+    pip install python-telegram-bot[job-queue] playwright httpx selectolax aiohttp psutil numpy
     playwright install chromium
 
 Set your bot token in BOT_TOKEN below (or via environment variable).
+BOT_MODE=webhook receives updates through webhook.py instead of long polling.
+SHARD_COUNT > 0 lets several instances share USERS_DB, see shards.py. On
+one host give each its own METRICS_PORT (or 0); only the leader binds
+WEBHOOK_PORT.
 """
 
 import asyncio
-import json
+import functools
 import logging
 import os
+import signal
+import time
+from collections import deque
 from datetime import datetime
 from pathlib import Path
 
@@ -24,6 +31,7 @@ from telegram.ext import (
     CommandHandler,
     ContextTypes,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
@@ -31,22 +39,51 @@ from attendance import (
     compare_attendance,
     format_attendance_full,
     format_attendance_short,
+    format_history,
     format_low_attendance,
+    format_trend,
     get_emoji,
     to_short_name,
     total_percentage,
 )
-from browser import scrape_attendance
-from verify import verify_login
+import http_engine
+import webhook
+from browser import SCRAPE_ENGINE
+from circuit import CircuitOpen, erp_circuit
+from coalesce import ScrapeCoalescer
+from memwatch import MemoryWatchdog
+from metrics import metrics, serve as serve_metrics
+from notify import NotificationQueue
+from pool import browser_pool
+from processor import ChatOrderedProcessor
+from report import at_risk_csv, cohort_report, format_report, load_matrix, subjects_csv
+from scheduler import PollScheduler
+from shards import ShardLeases, shard_of
+from store import UserStore
+from workers import SCRAPE_WORKERS, dispatch_login_and_fetch, dispatch_scrape, scrape_workers
 from telegram import BotCommand
 # ─── Config ──────────────────────────────────────────────────────────────────
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN", "8563840316:AAGbQLOY7Lqg-FidoRc1vwuAQBr0ZMfC2KA")
-USERS_FILE = Path(__file__).parent / "users.json"
-POLL_INTERVAL_SECONDS = 30 * 60  # 30 minutes
+BOT_MODE = os.getenv("BOT_MODE", "polling")  # "polling" or "webhook"
+TELEGRAM_BASE_URL = os.getenv("TELEGRAM_BASE_URL", "https://api.telegram.org/bot")  # local Bot API server
+USERS_FILE = Path(__file__).parent / "users.json"  # legacy, migrated into USERS_DB
+USERS_DB = Path(os.getenv("USERS_DB", Path(__file__).parent / "users.db"))
+SCHEDULER_TICK_SECONDS = 30  # how often due users are picked up (see scheduler.py)
+POLL_CONCURRENCY = int(os.getenv("POLL_CONCURRENCY", str(4 * max(1, SCRAPE_WORKERS))))
+POLL_BATCH_LIMIT = int(os.getenv("POLL_BATCH_LIMIT", str(POLL_CONCURRENCY * 8)))
+POLL_USER_TIMEOUT_SECONDS = int(os.getenv("POLL_USER_TIMEOUT_SECONDS", "90"))
+POLL_BATCH_TIMEOUT_SECONDS = int(os.getenv("POLL_BATCH_TIMEOUT_SECONDS", str(20 * 60)))
+COMMAND_SCRAPE_LIMIT = int(os.getenv("COMMAND_SCRAPE_LIMIT", "4"))  # scrapes started by commands
+VERIFY_TTL_SECONDS = int(os.getenv("VERIFY_TTL_SECONDS", "600"))  # abandoned /verify flows
+OUTBOX_DRAIN_SECONDS = float(os.getenv("OUTBOX_DRAIN_SECONDS", "2"))  # leader picks up others' notifications
+DELIVERY_FLUSH_SECONDS = float(os.getenv("DELIVERY_FLUSH_SECONDS", "5"))  # lastAttendance writes, see store.py
+ADMIN_CHAT_IDS = {c.strip() for c in os.getenv("ADMIN_CHAT_IDS", "").split(',') if c.strip()}
 COLLEGE_START_HOUR = 8
 COLLEGE_END_HOUR = 18
 
+ERP_UNREACHABLE_MSG = "⚠️ ERP unreachable right now. Try again in a few minutes."
+
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     level=logging.INFO,
@@ -55,23 +92,58 @@ logger = logging.getLogger(__name__)
 
 # ─── User Store ──────────────────────────────────────────────────────────────
 
-def load_users() -> dict:
-    if not USERS_FILE.exists():
-        return {}
-    return json.loads(USERS_FILE.read_text())
+users_store = UserStore(USERS_DB)
+
+# Shared by commands and poll sweeps: one scrape per username at a time,
+# failing fast while the ERP circuit is open
+scrapes = ScrapeCoalescer(functools.partial(erp_circuit.call, dispatch_scrape))
+
+# Handlers run concurrently (see processor.py); this caps how many of them
+# can be waiting on the ERP at once so commands can't starve poll sweeps
+command_scrapes = asyncio.Semaphore(COMMAND_SCRAPE_LIMIT)
+
+# Per-user next-due times for background polling
+poller = PollScheduler()
+_poll_task: asyncio.Task | None = None
+_stopping = False  # set on shutdown: running batches stop taking new users
 
+# Which users this instance polls and whether it talks to Telegram, when
+# several instances share USERS_DB (see shards.py)
+shard_leases = ShardLeases(users_store)
+_stop_updates = None  # stops update intake while this instance leads
+_metrics_runner = None
 
-def save_users(users: dict) -> None:
-    USERS_FILE.write_text(json.dumps(users, indent=2))
+# RSS of the bot and its Chromium processes. It only recycles the in-process
+# pool; scrape workers run their own watchdog.
+memory_watchdog = MemoryWatchdog(browser_pool if SCRAPE_WORKERS == 0 else None)
 
 
 # ─── Multi-step verify state ─────────────────────────────────────────────────
 
-# chat_id (str) -> { "step": str, "username": str }
+# chat_id (str) -> { "step": str, "username": str, "started": float }
 pending_verify: dict = {}
 
+
+async def expire_pending_verify(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drops /verify flows nobody finished within VERIFY_TTL_SECONDS."""
+    cutoff = time.time() - VERIFY_TTL_SECONDS
+    expired = [c for c, state in pending_verify.items() if state['started'] < cutoff]
+    for chat_id in expired:
+        pending_verify.pop(chat_id, None)
+    if expired:
+        logger.info(f"[Verify] Dropped {len(expired)} abandoned /verify flow(s).")
+
 # ─── Helpers ─────────────────────────────────────────────────────────────────
 
+async def fetch_for_command(user: dict) -> tuple:
+    """scrapes.get() for a command; cached results skip the COMMAND_SCRAPE_LIMIT queue."""
+    cached = scrapes.peek(user['username'])
+    if cached is not None:
+        return cached
+    async with command_scrapes:
+        return await scrapes.get(user['username'], user['password'])
+
+
 def is_college_hours() -> bool:
     now = datetime.now()
     if now.weekday() >= 5:  # Saturday=5, Sunday=6
@@ -80,6 +152,23 @@ def is_college_hours() -> bool:
     return COLLEGE_START_HOUR <= now.hour < COLLEGE_END_HOUR
 
 
+def _percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def format_age(fetched_at: float) -> str:
+    age = int(time.time() - fetched_at)
+    if age < 5:
+        return "🕒 Updated just now"
+    if age < 60:
+        return f"🕒 Updated {age}s ago"
+    return f"🕒 Updated {age // 60} min ago"
+
+
 def build_change_message(changes: list) -> str:
     lines = []
     for change in changes:
@@ -91,6 +180,46 @@ def build_change_message(changes: list) -> str:
     return "📢 *Absent marked!*\n\n" + '\n'.join(lines)
 
 
+# Poll notifications go out through a rate-limited queue, never inline
+notifier = NotificationQueue(build_change_message)
+_outbox_read = 0        # id of the last outbox row the leader queued
+_outbox_ids: dict = {}  # chat_id -> newest outbox row queued for them
+
+
+def _delivered(chat_id: str, snapshot) -> None:
+    # lastAttendance only moves once the user has been told about the change
+    users_store.mark_delivered(chat_id, snapshot, _outbox_ids.pop(chat_id, None))
+
+
+async def flush_delivered(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Writes the lastAttendance updates buffered since the last flush in one go."""
+    try:
+        users_store.flush_delivered()
+    except Exception as e:
+        logger.error(f"[Notify] Could not save delivered snapshots, retrying: {e}")
+
+
+notifier.on_delivered = _delivered
+
+
+def _shown(chat_id: str, snapshot) -> None:
+    """
+    A command reply showed the user `snapshot`: it replaces any poll
+    notification still queued for them and becomes lastAttendance, through
+    the same path as a delivered notification.
+    """
+    notifier.discard(chat_id)
+    _delivered(chat_id, snapshot)
+
+
+def notify(chat_id: str, changes: list, snapshot) -> None:
+    """Queues a change notification, via the outbox if another instance leads."""
+    if shard_leases.is_leader:
+        notifier.enqueue(chat_id, changes, snapshot)
+    else:
+        users_store.push_outbox(chat_id, changes, snapshot)
+
+
 # ─── Command Handlers ─────────────────────────────────────────────────────────
 
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -106,6 +235,7 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         "/check        → Manually check attendance now\n"
         "/all          → Full attendance with complete subject names\n"
         "/low          → Show only subjects below 75%\n"
+        "/history      → Attendance trend and recent changes (/history <subject>)\n"
         "/pause        → Pause auto-notifications\n"
         "/resume       → Resume auto-notifications\n"
         "/unsubscribe  → Remove your account from the bot\n"
@@ -115,7 +245,7 @@ async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def cmd_verify(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = str(update.effective_chat.id)
-    pending_verify[chat_id] = {"step": "username"}
+    pending_verify[chat_id] = {"step": "username", "started": time.time()}
     await update.message.reply_markdown(
         "Let's get you set up! 👋\nPlease send your *ERP username* (email):"
     )
@@ -123,44 +253,51 @@ async def cmd_verify(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
 
 async def cmd_check(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = str(update.effective_chat.id)
-    users = load_users()
-    if chat_id not in users:
+    user = users_store.get(chat_id)
+    if user is None:
         await update.message.reply_text("You're not registered yet. Use /verify to get started.")
         return
 
-    user = users[chat_id]
     await update.message.reply_text("⏳ Checking for any attendance updates...")
     try:
-        new_attendance = await scrape_attendance(user['username'], user['password'])
+        new_attendance, fetched_at = await fetch_for_command(user)
+        # Dated when it was scraped: it may be a cached or joined result
+        users_store.record_history(chat_id, new_attendance, fetched_at)
         changes = compare_attendance(user.get('lastAttendance', {}), new_attendance)
 
         if changes:
             change_msg = build_change_message(changes)
-            await update.message.reply_markdown(change_msg)
-            users[chat_id]['lastAttendance'] = new_attendance
-            save_users(users)
+            await update.message.reply_markdown(change_msg + f"\n\n_{format_age(fetched_at)}_")
+            _shown(chat_id, new_attendance)
         else:
-            await update.message.reply_text("✅ No new attendance changes detected.")
+            await update.message.reply_text(
+                f"✅ No new attendance changes detected.\n{format_age(fetched_at)}"
+            )
 
+    except CircuitOpen:
+        await update.message.reply_text(ERP_UNREACHABLE_MSG)
     except Exception as e:
         logger.error(f"Error checking attendance for {chat_id}: {e}")
         await update.message.reply_text("❌ Could not fetch attendance. Try again later.")
 
 async def cmd_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = str(update.effective_chat.id)
-    users = load_users()
-    if chat_id not in users:
+    user = users_store.get(chat_id)
+    if user is None:
         await update.message.reply_text("You're not registered yet. Use /verify to get started.")
         return
 
-    user = users[chat_id]
     await update.message.reply_text("⏳ Fetching your attendance...")
     try:
-        attendance = await scrape_attendance(user['username'], user['password'])
-        users[chat_id]['lastAttendance'] = attendance
-        save_users(users)
+        attendance, fetched_at = await fetch_for_command(user)
+        users_store.record_history(chat_id, attendance, fetched_at)
         await update.message.reply_markdown(format_attendance_short(attendance))
-        await update.message.reply_text(f"📈 Overall: {total_percentage(attendance)}")
+        await update.message.reply_text(
+            f"📈 Overall: {total_percentage(attendance)}\n{format_age(fetched_at)}"
+        )
+        _shown(chat_id, attendance)
+    except CircuitOpen:
+        await update.message.reply_text(ERP_UNREACHABLE_MSG)
     except Exception as e:
         logger.error(f"Error fetching attendance for {chat_id}: {e}")
         await update.message.reply_text("❌ Could not fetch attendance. Try again later.")
@@ -168,52 +305,113 @@ async def cmd_all(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
 
 async def cmd_low(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = str(update.effective_chat.id)
-    users = load_users()
-    if chat_id not in users:
+    user = users_store.get(chat_id)
+    if user is None:
         await update.message.reply_text("You're not registered yet. Use /verify to get started.")
         return
 
-    user = users[chat_id]
     await update.message.reply_text("⏳ Fetching your attendance...")
     try:
-        attendance = await scrape_attendance(user['username'], user['password'])
-        users[chat_id]['lastAttendance'] = attendance
-        save_users(users)
+        attendance, fetched_at = await fetch_for_command(user)
+        users_store.record_history(chat_id, attendance, fetched_at)
         low_msg = format_low_attendance(attendance)
-        await update.message.reply_markdown(low_msg or "🎉 All subjects are above 75%!")
+        await update.message.reply_markdown(
+            (low_msg or "🎉 All subjects are above 75%!") + f"\n\n_{format_age(fetched_at)}_"
+        )
+        _shown(chat_id, attendance)
+    except CircuitOpen:
+        await update.message.reply_text(ERP_UNREACHABLE_MSG)
     except Exception as e:
         logger.error(f"Error fetching attendance for {chat_id}: {e}")
         await update.message.reply_text("❌ Could not fetch attendance. Try again later.")
 
 
+def _match_subject(query: str, subjects) -> str | None:
+    query = query.strip().lower()
+    for subject in subjects:
+        if to_short_name(subject).lower() == query:
+            return subject
+    for subject in subjects:
+        if query in subject.lower():
+            return subject
+    return None
+
+
+async def cmd_history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = str(update.effective_chat.id)
+    user = users_store.get(chat_id)
+    if user is None:
+        await update.message.reply_text("You're not registered yet. Use /verify to get started.")
+        return
+
+    if context.args:
+        query = ' '.join(context.args)
+        subject = _match_subject(query, [entry['subject'] for entry in users_store.trend(chat_id)])
+        if subject is None:
+            await update.message.reply_text(f"No history for a subject matching \"{query}\".")
+            return
+        events = users_store.history(chat_id, subject=subject, limit=20)
+        await update.message.reply_markdown(format_history(events, subject))
+        return
+
+    await update.message.reply_markdown(format_trend(users_store.trend(chat_id)))
+    await update.message.reply_markdown(format_history(users_store.history(chat_id)))
+
+
+async def cmd_stats(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = str(update.effective_chat.id)
+    if chat_id not in ADMIN_CHAT_IDS:
+        return  # admin-only; stay silent for everyone else
+
+    live = (
+        f"Users: {users_store.count()} registered, {len(poller.users)} scheduled\n"
+        f"ERP poll rate: {poller.erp_rate_per_minute():.1f}/min\n"
+        f"Notification backlog: {notifier.backlog}\n"
+        f"Memory: {memory_watchdog.describe()}\n"
+        f"Shards: {shard_leases.describe()}\n"
+    )
+    await update.message.reply_text(f"📊 Bot stats\n\n{live}\n{metrics.summary()}")
+
+
+def build_report() -> dict:
+    return cohort_report(load_matrix(users_store.snapshots()))
+
+
+async def cmd_report(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    chat_id = str(update.effective_chat.id)
+    if chat_id not in ADMIN_CHAT_IDS:
+        return  # admin-only; stay silent for everyone else
+
+    # Reads every user's row; keep it off the event loop
+    report = await asyncio.to_thread(build_report)
+
+    if context.args and context.args[0].lower() == 'csv':
+        stamp = datetime.now().strftime('%Y%m%d-%H%M')
+        await update.message.reply_document(subjects_csv(report), filename=f"report-subjects-{stamp}.csv")
+        await update.message.reply_document(at_risk_csv(report), filename=f"report-at-risk-{stamp}.csv")
+        return
+    await update.message.reply_markdown(format_report(report))
+
+
 async def cmd_pause(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = str(update.effective_chat.id)
-    users = load_users()
-    if chat_id not in users:
+    if not users_store.set_notifications(chat_id, False):
         await update.message.reply_text("You're not registered yet. Use /verify to get started.")
         return
-    users[chat_id]['notificationsEnabled'] = False
-    save_users(users)
     await update.message.reply_text("🔕 Notifications paused. Use /resume to turn them back on.")
 
 
 async def cmd_resume(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = str(update.effective_chat.id)
-    users = load_users()
-    if chat_id not in users:
+    if not users_store.set_notifications(chat_id, True):
         await update.message.reply_text("You're not registered yet. Use /verify to get started.")
         return
-    users[chat_id]['notificationsEnabled'] = True
-    save_users(users)
     await update.message.reply_text("🔔 Notifications resumed!")
 
 
 async def cmd_unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = str(update.effective_chat.id)
-    users = load_users()
-    if chat_id in users:
-        del users[chat_id]
-        save_users(users)
+    users_store.delete(chat_id)
     await update.message.reply_text(
         "👋 You've been removed. Bye! Use /verify anytime to come back."
     )
@@ -225,10 +423,10 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     chat_id = str(update.effective_chat.id)
     text = update.message.text.strip()
 
-    if chat_id not in pending_verify:
-        return  # Ignore unknown messages
-
-    state = pending_verify[chat_id]
+    state = pending_verify.get(chat_id)
+    if state is None or time.time() - state['started'] > VERIFY_TTL_SECONDS:
+        pending_verify.pop(chat_id, None)
+        return  # Ignore unknown (or expired) messages
 
     if state['step'] == 'username':
         state['username'] = text
@@ -240,26 +438,39 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         password = text
         await update.message.reply_text("⏳ Verifying your credentials...")
 
-        valid = await verify_login(state['username'], password)
-        if not valid:
+        # One login both checks the password and fetches the first snapshot
+        try:
+            async with command_scrapes:
+                attendance = await erp_circuit.call(dispatch_login_and_fetch, state['username'], password)
+        except CircuitOpen:
+            await update.message.reply_text(ERP_UNREACHABLE_MSG)
+            pending_verify.pop(chat_id, None)
+            return
+        except Exception as e:
+            logger.error(f"[Verify] Registration failed for {state['username']}: {e}")
+            await update.message.reply_text(
+                "⚠️ Couldn't reach the ERP right now. Try /verify again in a bit."
+            )
+            pending_verify.pop(chat_id, None)
+            return
+
+        if attendance is None:
             await update.message.reply_text(
                 "❌ Invalid username or password. Try /verify again."
             )
-            del pending_verify[chat_id]
+            pending_verify.pop(chat_id, None)
             return
 
-        # Fetch initial attendance snapshot
-        attendance = await scrape_attendance(state['username'], password)
-        users = load_users()
-        users[chat_id] = {
+        scrapes.put(state['username'], attendance)
+        users_store.upsert({
             'chat_id': chat_id,
             'username': state['username'],
             'password': password,  # Consider encrypting — see README
             'lastAttendance': attendance,
             'notificationsEnabled': True,
-        }
-        save_users(users)
-        del pending_verify[chat_id]
+        })
+        users_store.record_history(chat_id, attendance)
+        pending_verify.pop(chat_id, None)
 
         await update.message.reply_markdown(
             "✅ Verified and registered!\n\n"
@@ -271,37 +482,220 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
 
 # ─── Polling ─────────────────────────────────────────────────────────────────
 
-async def poll_all_users(app: Application) -> None:
-    if not is_college_hours():
-        logger.info("[Poll] Outside college hours, skipping.")
-        return
-
-    users = load_users()
-    for chat_id, user in users.items():
-        if not user.get('notificationsEnabled', True):
-            continue
-        try:
-            new_attendance = await scrape_attendance(user['username'], user['password'])
-            changes = compare_attendance(user.get('lastAttendance', {}), new_attendance)
-
-            if changes:
-                change_msg = build_change_message(changes)
-                await app.bot.send_message(
-                    chat_id=int(chat_id),
-                    text=change_msg,
-                    parse_mode='Markdown',
+async def poll_user(app: Application, chat_id: str, user: dict, scraped: dict) -> bool:
+    """Scrapes one user and notifies them; returns True if anything changed."""
+    new_attendance, fetched_at = await scrapes.get(user['username'], user['password'], max_age=0)
+    scraped[chat_id] = (new_attendance, fetched_at)
+    poller.set_cohort(chat_id, new_attendance)
+    changes = compare_attendance(user.get('lastAttendance', {}), new_attendance)
+
+    if changes:
+        metrics.inc('changes_detected_total', len(changes))
+        notify(chat_id, changes, new_attendance)
+        logger.info(f"[Poll] Queued notification for {chat_id} about {len(changes)} change(s).")
+
+        # The rest of the section was most likely just updated too
+        mates = poller.promote_cohort(chat_id)
+        if mates:
+            metrics.inc('cohort_promotions_total', len(mates))
+            logger.info(f"[Poll] Polling {len(mates)} classmate(s) of {chat_id} next.")
+    else:
+        logger.info(f"[Poll] No changes for {chat_id}.")
+    return bool(changes)
+
+
+def _checkpoint(chat_id: str, scraped: tuple | None) -> None:
+    state = poller.users.get(chat_id)
+    if state is not None:
+        snapshot, fetched_at = scraped or (None, None)
+        users_store.checkpoint_poll(chat_id, state, snapshot, fetched_at)
+
+
+async def poll_users(app: Application, users: dict) -> None:
+    """Polls a batch of users with a bounded worker pool and reschedules each one."""
+    users = dict(users)  # grows as classmates are promoted mid-batch
+    pending = deque(users.items())
+
+    total = len(pending)
+    scraped: dict = {}  # chat_id -> (attendance, fetched_at), for the history table
+    durations: list = []
+    failures = 0
+    started_polls: set = set()
+    tasks: set = set()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    def take_promoted() -> None:
+        # Classmates of a user whose change this batch just found go to the
+        # front now, not after everyone else in it (see poll_user)
+        nonlocal total
+        promoted = poller.pop_promoted()
+        if not promoted:
+            return
+        mates = users_store.get_many(promoted)
+        for chat_id in set(promoted) - mates.keys():
+            poller.requeue(chat_id)  # deleted meanwhile; the next sync drops them
+        for chat_id, user in mates.items():
+            users[chat_id] = user
+            pending.appendleft((chat_id, user))
+        total += len(mates)
+        grow()
+
+    def grow() -> None:
+        while len(tasks) < min(POLL_CONCURRENCY, len(pending)):
+            task = asyncio.create_task(worker())
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    async def worker() -> None:
+        nonlocal failures
+        while not erp_circuit.is_open and not _stopping:
+            take_promoted()
+            if not pending:
+                return
+            chat_id, user = pending.popleft()
+            if not shard_leases.owns(chat_id):
+                continue  # shard lost since the batch started; its new owner polls them
+            t0 = loop.time()
+            started_polls.add(chat_id)
+            try:
+                changed = await asyncio.wait_for(
+                    poll_user(app, chat_id, user, scraped), POLL_USER_TIMEOUT_SECONDS
                 )
-                users[chat_id]['lastAttendance'] = new_attendance
-                save_users(users)
-                logger.info(f"[Poll] Notified {chat_id} about {len(changes)} change(s).")
+                durations.append(loop.time() - t0)
+                poller.record(chat_id, changed)
+            except asyncio.TimeoutError:
+                failures += 1
+                poller.record(chat_id, changed=False, failed=True)
+                logger.error(f"[Poll] Timed out for {chat_id} after {POLL_USER_TIMEOUT_SECONDS}s.")
+            except Exception as e:
+                failures += 1
+                poller.record(chat_id, changed=False, failed=True)
+                logger.error(f"[Poll] Error for {chat_id}: {e}")
+            _checkpoint(chat_id, scraped.get(chat_id))
+
+    async def run() -> None:
+        grow()
+        while tasks:
+            await asyncio.gather(*tasks)
+
+    try:
+        with metrics.timer('poll_batch_seconds'):
+            await asyncio.wait_for(run(), POLL_BATCH_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.error(
+            f"[Poll] Batch overran {POLL_BATCH_TIMEOUT_SECONDS}s, cancelled with "
+            f"{len(pending)} user(s) not polled."
+        )
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Anyone still in flight goes back into the queue, uncheckpointed, so
+        # after a restart they're still overdue. A poll cancelled midway
+        # counts as failed; users never reached (the circuit opened, the
+        # batch overran) keep their old due time and go out with the next one.
+        for chat_id in users:
+            if poller.users.get(chat_id, {}).get('due') != float('inf'):
+                continue
+            if chat_id in started_polls:
+                poller.record(chat_id, changed=False, failed=True)
             else:
-                logger.info(f"[Poll] No changes for {chat_id}.")
-        except Exception as e:
-            logger.error(f"[Poll] Error for {chat_id}: {e}")
+                poller.requeue(chat_id)
+
+    await flush_delivered(None)
+    logger.info(
+        f"[Poll] Batch done: {len(durations) + failures}/{total} polled, "
+        f"{failures} failed, p50={_percentile(durations, 50):.1f}s "
+        f"p95={_percentile(durations, 95):.1f}s, wall={loop.time() - started:.1f}s."
+    )
 
 
 async def poll_job(context: ContextTypes.DEFAULT_TYPE) -> None:
-    await poll_all_users(context.application)
+    """Scheduler tick: starts a batch for every user whose poll is due."""
+    if is_college_hours():
+        await start_poll_batch(context.application)
+
+
+async def start_poll_batch(app: Application) -> None:
+    global _poll_task
+    if _poll_task is not None and not _poll_task.done():
+        return  # previous batch still running; its users are rescheduled as they finish
+    if not await erp_circuit.available():
+        return  # ERP down: due users stay due until a probe succeeds
+
+    _sync_schedule()
+    poller.log_stats()
+    due = poller.pop_due(limit=POLL_BATCH_LIMIT)
+    if due:
+        # Not app.create_task(): Application.stop() would wait for the whole
+        # batch, while post_stop() only lets in-flight scrapes finish
+        _poll_task = asyncio.create_task(poll_users(app, users_store.get_many(due)))
+
+
+def _seed_cohorts(chat_ids: list) -> None:
+    for chat_id, user in users_store.get_many(chat_ids).items():
+        poller.set_cohort(chat_id, user.get('lastAttendance', {}))
+
+
+def _sync_schedule() -> None:
+    """Brings the scheduler in line with the users this instance owns."""
+    chat_ids = [c for c in users_store.chat_ids(enabled_only=True) if shard_leases.owns(c)]
+    fresh = [c for c in chat_ids if c not in poller.users]
+    if fresh:
+        # Carry on from the last checkpoint (ours before a restart, or the
+        # previous owner's) rather than treating them as new
+        _seed_cohorts(poller.restore(users_store.load_poll_state(fresh)))
+    _seed_cohorts(poller.sync(chat_ids))
+
+
+def _busy_shards() -> set:
+    """Shards with a user popped for polling and not recorded yet."""
+    return {
+        shard_of(chat_id, shard_leases.shard_count)
+        for chat_id, state in poller.users.items()
+        if state['due'] == float('inf')
+    }
+
+
+shard_leases.busy_shards = _busy_shards
+
+
+async def drain_outbox(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Leader only: queues notifications the other instances left in the store."""
+    global _outbox_read
+    if not shard_leases.is_leader:
+        return
+    if _stop_updates is None:
+        await _take_updates(context.application)
+    # Rows are deleted on delivery (see _delivered); ones dropped unsent
+    # stay behind and are re-read by the next leader
+    for outbox_id, chat_id, changes, snapshot in users_store.read_outbox(_outbox_read):
+        notifier.enqueue(chat_id, changes, snapshot)
+        _outbox_ids[chat_id] = outbox_id
+        _outbox_read = outbox_id
+
+
+# ─── Update latency ──────────────────────────────────────────────────────────
+
+# update_id -> perf_counter() when the first handler group started on it
+_update_started: dict = {}
+
+
+async def _mark_update_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    _update_started[update.update_id] = time.perf_counter()
+
+
+async def _mark_update_done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    # Runs after the group 0 handler (and so its reply) has finished
+    started = _update_started.pop(update.update_id, None)
+    if started is not None:
+        metrics.observe('update_seconds', time.perf_counter() - started, mode=BOT_MODE)
+    message = update.effective_message
+    if message is not None and message.date is not None:
+        # Telegram timestamps have 1s resolution, but this includes delivery
+        metrics.observe('update_lag_seconds', time.time() - message.date.timestamp(), mode=BOT_MODE)
 
 
 # ─── Main ─────────────────────────────────────────────────────────────────────
@@ -311,6 +705,7 @@ async def post_init(app: Application) -> None:
         BotCommand("check",       "Check for new attendance updates"),
         BotCommand("all",         "Full attendance with complete subject names"),
         BotCommand("low",         "Show only subjects below 75%"),
+        BotCommand("history",     "Attendance trend and recent changes"),
         BotCommand("pause",       "Pause auto-notifications"),
         BotCommand("resume",      "Resume auto-notifications"),
         BotCommand("unsubscribe", "Remove your account from the bot"),
@@ -318,11 +713,68 @@ async def post_init(app: Application) -> None:
         BotCommand("pdf",  "Start creating a PDF from images"),
         BotCommand("done", "Finish and generate the PDF"),
     ])
+    if SCRAPE_WORKERS > 0:
+        await scrape_workers.start()
+    elif SCRAPE_ENGINE == 'playwright':
+        await browser_pool.start()
+    notifier.start(app.bot)
+
+    global _metrics_runner
+    _metrics_runner = await serve_metrics()
+    await memory_watchdog.check()
+    memory_watchdog.start()
+
+    # Pick up where the last run left off instead of starting a fresh sweep
+    shard_leases.on_leadership = functools.partial(_set_leading, app)
+    await shard_leases.start()
+    _sync_schedule()
+
+
+async def post_stop(app: Application) -> None:
+    global _stopping
+    _stopping = True
+    if _poll_task is not None and not _poll_task.done():
+        logger.info("[Poll] Letting in-flight scrapes finish before shutting down...")
+        try:
+            await asyncio.wait_for(asyncio.shield(_poll_task), POLL_USER_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            _poll_task.cancel()
+            await asyncio.gather(_poll_task, return_exceptions=True)
+
+    # Only once nothing is mid-poll: the new owners resume from our checkpoints
+    await shard_leases.stop()
+
+    # Drain notifications while app.bot can still send
+    await notifier.stop()
+    await flush_delivered(None)
+
+
+async def post_shutdown(app: Application) -> None:
+    if _metrics_runner is not None:
+        await _metrics_runner.cleanup()
+    await memory_watchdog.stop()
+    await scrape_workers.stop()
+    await browser_pool.close()
+    await http_engine.close()
 
 
 def main() -> None:
-    
-    app = Application.builder().token(BOT_TOKEN).post_init(post_init).build()
+    users_store.migrate_json(USERS_FILE)
+
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(TELEGRAM_BASE_URL)
+        .concurrent_updates(ChatOrderedProcessor())
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    # Update-to-reply latency, see metrics update_seconds / update_lag_seconds
+    app.add_handler(TypeHandler(Update, _mark_update_start), group=-1)
+    app.add_handler(TypeHandler(Update, _mark_update_done), group=1)
 
     # Commands
     app.add_handler(CommandHandler("start", cmd_start))
@@ -331,18 +783,86 @@ def main() -> None:
     app.add_handler(CommandHandler("check", cmd_check))
     app.add_handler(CommandHandler("all", cmd_all))
     app.add_handler(CommandHandler("low", cmd_low))
+    app.add_handler(CommandHandler("history", cmd_history))
     app.add_handler(CommandHandler("pause", cmd_pause))
     app.add_handler(CommandHandler("resume", cmd_resume))
     app.add_handler(CommandHandler("unsubscribe", cmd_unsubscribe))
+    app.add_handler(CommandHandler("stats", cmd_stats))
+    app.add_handler(CommandHandler("report", cmd_report))
 
     # Multi-step verify text handler
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
     #register_pdf_handlers(app)
     # Polling job
-    app.job_queue.run_repeating(poll_job, interval=POLL_INTERVAL_SECONDS, first=10)
-
-    logger.info("Bot started!")
-    app.run_polling()
+    app.job_queue.run_repeating(poll_job, interval=SCHEDULER_TICK_SECONDS, first=10)
+    app.job_queue.run_repeating(expire_pending_verify, interval=60)
+    app.job_queue.run_repeating(flush_delivered, interval=DELIVERY_FLUSH_SECONDS)
+    if shard_leases.enabled:
+        app.job_queue.run_repeating(drain_outbox, interval=OUTBOX_DRAIN_SECONDS)
+
+    logger.info(f"Bot started! ({BOT_MODE}, shards: {shard_leases.describe()})")
+    if BOT_MODE == 'webhook' or shard_leases.enabled:
+        asyncio.run(run_instance(app))
+    else:
+        app.run_polling()
+
+
+async def start_updates(app: Application):
+    """Starts taking Telegram updates in BOT_MODE; returns a coroutine function that stops it."""
+    if BOT_MODE == 'webhook':
+        runner = await webhook.serve(app)
+        return runner.cleanup
+    await app.updater.start_polling()
+    return app.updater.stop
+
+
+async def _take_updates(app: Application) -> None:
+    global _stop_updates
+    try:
+        _stop_updates = await start_updates(app)
+    except OSError as e:
+        if not shard_leases.enabled:
+            raise
+        # The previous leader on this host may not have let go of
+        # WEBHOOK_PORT yet; drain_outbox retries while we lead
+        logger.error(f"[Shard] Could not start taking updates ({e}), retrying.")
+
+
+async def _set_leading(app: Application, leading: bool) -> None:
+    global _stop_updates, _outbox_read
+    if leading:
+        _outbox_read = 0  # pick up whatever the last leader left unsent
+    if leading and _stop_updates is None:
+        await _take_updates(app)
+    elif not leading and _stop_updates is not None:
+        stop, _stop_updates = _stop_updates, None
+        await stop()
+
+
+async def run_instance(app: Application) -> None:
+    """
+    app.run_polling() equivalent for webhook mode and sharded instances.
+    Updates are only taken in while this instance leads, which unsharded
+    is always; a sharded follower just polls the ERP for its own users.
+    """
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await app.initialize()
+    await post_init(app)
+    await app.start()
+    if shard_leases.is_leader:
+        await _set_leading(app, True)
+    try:
+        await stop.wait()
+    finally:
+        await _set_leading(app, False)
+        await app.stop()
+        await post_stop(app)
+        await app.shutdown()
+        await post_shutdown(app)
 
 
 if __name__ == "__main__":
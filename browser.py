@@ -1,77 +1,143 @@
 """
 browser.py
-Scrapes attendance for a given user using Playwright.
+Scrapes attendance for a given user.
+
+SCRAPE_ENGINE picks the engine:
+  "playwright" (default) - headless Chromium from the shared pool
+  "http"                 - http_engine (no browser), falling back to
+                           Playwright when the page can't be parsed
 
 Returns: { subject_name: { "present": int, "total": int } }
+
+login_and_fetch() is the /verify variant: one fresh login that both checks
+the credentials and returns the first snapshot, seeding the session cache.
 """
 
-import re
-from playwright.async_api import async_playwright
 import asyncio
+import logging
+import os
+
+import http_engine
+from erp import ATTENDANCE_URL, LOGIN_URL, ROWS_SELECTOR, parse_attendance_table
+from metrics import metrics
+from nav import Navigator
+from pool import browser_pool
+from sessions import session_cache
+
+SCRAPE_ENGINE = os.getenv("SCRAPE_ENGINE", "playwright")
+
+logger = logging.getLogger(__name__)
 
 
 async def scrape_attendance(username: str, password: str) -> dict:
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
-       
+    if SCRAPE_ENGINE == 'http':
         try:
-            await page.goto('https://erp.mit.asia/login.html')
-            await _perform_login(page, username, password)
-            await page.wait_for_load_state('load')
-            await page.goto(
-                'https://erp.mit.asia/studentCourseFileNew.htm?shwA=%2700A%27'
-            )
-            await page.wait_for_load_state('load')
+            return await _counted('http', http_engine.scrape_attendance(username, password))
+        except http_engine.EngineError as e:
+            logger.warning(f"[Scrape] HTTP engine failed for {username} ({e}), using Playwright.")
+    return await _counted('playwright', _scrape_with_browser(username, password))
+
+
+async def _counted(engine: str, scrape) -> dict:
+    try:
+        with metrics.timer('scrape_seconds', engine=engine):
+            attendance = await scrape
+    except (Exception, asyncio.CancelledError) as e:
+        metrics.inc('scrapes_total', engine=engine, result='error')
+        metrics.inc('scrape_failures_total', engine=engine, type=type(e).__name__)
+        raise
+    metrics.inc('scrapes_total', engine=engine, result='ok')
+    return attendance
+
+
+async def _scrape_with_browser(username: str, password: str) -> dict:
+    async with browser_pool.context() as context:
+        cookies = session_cache.get(username)
+        if cookies:
+            await context.add_cookies(cookies)
+        nav = Navigator(await context.new_page())
+        page = nav.page
+
+        if cookies:
+            await nav.goto(ATTENDANCE_URL, 'attendance')
+
+        # No cached session, or the ERP bounced it back to login: log in fresh
+        logged_in = False
+        if not cookies or 'login.htm' in page.url:
+            if cookies:
+                session_cache.invalidate(username)
+            if 'login.htm' not in page.url:
+                await nav.goto(LOGIN_URL, 'login_page')
+            await nav.login(username, password)
+            if 'failure=true' in page.url:
+                raise http_engine.LoginFailed(username)
+            await nav.goto(ATTENDANCE_URL, 'attendance')
 
             # If redirected to login, authenticate again
             if 'login.htm' in page.url:
-                await _perform_login(page, username, password)
-                await page.goto('https://erp.mit.asia/studentCourseFileNew.htm?shwA=%2700A%27')
-                await page.wait_for_load_state('load')
+                await nav.login(username, password)
+                await nav.goto(ATTENDANCE_URL, 'attendance')
+            logged_in = True
 
-            # Wait for table
-            await page.wait_for_selector('#attendanceDiv table tbody tr', timeout=15000)
+        # Wait for table
+        await nav.wait_for(ROWS_SELECTOR, 'table')
 
-            rows = page.locator('#attendanceDiv table tbody tr')
-            count = await rows.count()
-            attendance = {}
+        async with nav.step('extract'):
+            attendance = await extract_attendance(page)
 
-            for i in range(count):
-                row = rows.nth(i)
-                cell_count = await row.locator('td').count()
-                if cell_count < 3:
-                    continue
+        if logged_in:
+            session_cache.put(username, await context.cookies())
 
-                course = (await row.locator('td').nth(1).inner_text()).strip()
-                raw = (await row.locator('td').nth(2).locator('a').inner_text()).strip()
+        await nav.report(f"scrape {username}")
+        return attendance
 
-                # Parse "7/7" format
-                match = re.search(r'(\d+)\s*/\s*(\d+)', raw)
-                if match:
-                    attendance[course] = {
-                        'present': int(match.group(1)),
-                        'total': int(match.group(2)),
-                    }
 
-            return attendance
+async def extract_attendance(page) -> dict:
+    # One round trip for the whole table; parsing happens on our side
+    html = await page.eval_on_selector('#attendanceDiv', 'el => el.outerHTML')
+    return parse_attendance_table(html)
 
-        finally:
-            await browser.close()
 
+async def login_and_fetch(username: str, password: str) -> dict | None:
+    """Returns the attendance, or None if the ERP rejected the credentials."""
+    try:
+        attendance = None
+        if SCRAPE_ENGINE == 'http':
+            try:
+                attendance = await http_engine.login_and_fetch(username, password)
+            except http_engine.EngineError as e:
+                logger.warning(f"[Verify] HTTP engine failed for {username} ({e}), using Playwright.")
+        if attendance is None:
+            attendance = await _login_and_fetch_with_browser(username, password)
+
+    except http_engine.LoginFailed:
+        attendance = None
+    except Exception:
+        metrics.inc('verify_total', result='error')
+        raise
+
+    metrics.inc('verify_total', result='ok' if attendance is not None else 'rejected')
+    return attendance
+
+
+async def _login_and_fetch_with_browser(username: str, password: str) -> dict | None:
+    async with browser_pool.context() as context:
+        nav = Navigator(await context.new_page())
+        page = nav.page
+
+        await nav.goto(LOGIN_URL, 'login_page')
+        await nav.login(username, password)
+        if 'failure=true' in page.url:
+            await nav.report(f"verify {username}")
+            return None
+
+        await nav.goto(ATTENDANCE_URL, 'attendance')
+        await nav.wait_for(ROWS_SELECTOR, 'table')
+
+        async with nav.step('extract'):
+            attendance = await extract_attendance(page)
+        session_cache.put(username, await context.cookies())
+
+        await nav.report(f"verify {username}")
+        return attendance
 
-async def _perform_login(page, username: str, password: str) -> None:
-    await page.get_by_role('textbox', name='Enter username').fill(username)
-    await page.get_by_role('textbox', name='Enter password').fill(password)
-    await page.get_by_role('button', name='Login').click()
-    await page.wait_for_load_state('load')
-"""
-async def main():
-    # Call the function and await the result
-    data = await scrape_attendance("makrand.shinde@mit.asia", "261224")
-    print(data)
-
-if __name__ == "__main__":
-    # This starts the event loop and runs your async code
-    asyncio.run(main())
-"""
\ No newline at end of file
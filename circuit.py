@@ -0,0 +1,140 @@
+"""
+circuit.py
+Circuit breaker around the ERP.
+
+After ERP_FAILURE_THRESHOLD consecutive failed scrapes the circuit opens:
+calls fail straight away with CircuitOpen instead of each waiting out its
+own browser timeouts, and poll sweeps are skipped. Once the cooldown has
+passed, the next caller sends one cheap probe (a GET of the login page);
+if it answers the circuit closes, otherwise it stays open for twice as
+long, up to ERP_MAX_COOLDOWN_SECONDS.
+
+Rejected credentials (LoginFailed) and scrape worker crashes
+(WorkerCrashed) say nothing about the ERP's health and are not counted as
+failures.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+import httpx
+
+from erp import LOGIN_URL
+from metrics import metrics
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+ERP_FAILURE_THRESHOLD = int(os.getenv("ERP_FAILURE_THRESHOLD", "5"))
+ERP_COOLDOWN_SECONDS = int(os.getenv("ERP_COOLDOWN_SECONDS", "60"))
+ERP_MAX_COOLDOWN_SECONDS = int(os.getenv("ERP_MAX_COOLDOWN_SECONDS", "600"))
+ERP_PROBE_TIMEOUT_SECONDS = float(os.getenv("ERP_PROBE_TIMEOUT_SECONDS", "5"))
+
+# Exception names (or ScrapeWorkerError kinds) that aren't the ERP's fault
+IGNORED_ERRORS = {'LoginFailed', 'WorkerCrashed'}
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    """The ERP is considered down; the call was not attempted."""
+
+
+async def probe_erp() -> bool:
+    try:
+        async with httpx.AsyncClient(timeout=ERP_PROBE_TIMEOUT_SECONDS) as client:
+            response = await client.get(LOGIN_URL)
+        return response.status_code < 500
+    except httpx.HTTPError:
+        return False
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        probe=probe_erp,
+        threshold: int = ERP_FAILURE_THRESHOLD,
+        cooldown: int = ERP_COOLDOWN_SECONDS,
+        max_cooldown: int = ERP_MAX_COOLDOWN_SECONDS,
+    ):
+        self.probe = probe
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+
+        self.failures = 0         # consecutive
+        self.opened_at = None     # None while closed
+        self.cooldown = cooldown
+        self._probe_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def _open(self, reason: str) -> None:
+        if self.opened_at is None:
+            self.cooldown = self.base_cooldown
+            logger.error(f"[Circuit] ERP marked unreachable ({reason}).")
+        else:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+        self.opened_at = time.monotonic()
+        metrics.inc('circuit_transitions_total', state='open')
+        logger.warning(f"[Circuit] Open, next probe in {self.cooldown}s.")
+
+    def _close(self) -> None:
+        if self.opened_at is not None:
+            logger.info("[Circuit] ERP reachable again, closing.")
+            metrics.inc('circuit_transitions_total', state='closed')
+        self.opened_at = None
+        self.failures = 0
+
+    # ─── Recording ───────────────────────────────────────────────────────────
+
+    def record_success(self) -> None:
+        self._close()
+
+    def record_failure(self, error: BaseException) -> None:
+        if type(error).__name__ in IGNORED_ERRORS or getattr(error, 'kind', None) in IGNORED_ERRORS:
+            return
+        self.failures += 1
+        if not self.is_open and self.failures >= self.threshold:
+            self._open(f"{self.failures} failures in a row, last: {type(error).__name__}")
+
+    # ─── Gate ────────────────────────────────────────────────────────────────
+
+    async def available(self) -> bool:
+        """True if calls may go through, probing the ERP if the cooldown is over."""
+        if not self.is_open:
+            return True
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return False
+
+        async with self._probe_lock:
+            # Someone else probed while we waited for the lock
+            if not self.is_open:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return False
+            if await self.probe():
+                self._close()
+                return True
+            self._open('probe failed')
+            return False
+
+    async def call(self, fn, *args):
+        if not await self.available():
+            raise CircuitOpen('ERP unreachable')
+        try:
+            result = await fn(*args)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.record_failure(e)
+            raise
+        self.record_success()
+        return result
+
+
+# Shared by scrapes, registration and the poll scheduler
+erp_circuit = CircuitBreaker()
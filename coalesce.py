@@ -0,0 +1,79 @@
+"""
+coalesce.py
+Single-flight scraping with a short-lived result cache.
+
+Requests for the same username share one in-flight scrape, and a result
+younger than SCRAPE_CACHE_TTL_SECONDS is returned straight away. Poll
+sweeps ask for max_age=0 so they always scrape (joining any scrape that's
+already running) and refresh the cache for the on-demand commands.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+SCRAPE_CACHE_TTL_SECONDS = int(os.getenv("SCRAPE_CACHE_TTL_SECONDS", "120"))
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeCoalescer:
+    def __init__(self, fetch, ttl: int = SCRAPE_CACHE_TTL_SECONDS):
+        # fetch(username, password) -> attendance dict
+        self.fetch = fetch
+        self.ttl = ttl
+        self._cache: dict = {}     # username -> (fetched_at, attendance)
+        self._inflight: dict = {}  # username -> Task
+        self._waiters: dict = {}   # username -> number of callers awaiting the task
+
+    def peek(self, username: str, max_age: float | None = None) -> tuple | None:
+        """(attendance, fetched_at) if cached and fresh enough, else None."""
+        entry = self._cache.get(username)
+        if entry is None:
+            return None
+        fetched_at, attendance = entry
+        if time.time() - fetched_at > (self.ttl if max_age is None else max_age):
+            return None
+        return attendance, fetched_at
+
+    def put(self, username: str, attendance: dict, fetched_at: float | None = None) -> None:
+        self._cache[username] = (fetched_at or time.time(), attendance)
+
+    def invalidate(self, username: str) -> None:
+        self._cache.pop(username, None)
+
+    async def get(self, username: str, password: str, max_age: float | None = None) -> tuple:
+        """Returns (attendance, fetched_at)."""
+        cached = self.peek(username, max_age)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(username)
+        if task is None:
+            task = asyncio.create_task(self._run(username, password))
+            self._inflight[username] = task
+        else:
+            logger.info(f"[Coalesce] Joining in-flight scrape for {username}.")
+
+        self._waiters[username] = self._waiters.get(username, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Only stop the scrape once nobody is waiting for it any more
+            if self._waiters.get(username) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            self._waiters[username] -= 1
+            if not self._waiters[username]:
+                del self._waiters[username]
+
+    async def _run(self, username: str, password: str) -> tuple:
+        try:
+            attendance = await self.fetch(username, password)
+            fetched_at = time.time()
+            self.put(username, attendance, fetched_at)
+            return attendance, fetched_at
+        finally:
+            self._inflight.pop(username, None)
@@ -0,0 +1,96 @@
+"""
+erp.py
+ERP endpoints and HTML parsing shared by both scraping engines.
+
+Attendance shape:
+  { subject_name: { "present": int, "total": int } }
+parse_attendance_table() returns it as a snapshot.Snapshot.
+"""
+
+import os
+import re
+from urllib.parse import urljoin
+
+from selectolax.lexbor import LexborHTMLParser
+
+from snapshot import Snapshot
+
+# ─── Endpoints ───────────────────────────────────────────────────────────────
+
+ERP_BASE_URL = os.getenv("ERP_BASE_URL", "https://erp.mit.asia").rstrip('/')
+LOGIN_URL = f'{ERP_BASE_URL}/login.htm'
+ATTENDANCE_URL = f'{ERP_BASE_URL}/studentCourseFileNew.htm?shwA=%2700A%27'
+
+ROWS_SELECTOR = '#attendanceDiv table tbody tr'
+
+# "7/7", "12 / 15"
+FRACTION_RE = re.compile(r'(\d+)\s*/\s*(\d+)')
+
+
+class AttendanceNotFound(Exception):
+    """The page has no rendered #attendanceDiv rows (e.g. it needs JS)."""
+
+
+class LoginFormNotFound(Exception):
+    """The page has no static form with a password field."""
+
+
+def _text(node) -> str:
+    # Collapse whitespace the way inner_text() renders it
+    return ' '.join(node.text().split())
+
+
+# ─── Attendance table ────────────────────────────────────────────────────────
+
+def parse_attendance_table(html: str) -> Snapshot:
+    rows = LexborHTMLParser(html).css(ROWS_SELECTOR)
+    if not rows:
+        raise AttendanceNotFound('no rows under #attendanceDiv')
+
+    rows_found = []
+    for row in rows:
+        cells = row.css('td')
+        if len(cells) < 3:
+            continue
+
+        course = _text(cells[1])
+        link = cells[2].css_first('a')
+        raw = _text(link if link is not None else cells[2])
+
+        match = FRACTION_RE.search(raw)
+        if match:
+            rows_found.append((course, int(match.group(1)), int(match.group(2))))
+
+    return Snapshot.from_rows(rows_found)
+
+
+# ─── Login form ──────────────────────────────────────────────────────────────
+
+def parse_login_form(html: str, page_url: str) -> tuple:
+    """
+    Returns (action_url, fields, username_field, password_field) for the
+    first form that has a password input. `fields` holds the form's other
+    named inputs with their default values (hidden tokens etc.).
+    """
+    for form in LexborHTMLParser(html).css('form'):
+        password_field = None
+        username_field = None
+        fields = {}
+
+        for field in form.css('input'):
+            name = field.attributes.get('name')
+            if not name:
+                continue
+            kind = (field.attributes.get('type') or 'text').lower()
+            if kind == 'password' and password_field is None:
+                password_field = name
+            elif kind in ('text', 'email') and username_field is None:
+                username_field = name
+            elif kind not in ('submit', 'button', 'image', 'checkbox', 'radio'):
+                fields[name] = field.attributes.get('value') or ''
+
+        if password_field and username_field:
+            action = urljoin(page_url, form.attributes.get('action') or page_url)
+            return action, fields, username_field, password_field
+
+    raise LoginFormNotFound('no login form on page')
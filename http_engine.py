@@ -0,0 +1,171 @@
+"""
+http_engine.py
+Browserless attendance scraper: plain form POST + HTML parsing.
+
+The ERP login and the attendance table are static HTML, so this engine
+does the same steps as browser.py with a pooled async HTTP client. An
+EngineError means "this page can't be handled without a browser" (no
+static login form, no rendered table) and browser.scrape_attendance falls
+back to Playwright. Transport errors and 5xx answers are the ERP's problem,
+not the page's, so they are raised as httpx errors: Chromium would hit the
+same server.
+
+Returns: { subject_name: { "present": int, "total": int } }
+"""
+
+import os
+
+import httpx
+
+from erp import (
+    ATTENDANCE_URL,
+    LOGIN_URL,
+    AttendanceNotFound,
+    LoginFormNotFound,
+    parse_attendance_table,
+    parse_login_form,
+)
+from metrics import metrics
+from sessions import session_cache
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "20"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+
+USER_AGENT = (
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+)
+
+
+class EngineError(Exception):
+    """The HTTP engine couldn't get the table; retry with Playwright."""
+
+
+class LoginFailed(Exception):
+    """The ERP rejected the credentials (login.htm?failure=true)."""
+
+
+# One connection pool shared by every scrape. Each scrape gets its own
+# AsyncClient (and so its own cookie jar) on top of it; those clients are
+# never closed because closing a client closes its transport.
+_transport: httpx.AsyncHTTPTransport | None = None
+
+
+def _client(cookies: list | None) -> httpx.AsyncClient:
+    global _transport
+    if _transport is None:
+        _transport = httpx.AsyncHTTPTransport(
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS),
+            retries=1,
+        )
+
+    jar = httpx.Cookies()
+    for cookie in cookies or []:
+        jar.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''), path=cookie.get('path', '/'))
+
+    return httpx.AsyncClient(
+        transport=_transport,
+        cookies=jar,
+        follow_redirects=True,
+        timeout=HTTP_TIMEOUT_SECONDS,
+        headers={'User-Agent': USER_AGENT},
+    )
+
+
+async def close() -> None:
+    global _transport
+    if _transport is not None:
+        await _transport.aclose()
+        _transport = None
+
+
+def _export_cookies(client: httpx.AsyncClient) -> list:
+    """Cookie jar -> Playwright cookie dicts, so both engines share sessions."""
+    return [
+        {
+            'name': c.name,
+            'value': c.value,
+            'domain': c.domain,
+            'path': c.path or '/',
+            'expires': c.expires if c.expires is not None else -1,
+            'httpOnly': bool(c.has_nonstandard_attr('HttpOnly')),
+            'secure': bool(c.secure),
+            'sameSite': 'Lax',
+        }
+        for c in client.cookies.jar
+    ]
+
+
+# ─── Steps ───────────────────────────────────────────────────────────────────
+
+def _check(response: httpx.Response) -> httpx.Response:
+    if response.is_server_error:
+        response.raise_for_status()
+    return response
+
+
+async def _login(client: httpx.AsyncClient, username: str, password: str, page=None) -> None:
+    if page is None or 'login.htm' not in str(page.url):
+        page = _check(await client.get(LOGIN_URL))
+
+    try:
+        action, fields, user_field, pass_field = parse_login_form(page.text, str(page.url))
+    except LoginFormNotFound as e:
+        raise EngineError(str(e)) from e
+
+    fields[user_field] = username
+    fields[pass_field] = password
+    response = _check(await client.post(action, data=fields))
+
+    if 'failure=true' in str(response.url):
+        raise LoginFailed(username)
+
+
+async def _fetch_table(client: httpx.AsyncClient) -> tuple:
+    """Returns (response, attendance or None if we were sent back to login)."""
+    response = _check(await client.get(ATTENDANCE_URL))
+    if 'login.htm' in str(response.url):
+        return response, None
+    try:
+        return response, parse_attendance_table(response.text)
+    except AttendanceNotFound as e:
+        raise EngineError(str(e)) from e
+
+
+async def scrape_attendance(username: str, password: str) -> dict:
+    cookies = session_cache.get(username)
+    client = _client(cookies)
+
+    attendance = None
+    response = None
+    if cookies:
+        with metrics.time('http_attendance'):
+            response, attendance = await _fetch_table(client)
+        if attendance is None:
+            session_cache.invalidate(username)
+
+    if attendance is None:
+        with metrics.time('http_login'):
+            await _login(client, username, password, response)
+        with metrics.time('http_attendance'):
+            response, attendance = await _fetch_table(client)
+        if attendance is None:
+            raise EngineError('still redirected to login after logging in')
+        session_cache.put(username, _export_cookies(client))
+
+    return attendance
+
+
+async def login_and_fetch(username: str, password: str) -> dict:
+    """Fresh login plus the first table from the same session (raises LoginFailed)."""
+    client = _client(None)
+    with metrics.time('http_login'):
+        await _login(client, username, password)
+    with metrics.time('http_attendance'):
+        _, attendance = await _fetch_table(client)
+    if attendance is None:
+        raise EngineError('still redirected to login after logging in')
+    session_cache.put(username, _export_cookies(client))
+    return attendance
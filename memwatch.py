@@ -0,0 +1,155 @@
+"""
+memwatch.py
+RSS watchdog for the bot and the Chromium processes under it.
+
+Every MEMORY_CHECK_INTERVAL_SECONDS the watchdog:
+  - sums the RSS of this process and all of its descendants (the
+    Playwright driver and every Chromium process)
+  - kills orphaned Chromium processes: Playwright browsers whose driver
+    is gone and that have been re-parented to init
+  - if the total is above MEMORY_CEILING_MB, asks the browser pool to
+    drain and relaunch Chromium (see BrowserPool.recycle)
+
+and logs the figures every MEMORY_LOG_INTERVAL_SECONDS (or right away
+when something happened). With scrape workers each worker process runs
+its own watchdog for its own pool; the bot process then only logs.
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+import psutil
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+MEMORY_CEILING_MB = int(os.getenv("MEMORY_CEILING_MB", "1500"))  # 0 disables recycling
+MEMORY_CHECK_INTERVAL_SECONDS = int(os.getenv("MEMORY_CHECK_INTERVAL_SECONDS", "60"))
+MEMORY_LOG_INTERVAL_SECONDS = int(os.getenv("MEMORY_LOG_INTERVAL_SECONDS", "600"))
+
+BROWSER_NAMES = ('chrome', 'chromium', 'headless_shell')
+
+logger = logging.getLogger(__name__)
+
+
+def _mb(n_bytes: int) -> float:
+    return n_bytes / (1024 * 1024)
+
+
+def _is_browser(proc: psutil.Process) -> bool:
+    try:
+        return any(name in proc.name().lower() for name in BROWSER_NAMES)
+    except psutil.Error:
+        return False
+
+
+def memory_usage() -> dict:
+    """RSS in MB of this process, its Chromium descendants and everything else under it."""
+    me = psutil.Process()
+    usage = {'bot': _mb(me.memory_info().rss), 'browsers': 0.0, 'other': 0.0, 'browser_processes': 0}
+    for child in me.children(recursive=True):
+        try:
+            rss = _mb(child.memory_info().rss)
+        except psutil.Error:
+            continue  # exited while we were looking
+        if _is_browser(child):
+            usage['browsers'] += rss
+            usage['browser_processes'] += 1
+        else:
+            usage['other'] += rss
+    usage['total'] = usage['bot'] + usage['browsers'] + usage['other']
+    return usage
+
+
+def find_orphans() -> list:
+    """Playwright-launched Chromium processes of ours whose parent has gone away."""
+    uid = os.getuid()
+    orphans = []
+    for proc in psutil.process_iter(['name', 'ppid', 'uids', 'cmdline']):
+        try:
+            info = proc.info
+            if info['ppid'] != 1 or info['uids'] is None or info['uids'].real != uid:
+                continue
+            if not _is_browser(proc):
+                continue
+            if 'playwright' in ' '.join(info['cmdline'] or ()):
+                orphans.append(proc)
+        except psutil.Error:
+            continue
+    return orphans
+
+
+def kill_orphans() -> int:
+    orphans = find_orphans()
+    for proc in orphans:
+        try:
+            proc.kill()
+        except psutil.Error:
+            pass
+    psutil.wait_procs(orphans, timeout=5)
+    return len(orphans)
+
+
+class MemoryWatchdog:
+    def __init__(self, pool=None, ceiling_mb: int = MEMORY_CEILING_MB, label: str = 'bot'):
+        # pool: the BrowserPool to recycle; None to only watch and log
+        self.pool = pool
+        self.ceiling_mb = ceiling_mb
+        self.label = label
+        self.recycles = 0
+        self.orphans_killed = 0
+        self.last = None
+        self._last_log = 0.0
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(MEMORY_CHECK_INTERVAL_SECONDS)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"[Memory] Check failed: {e}")
+
+    async def check(self) -> dict:
+        # psutil walks /proc; keep it off the event loop
+        killed = await asyncio.to_thread(kill_orphans)
+        usage = await asyncio.to_thread(memory_usage)
+        self.last = usage
+
+        over = self.ceiling_mb and usage['total'] > self.ceiling_mb
+        if killed:
+            self.orphans_killed += killed
+            logger.warning(f"[Memory] Killed {killed} orphaned Chromium process(es).")
+        if killed or over or time.monotonic() - self._last_log >= MEMORY_LOG_INTERVAL_SECONDS:
+            self._last_log = time.monotonic()
+            logger.info(f"[Memory] {self.label}: {self.describe(usage)}")
+
+        if over and self.pool is not None and self.pool.started:
+            logger.warning(
+                f"[Memory] {usage['total']:.0f} MB is over the {self.ceiling_mb} MB ceiling, "
+                f"recycling Chromium."
+            )
+            self.recycles += 1
+            await self.pool.recycle('memory ceiling')
+        return usage
+
+    def describe(self, usage: dict | None = None) -> str:
+        usage = usage or self.last
+        if usage is None:
+            return 'not measured yet'
+        ceiling = f" / {self.ceiling_mb} MB ceiling" if self.ceiling_mb else ''
+        return (
+            f"total {usage['total']:.0f} MB{ceiling} "
+            f"(bot {usage['bot']:.0f}, Chromium {usage['browsers']:.0f} in "
+            f"{usage['browser_processes']} process(es), other {usage['other']:.0f})"
+        )
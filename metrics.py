@@ -0,0 +1,232 @@
+"""
+metrics.py
+In-process counters and timing histograms, Prometheus text format.
+
+    from metrics import metrics
+    with metrics.time('login'):
+        ...
+    with metrics.timer('scrape_seconds', engine='http'):
+        ...
+    metrics.inc('scrapes_total', engine='http', result='ok')
+
+Stage timings all go into one histogram, stage_seconds{stage=...}. With
+METRICS_ENABLED=0 every call returns straight away (the timers hand back a
+shared no-op context manager), so the hot path pays one attribute check.
+
+serve() exposes GET /metrics on METRICS_HOST:METRICS_PORT; summary()
+renders the same data for the admin /stats command. Bot instances sharing
+a host each need their own port, and one that can't bind runs without the
+endpoint. Scrape worker processes (workers.py) drain() what they record
+and send it back with each result, and the bot merge()s it into its own.
+"""
+
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+from aiohttp import web
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))  # 0 disables the endpoint
+
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, float('inf'))
+
+HELP = {
+    'stage_seconds': 'Time spent per scrape/notify stage',
+    'scrape_seconds': 'End-to-end scrape time',
+    'poll_batch_seconds': 'Wall time of one poll batch',
+    'verify_total': 'Credential checks by result',
+    'scrapes_total': 'Scrapes attempted',
+    'scrape_failures_total': 'Failed scrapes by exception type',
+    'changes_detected_total': 'Attendance changes found by polling',
+    'messages_sent_total': 'Telegram notifications delivered',
+    'messages_dropped_total': 'Telegram notifications given up on',
+    'send_retries_total': 'Telegram sends retried',
+    'worker_restarts_total': 'Scrape worker processes restarted',
+    'circuit_transitions_total': 'ERP circuit breaker state changes',
+    'cohort_promotions_total': 'Users polled early because a classmate changed',
+    'update_seconds': 'Time from handling an update to its reply being sent',
+    'update_lag_seconds': 'Time from Telegram receiving a message to its reply being sent',
+}
+
+logger = logging.getLogger(__name__)
+
+_NULL = nullcontext()
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: tuple = ()) -> str:
+    pairs = [*key, *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+class Metrics:
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self.started = time.time()
+        self._counters: dict = {}    # name -> { label_key: value }
+        self._histograms: dict = {}  # name -> { label_key: [bucket counts..., sum, count] }
+
+    # ─── Recording ───────────────────────────────────────────────────────────
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        series = self._counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        series = self._histograms.setdefault(name, {})
+        key = _label_key(labels)
+        data = series.get(key)
+        if data is None:
+            data = series[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                data[i] += 1
+                break
+        data[-2] += value
+        data[-1] += 1
+
+    def timer(self, name: str, **labels):
+        """Context manager observing the block's duration into histogram `name`."""
+        if not self.enabled:
+            return _NULL
+        return self._timer(name, labels)
+
+    def time(self, stage: str):
+        return self.timer('stage_seconds', stage=stage)
+
+    @contextmanager
+    def _timer(self, name: str, labels: dict):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, **labels)
+
+    # ─── Across processes ────────────────────────────────────────────────────
+
+    def drain(self) -> tuple:
+        """Everything recorded since the last drain(), for merge() in another process."""
+        delta = (self._counters, self._histograms)
+        self._counters, self._histograms = {}, {}
+        return delta
+
+    def merge(self, delta: tuple) -> None:
+        counters, histograms = delta
+        for name, series in counters.items():
+            mine = self._counters.setdefault(name, {})
+            for key, value in series.items():
+                mine[key] = mine.get(key, 0) + value
+        for name, series in histograms.items():
+            mine = self._histograms.setdefault(name, {})
+            for key, data in series.items():
+                if key in mine:
+                    mine[key] = [a + b for a, b in zip(mine[key], data)]
+                else:
+                    mine[key] = list(data)
+
+    # ─── Reading ─────────────────────────────────────────────────────────────
+
+    def counter(self, name: str, **labels) -> float:
+        series = self._counters.get(name, {})
+        if labels:
+            return series.get(_label_key(labels), 0)
+        return sum(series.values())
+
+    def _quantile(self, data: list, q: float) -> float:
+        """Upper bound of the bucket holding the q-th observation."""
+        target = q * data[-1]
+        seen = 0
+        for i, bound in enumerate(BUCKETS):
+            seen += data[i]
+            if seen >= target:
+                return bound if bound != float('inf') else BUCKETS[-2]
+        return BUCKETS[-2]
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        for name, series in sorted(self._counters.items()):
+            lines.append(f'# HELP {name} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} counter')
+            for key, value in sorted(series.items()):
+                lines.append(f'{name}{_format_labels(key)} {value}')
+
+        for name, series in sorted(self._histograms.items()):
+            lines.append(f'# HELP {name} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} histogram')
+            for key, data in sorted(series.items()):
+                cumulative = 0
+                for i, bound in enumerate(BUCKETS):
+                    cumulative += data[i]
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{_format_labels(key, (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(key)} {data[-2]:.6f}')
+                lines.append(f'{name}_count{_format_labels(key)} {data[-1]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """Short plain-text digest for /stats."""
+        if not self.enabled:
+            return 'Metrics are disabled (METRICS_ENABLED=0).'
+
+        uptime = int(time.time() - self.started)
+        lines = [f"Uptime: {uptime // 3600}h {uptime % 3600 // 60}m", ""]
+
+        for name, series in sorted(self._counters.items()):
+            for key, value in sorted(series.items()):
+                lines.append(f"{name}{_format_labels(key)}: {value:g}")
+
+        for name, series in sorted(self._histograms.items()):
+            lines.append("")
+            lines.append(f"{name} (n, mean, ~p95):")
+            for key, data in sorted(series.items()):
+                count = data[-1]
+                mean = data[-2] / count if count else 0
+                lines.append(
+                    f"  {_format_labels(key) or '-'}: {count}, {mean:.2f}s, ≤{self._quantile(data, 0.95):g}s"
+                )
+
+        return '\n'.join(lines)
+
+
+metrics = Metrics()
+
+
+# ─── HTTP endpoint ───────────────────────────────────────────────────────────
+
+async def _handle_metrics(request) -> web.Response:
+    return web.Response(text=metrics.render(), content_type='text/plain', charset='utf-8')
+
+
+async def serve(host: str = METRICS_HOST, port: int = METRICS_PORT) -> web.AppRunner | None:
+    if not metrics.enabled or not port:
+        return None
+    app = web.Application()
+    app.router.add_get('/metrics', _handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError as e:
+        # Most likely another instance on this host has the port
+        logger.error(f"[Metrics] Could not listen on {host}:{port} ({e}); running without /metrics.")
+        await runner.cleanup()
+        return None
+    logger.info(f"[Metrics] Serving on http://{host}:{port}/metrics")
+    return runner
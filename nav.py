@@ -0,0 +1,115 @@
+"""
+nav.py
+Page profile and step-timed navigation for the Playwright scrapers.
+
+With LEAN_PROFILE on (default), every context aborts requests for images,
+stylesheets, fonts and media plus anything not served by the ERP host,
+and navigations wait for DOMContentLoaded instead of the full load event.
+LEAN_PROFILE=0 restores the old behaviour (download everything, wait for
+"load") so the two can be compared with NAV_TRACE=1, which logs time per
+step and bytes downloaded for every scrape.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+from erp import ERP_BASE_URL
+from metrics import metrics
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+LEAN_PROFILE = os.getenv("LEAN_PROFILE", "1") == "1"
+NAV_TRACE = os.getenv("NAV_TRACE", "0") == "1"
+NAV_STEP_TIMEOUT_MS = int(os.getenv("NAV_STEP_TIMEOUT_MS", "30000"))
+TABLE_TIMEOUT_MS = int(os.getenv("TABLE_TIMEOUT_MS", "15000"))
+
+BLOCKED_RESOURCE_TYPES = {'image', 'stylesheet', 'font', 'media', 'texttrack', 'manifest'}
+WAIT_UNTIL = 'domcontentloaded' if LEAN_PROFILE else 'load'
+
+ERP_HOST = urlsplit(ERP_BASE_URL).hostname
+
+logger = logging.getLogger(__name__)
+
+
+# ─── Request blocking ────────────────────────────────────────────────────────
+
+async def _route(route) -> None:
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    elif request.resource_type != 'document' and urlsplit(request.url).hostname != ERP_HOST:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def setup_context(context) -> None:
+    """Called by the browser pool for every new BrowserContext."""
+    context.set_default_timeout(NAV_STEP_TIMEOUT_MS)
+    if LEAN_PROFILE:
+        await context.route('**/*', _route)
+
+
+# ─── Step-timed navigation ───────────────────────────────────────────────────
+
+class Navigator:
+    def __init__(self, page):
+        self.page = page
+        self.steps: list = []  # [(name, seconds)]
+        self.bytes = 0
+        self.requests = 0
+        self._pending: list = []
+        if NAV_TRACE:
+            page.on('requestfinished', self._on_request_finished)
+
+    def _on_request_finished(self, request) -> None:
+        self._pending.append(asyncio.ensure_future(self._count(request)))
+
+    async def _count(self, request) -> None:
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        self.requests += 1
+        self.bytes += sizes['responseBodySize'] + sizes['responseHeadersSize']
+
+    @asynccontextmanager
+    async def step(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - t0
+            self.steps.append((name, seconds))
+            metrics.observe('stage_seconds', seconds, stage=name)
+
+    async def goto(self, url: str, name: str) -> None:
+        async with self.step(name):
+            await self.page.goto(url, wait_until=WAIT_UNTIL, timeout=NAV_STEP_TIMEOUT_MS)
+
+    async def login(self, username: str, password: str) -> None:
+        page = self.page
+        async with self.step('login'):
+            await page.get_by_role('textbox', name='Enter username').fill(username)
+            await page.get_by_role('textbox', name='Enter password').fill(password)
+            async with page.expect_navigation(wait_until=WAIT_UNTIL, timeout=NAV_STEP_TIMEOUT_MS):
+                await page.get_by_role('button', name='Login').click()
+
+    async def wait_for(self, selector: str, name: str) -> None:
+        async with self.step(name):
+            await self.page.wait_for_selector(selector, timeout=TABLE_TIMEOUT_MS)
+
+    async def report(self, label: str) -> None:
+        if not NAV_TRACE:
+            return
+        if self._pending:
+            await asyncio.gather(*self._pending)
+        steps = ', '.join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.steps)
+        logger.info(
+            f"[Nav] {label} ({'lean' if LEAN_PROFILE else 'full'}): {steps}; "
+            f"{self.bytes / 1024:.1f} KB in {self.requests} request(s)."
+        )
@@ -0,0 +1,294 @@
+"""
+notify.py
+Rate-limited outbound queue for change notifications.
+
+Polling only calls enqueue(); a few sender tasks deliver the messages so a
+slow or flood-limited Telegram never holds up scraping.
+
+  - a global token bucket keeps us under Telegram's bot-wide limit and a
+    per-chat bucket under the per-chat one
+  - several notifications queued for the same chat are merged into one
+    message (first "old", latest "current" per subject)
+  - RetryAfter pauses sending for the time Telegram asks for; network
+    errors are retried with exponential backoff up to NOTIFY_MAX_RETRIES
+  - on_delivered(chat_id, snapshot) runs once a message is sent, with the
+    latest snapshot queued for that chat; bot.py commits lastAttendance
+    there. It also runs when Telegram rejects the message for good (chat
+    blocked or gone, a bad request), since resending can't help. Messages
+    lost to network errors (retries exhausted, shutdown, a crash) are not
+    committed, so the change is detected and sent again on the next poll
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from datetime import timedelta
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+
+from metrics import metrics
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+NOTIFY_GLOBAL_PER_SECOND = float(os.getenv("NOTIFY_GLOBAL_PER_SECOND", "25"))
+NOTIFY_GLOBAL_BURST = int(os.getenv("NOTIFY_GLOBAL_BURST", "30"))
+NOTIFY_CHAT_PER_SECOND = float(os.getenv("NOTIFY_CHAT_PER_SECOND", "1"))
+NOTIFY_CHAT_BURST = int(os.getenv("NOTIFY_CHAT_BURST", "3"))
+NOTIFY_SENDERS = int(os.getenv("NOTIFY_SENDERS", "4"))
+NOTIFY_MAX_RETRIES = int(os.getenv("NOTIFY_MAX_RETRIES", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float | None = None) -> float:
+        """Seconds until a token is available (0 if one is available now)."""
+        now = now or time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        while (wait := self.delay()) > 0:
+            await asyncio.sleep(wait)
+        self.take()
+
+
+def merge_changes(older: list, newer: list) -> list:
+    """Combines two compare_attendance() results for the same chat."""
+    merged = {change['subject']: dict(change) for change in older}
+    for change in newer:
+        if change['subject'] in merged:
+            merged[change['subject']]['current'] = change['current']
+        else:
+            merged[change['subject']] = dict(change)
+    return list(merged.values())
+
+
+def _seconds(retry_after) -> float:
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class NotificationQueue:
+    def __init__(self, formatter, senders: int = NOTIFY_SENDERS):
+        # formatter(changes) -> Markdown message text
+        self.formatter = formatter
+        self.senders = senders
+        self.bot = None
+        # (chat_id, snapshot) -> None, called after a successful send
+        self.on_delivered = None
+
+        self._pending: dict = {}    # chat_id -> merged changes not yet sent
+        self._snapshots: dict = {}  # chat_id -> latest snapshot behind them
+        self._heap: list = []       # (ready_at, seq, chat_id)
+        self._scheduled: set = set()
+        self._in_flight: set = set()
+        self._attempts: dict = {}   # chat_id -> consecutive failed sends
+        self._superseded: set = set()  # in-flight chats discard()ed mid-send
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._global = TokenBucket(NOTIFY_GLOBAL_PER_SECOND, NOTIFY_GLOBAL_BURST)
+        self._chat_buckets: dict = {}
+        self._tasks: list = []
+
+        self.sent = 0
+        self.merged = 0
+        self.dropped = 0
+
+    # ─── Lifecycle ───────────────────────────────────────────────────────────
+
+    def start(self, bot) -> None:
+        self.bot = bot
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.senders)]
+
+    async def stop(self, drain_timeout: float = 10) -> None:
+        deadline = time.monotonic() + drain_timeout
+        while (self._pending or self._in_flight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._pending:
+            logger.warning(
+                f"[Notify] Dropping {len(self._pending)} unsent notification(s) on shutdown; "
+                f"they are sent again after the next poll."
+            )
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # ─── Producer side ───────────────────────────────────────────────────────
+
+    def enqueue(self, chat_id: str, changes: list, snapshot=None) -> None:
+        chat_id = str(chat_id)
+        if snapshot is not None:
+            self._snapshots[chat_id] = snapshot
+        if chat_id in self._pending:
+            self._pending[chat_id] = merge_changes(self._pending[chat_id], changes)
+            self.merged += 1
+        else:
+            self._pending[chat_id] = list(changes)
+        self._schedule(chat_id, time.monotonic())
+
+    def _schedule(self, chat_id: str, ready_at: float) -> None:
+        if chat_id in self._scheduled:
+            return
+        self._scheduled.add(chat_id)
+        heapq.heappush(self._heap, (ready_at, next(self._seq), chat_id))
+        self._wakeup.set()
+
+    def discard(self, chat_id: str) -> None:
+        """
+        Forgets anything queued for chat_id because the user has just been
+        shown newer attendance another way (a command reply). A message
+        already being sent still goes out, but isn't committed or retried.
+        """
+        chat_id = str(chat_id)
+        self._pending.pop(chat_id, None)
+        self._snapshots.pop(chat_id, None)
+        self._attempts.pop(chat_id, None)
+        if chat_id in self._in_flight:
+            self._superseded.add(chat_id)
+
+    @property
+    def backlog(self) -> int:
+        return len(self._pending)
+
+    # ─── Sender side ─────────────────────────────────────────────────────────
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._chat_buckets[chat_id] = TokenBucket(NOTIFY_CHAT_PER_SECOND, NOTIFY_CHAT_BURST)
+        return bucket
+
+    async def _next_chat(self) -> str:
+        while True:
+            now = time.monotonic()
+            if self._heap and self._heap[0][0] <= now:
+                _, _, chat_id = heapq.heappop(self._heap)
+                self._scheduled.discard(chat_id)
+                if chat_id not in self._pending:
+                    continue
+                if chat_id in self._in_flight:
+                    self._schedule(chat_id, now + 0.5)
+                    continue
+                wait = self._chat_bucket(chat_id).delay(now)
+                if wait > 0:
+                    self._schedule(chat_id, now + wait)
+                    continue
+                return chat_id
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self) -> None:
+        while True:
+            chat_id = await self._next_chat()
+            self._in_flight.add(chat_id)
+            try:
+                await self._send(chat_id)
+            finally:
+                self._in_flight.discard(chat_id)
+                self._superseded.discard(chat_id)
+
+    def _requeue(self, chat_id: str, changes: list, snapshot, delay: float) -> None:
+        if chat_id in self._superseded:
+            return
+        newer = self._pending.get(chat_id)
+        self._pending[chat_id] = merge_changes(changes, newer) if newer else changes
+        if snapshot is not None:
+            self._snapshots.setdefault(chat_id, snapshot)
+        self._schedule(chat_id, time.monotonic() + delay)
+
+    def _delivered(self, chat_id: str, snapshot) -> None:
+        if snapshot is None or self.on_delivered is None or chat_id in self._superseded:
+            return
+        try:
+            self.on_delivered(chat_id, snapshot)
+        except Exception as e:
+            logger.error(f"[Notify] Could not record delivery to {chat_id}: {e}")
+
+    async def _send(self, chat_id: str) -> None:
+        changes = self._pending.pop(chat_id)
+        snapshot = self._snapshots.pop(chat_id, None)
+        try:
+            with metrics.time('telegram_wait'):
+                await self._global.acquire()
+            self._chat_bucket(chat_id).take()
+            with metrics.time('telegram_send'):
+                await self.bot.send_message(
+                    chat_id=int(chat_id),
+                    text=self.formatter(changes),
+                    parse_mode='Markdown',
+                )
+            self.sent += 1
+            metrics.inc('messages_sent_total')
+            self._attempts.pop(chat_id, None)
+            self._delivered(chat_id, snapshot)
+
+        except RetryAfter as e:
+            wait = _seconds(e.retry_after)
+            logger.warning(f"[Notify] Flood limit hit, pausing sends for {wait:.0f}s.")
+            self._global.pause(wait)
+            metrics.inc('send_retries_total', reason='RetryAfter')
+            self._requeue(chat_id, changes, snapshot, wait)
+
+        except Forbidden as e:
+            # User blocked the bot or left the chat; retrying won't help, so
+            # move their baseline on rather than re-detecting this every poll
+            self._drop(chat_id, snapshot, e, log=logger.info)
+
+        except BadRequest as e:
+            # A NetworkError subclass in PTB, but permanent (chat not found,
+            # unparsable Markdown); caught first so it isn't retried
+            self._drop(chat_id, snapshot, e)
+
+        except NetworkError as e:
+            attempts = self._attempts.get(chat_id, 0) + 1
+            if attempts > NOTIFY_MAX_RETRIES:
+                self._attempts.pop(chat_id, None)
+                self.dropped += 1
+                metrics.inc('messages_dropped_total', reason='NetworkError')
+                logger.error(f"[Notify] Giving up on {chat_id} after {NOTIFY_MAX_RETRIES} retries: {e}")
+                return
+            self._attempts[chat_id] = attempts
+            metrics.inc('send_retries_total', reason='NetworkError')
+            logger.warning(f"[Notify] Send to {chat_id} failed ({e}), retry {attempts}.")
+            self._requeue(chat_id, changes, snapshot, min(2 ** attempts, 60))
+
+        except TelegramError as e:
+            self._drop(chat_id, snapshot, e)
+
+    def _drop(self, chat_id: str, snapshot, error: TelegramError, log=logger.error) -> None:
+        """Gives up on a message Telegram will never accept and moves the baseline on."""
+        self._attempts.pop(chat_id, None)
+        self.dropped += 1
+        metrics.inc('messages_dropped_total', reason=type(error).__name__)
+        log(f"[Notify] Could not notify {chat_id}: {error}")
+        self._delivered(chat_id, snapshot)
@@ -0,0 +1,181 @@
+"""
+pool.py
+Long-lived headless Chromium shared by every scrape.
+
+Launching Chromium is the expensive part of a scrape, so one browser is
+kept alive for the whole bot process and each scrape gets a fresh
+BrowserContext from it, at most POOL_SIZE at a time, closed when the
+scrape is done. Contexts are never handed to a second user: cookies,
+localStorage and the HTTP cache all live in the context. The browser is
+replaced after BROWSER_MAX_USES (the old one is closed once its last
+borrowed context comes back). memwatch.py can also ask for a recycle
+when RSS goes over its ceiling.
+
+Usage:
+    async with browser_pool.page() as page:
+        await page.goto(...)
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from metrics import metrics
+from nav import setup_context
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "4"))
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "500"))
+
+logger = logging.getLogger(__name__)
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        size: int = POOL_SIZE,
+        browser_max_uses: int = BROWSER_MAX_USES,
+        setup=None,
+    ):
+        self.size = size
+        self.browser_max_uses = browser_max_uses
+        # Awaited with every freshly created context (routes, timeouts, ...)
+        self.setup = setup
+
+        self._playwright = None
+        self._browser = None
+        self._browser_uses = 0
+        self._start_lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(size)
+
+        # id(browser) -> number of contexts currently borrowed from it
+        self._borrowed: dict = {}
+        # Browsers replaced by a newer one, closed once nothing is borrowed
+        self._retired: list = []
+
+    # ─── Lifecycle ───────────────────────────────────────────────────────────
+
+    @property
+    def started(self) -> bool:
+        return self._browser is not None
+
+    async def start(self) -> None:
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._launch()
+
+    async def close(self) -> None:
+        async with self._start_lock:
+            for browser in [*self._retired, self._browser]:
+                if browser is not None:
+                    await _safe_close(browser)
+            self._retired.clear()
+            self._borrowed.clear()
+            self._browser = None
+
+            if self._playwright is not None:
+                await self._playwright.stop()
+                self._playwright = None
+
+    async def _launch(self):
+        with metrics.time('browser_launch'):
+            browser = await self._playwright.chromium.launch(headless=True)
+        self._browser_uses = 0
+        self._borrowed[id(browser)] = 0
+        logger.info("[Pool] Launched Chromium.")
+        return browser
+
+    async def recycle(self, reason: str) -> None:
+        """Drain and relaunch Chromium now (used by the memory watchdog)."""
+        async with self._start_lock:
+            # Nothing to gain from a fresh browser, or the last one is still draining
+            if self._browser is None or self._browser_uses == 0 or self._retired:
+                return
+            await self._recycle_browser(reason)
+
+    async def _recycle_browser(self, reason: str) -> None:
+        old = self._browser
+        self._browser = await self._launch()
+        if self._borrowed.get(id(old), 0) == 0:
+            self._borrowed.pop(id(old), None)
+            await _safe_close(old)
+        else:
+            self._retired.append(old)
+        logger.info(f"[Pool] Recycled Chromium ({reason}).")
+
+    # ─── Borrow / return ─────────────────────────────────────────────────────
+
+    async def _acquire(self):
+        await self.start()
+        async with self._start_lock:
+            if not self._browser.is_connected():
+                logger.warning("[Pool] Chromium disconnected, relaunching.")
+                if self._borrowed.get(id(self._browser), 0):
+                    self._retired.append(self._browser)
+                else:
+                    self._borrowed.pop(id(self._browser), None)
+                self._browser = await self._launch()
+            elif self._browser_uses >= self.browser_max_uses:
+                await self._recycle_browser(f'{self._browser_uses} uses')
+            self._browser_uses += 1
+            browser = self._browser
+            self._borrowed[id(browser)] += 1
+
+        context = None
+        try:
+            context = await browser.new_context()
+            if self.setup is not None:
+                await self.setup(context)
+        except BaseException:
+            await self._release(context, browser)
+            raise
+        return context, browser
+
+    async def _release(self, context, browser) -> None:
+        if context is not None:
+            await _safe_close(context)
+        async with self._start_lock:
+            self._borrowed[id(browser)] -= 1
+            if browser in self._retired and self._borrowed[id(browser)] == 0:
+                self._retired.remove(browser)
+                self._borrowed.pop(id(browser), None)
+                await _safe_close(browser)
+
+    @asynccontextmanager
+    async def context(self):
+        """A fresh BrowserContext for the duration of the block, closed afterwards."""
+        with metrics.time('pool_wait'):
+            await self._slots.acquire()
+        try:
+            context, browser = await self._acquire()
+            try:
+                yield context
+            finally:
+                await self._release(context, browser)
+        finally:
+            self._slots.release()
+
+    @asynccontextmanager
+    async def page(self):
+        """Borrow a context and open a fresh page in it."""
+        async with self.context() as context:
+            yield await context.new_page()
+
+
+async def _safe_close(target) -> None:
+    try:
+        await target.close()
+    except Exception as e:
+        logger.warning(f"[Pool] Error while closing {type(target).__name__}: {e}")
+
+
+# Shared instance, started from bot.post_init (or in each scrape worker) and
+# closed on shutdown. Scrapes outside the bot, e.g. benchmarks, start it lazily.
+browser_pool = BrowserPool(setup=setup_context)
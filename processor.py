@@ -0,0 +1,57 @@
+"""
+processor.py
+Update processor: concurrent across chats, in order within a chat.
+
+PTB processes updates one at a time by default, so one user's slow /check
+holds up everybody's /help. ChatOrderedProcessor lets up to
+MAX_CONCURRENT_UPDATES updates run at once but takes a per-chat lock
+first, so a chat's own messages (e.g. the /verify username -> password
+steps) are still handled strictly in the order they arrived. Updates
+waiting on their chat's lock don't hold one of the concurrency slots.
+"""
+
+import asyncio
+import os
+
+from telegram.ext import BaseUpdateProcessor
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))
+
+
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES):
+        # The base class takes its semaphore before do_process_update, so an
+        # update queued behind its own chat's lock would sit on a slot. Its
+        # limit is set out of reach and ours is taken after the chat lock.
+        super().__init__(2 ** 31 - 1)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # chat_id -> [lock, updates holding or waiting for it]
+        self._chats: dict = {}
+
+    async def do_process_update(self, update, coroutine) -> None:
+        chat = getattr(update, 'effective_chat', None)
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        entry = self._chats.get(chat.id)
+        if entry is None:
+            entry = self._chats[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._slots:
+                    await coroutine
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._chats[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,240 @@
+"""
+report.py
+Cohort analytics over every user's latest attendance (admin /report).
+
+load_matrix() lays all snapshots out as two users x subjects NumPy arrays,
+present and total (0 where a user doesn't take the subject), straight from
+the Snapshot arrays. cohort_report() then works on whole columns at once:
+  - per subject: students, mean / p10 / median / p90 percentage, how many
+    are below the threshold and the lectures they need in total to recover
+  - overall: students below the threshold in aggregate or in any subject
+  - at risk: every (student, subject) below the threshold, worst first,
+    with the lectures needed to get back to it
+
+format_report() renders it for Telegram; subjects_csv() and at_risk_csv()
+export the full tables for /report csv.
+"""
+
+import csv
+import io
+import os
+
+import numpy as np
+
+from attendance import to_short_name
+from snapshot import Snapshot, subject_name
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+REPORT_THRESHOLD = int(os.getenv("REPORT_THRESHOLD", "75"))  # percent
+REPORT_AT_RISK_LIMIT = int(os.getenv("REPORT_AT_RISK_LIMIT", "15"))  # rows shown in chat
+
+# At 100% no number of extra lectures recovers a missed one
+if not 0 < REPORT_THRESHOLD < 100:
+    raise ValueError(f"REPORT_THRESHOLD must be between 1 and 99, got {REPORT_THRESHOLD}")
+
+
+class CohortMatrix:
+    def __init__(self, chat_ids: list, usernames: list, subjects: list, present, total):
+        self.chat_ids = chat_ids
+        self.usernames = usernames
+        self.subjects = subjects
+        self.present = present  # int64 [users, subjects]
+        self.total = total      # int64 [users, subjects], 0 = not enrolled
+
+    @property
+    def shape(self) -> tuple:
+        return self.present.shape
+
+
+def load_matrix(rows) -> CohortMatrix:
+    """rows: (chat_id, username, attendance) as returned by UserStore.snapshots()."""
+    chat_ids, usernames, chunks, lengths = [], [], [], []
+    for chat_id, username, attendance in rows:
+        data = Snapshot.from_dict(attendance).data
+        chat_ids.append(chat_id)
+        usernames.append(username)
+        chunks.append(data.tobytes())
+        lengths.append(len(data) // 3)
+
+    # Every user's (subject_id, present, total) triples, end to end
+    triples = np.frombuffer(b''.join(chunks), dtype=np.uint16).reshape(-1, 3)
+    user_index = np.repeat(np.arange(len(chat_ids)), lengths)
+    subject_ids, column = np.unique(triples[:, 0], return_inverse=True)
+
+    shape = (len(chat_ids), len(subject_ids))
+    present = np.zeros(shape, dtype=np.int64)
+    total = np.zeros(shape, dtype=np.int64)
+    present[user_index, column] = triples[:, 1]
+    total[user_index, column] = triples[:, 2]
+
+    subjects = [subject_name(int(i)) for i in subject_ids]
+    return CohortMatrix(chat_ids, usernames, subjects, present, total)
+
+
+def lectures_needed(present, total, threshold: int = REPORT_THRESHOLD):
+    """Vectorised lectures_needed_for_75 for any threshold, in exact integer arithmetic."""
+    # (present + x) / (total + x) >= threshold / 100
+    #   =>  x >= (threshold * total - 100 * present) / (100 - threshold)
+    shortfall = threshold * total - 100 * present
+    return np.maximum(-(-shortfall // (100 - threshold)), 0)
+
+
+def cohort_report(matrix: CohortMatrix, threshold: int = REPORT_THRESHOLD) -> dict:
+    present, total = matrix.present, matrix.total
+    enrolled = total > 0
+    below = enrolled & (100 * present < threshold * total)
+    needed = np.where(below, lectures_needed(present, total, threshold), 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # NaN where not enrolled, so it drops out of the quantiles
+        pct = np.where(enrolled, 100.0 * present / total, np.nan)
+        overall_pct = 100.0 * present.sum(axis=1) / total.sum(axis=1)
+
+    students = enrolled.sum(axis=0)
+    below_count = below.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(students > 0, np.where(enrolled, pct, 0).sum(axis=0) / students, np.nan)
+        below_share = np.where(students > 0, below_count / students, 0.0)
+    p10, median, p90 = column_quantiles(pct, students, (0.10, 0.50, 0.90))
+
+    subjects = [
+        {
+            'subject': subject,
+            'students': n,
+            'mean': _round(m),
+            'p10': _round(lo),
+            'median': _round(mid),
+            'p90': _round(hi),
+            'below': b,
+            'below_share': round(share, 4),
+            'lectures_needed': lectures,
+        }
+        for subject, n, m, lo, mid, hi, b, share, lectures in zip(
+            matrix.subjects, students.tolist(), mean.tolist(), p10.tolist(), median.tolist(),
+            p90.tolist(), below_count.tolist(), below_share.tolist(), needed.sum(axis=0).tolist(),
+        )
+    ]
+    subjects.sort(key=lambda row: (-row['below_share'], row['subject']))
+
+    # Worst percentage first; the most lectures to make up breaks ties.
+    # Kept as columns: a big cohort can have tens of thousands of rows and
+    # only the CSV export needs all of them.
+    user_index, subject_index = np.nonzero(below)
+    order = np.lexsort((-needed[user_index, subject_index], pct[user_index, subject_index]))
+    user_index, subject_index = user_index[order], subject_index[order]
+    at_risk = {
+        'chat_id': np.asarray(matrix.chat_ids, dtype=object)[user_index],
+        'username': np.asarray(matrix.usernames, dtype=object)[user_index],
+        'subject': np.asarray(matrix.subjects, dtype=object)[subject_index],
+        'present': present[user_index, subject_index],
+        'total': total[user_index, subject_index],
+        'pct': pct[user_index, subject_index].round(1),
+        'needed': needed[user_index, subject_index],
+    }
+
+    with np.errstate(invalid='ignore'):
+        below_overall = int((overall_pct < threshold).sum())
+    return {
+        'threshold': threshold,
+        'users': len(matrix.chat_ids),
+        'below_overall': below_overall,
+        'below_any': int(below.any(axis=1).sum()),
+        'subjects': subjects,
+        'at_risk': at_risk,
+    }
+
+
+def column_quantiles(values, counts, quantiles) -> list:
+    """Linear-interpolated quantiles of each column's non-NaN values (counts of them per column)."""
+    # NaNs sort last, so a column's values are its first counts[j] rows
+    if not len(values):
+        return [np.full(counts.shape, np.nan) for _ in quantiles]
+    ordered = np.sort(values, axis=0)
+    last = np.maximum(counts - 1, 0)
+    result = []
+    for q in quantiles:
+        position = q * last
+        lo = np.floor(position).astype(np.int64)
+        hi = np.minimum(lo + 1, last)
+        lo_values = np.take_along_axis(ordered, lo[None, :], axis=0)[0]
+        hi_values = np.take_along_axis(ordered, hi[None, :], axis=0)[0]
+        quantile = lo_values + (hi_values - lo_values) * (position - lo)
+        result.append(np.where(counts > 0, quantile, np.nan))
+    return result
+
+
+def at_risk_rows(report: dict, limit: int | None = None) -> list:
+    """The report's at-risk (student, subject) pairs as dicts, worst first."""
+    columns = report['at_risk']
+    fields = list(columns)
+    values = [columns[field][:limit].tolist() for field in fields]
+    return [dict(zip(fields, row)) for row in zip(*values)]
+
+
+def _round(value) -> float | None:
+    return None if np.isnan(value) else round(float(value), 1)
+
+
+# ─── Output ──────────────────────────────────────────────────────────────────
+
+def _pct(value: float | None) -> str:
+    return '—' if value is None else f"{round(value)}%"
+
+
+def format_report(report: dict, limit: int = REPORT_AT_RISK_LIMIT) -> str:
+    if not report['users']:
+        return 'No users registered yet.'
+
+    threshold, users = report['threshold'], report['users']
+    lines = [
+        f"📈 *Cohort Report* ({users} students)\n",
+        f"Below {threshold}% overall: {report['below_overall']} "
+        f"({report['below_overall'] / users:.0%})",
+        f"Below {threshold}% in any subject: {report['below_any']} "
+        f"({report['below_any'] / users:.0%})\n",
+        "```",
+        f"{'Sub':<8} {'N':>4} {'Mean':>5} {'P10':>4} {'Med':>4} {'<' + str(threshold):>4} {'Need':>5}",
+        "─" * 40,
+    ]
+    for row in report['subjects']:
+        lines.append(
+            f"{to_short_name(row['subject'])[:8]:<8} {row['students']:>4} {_pct(row['mean']):>5} "
+            f"{_pct(row['p10']):>4} {_pct(row['median']):>4} {row['below_share']:>4.0%} "
+            f"{row['lectures_needed']:>5}"
+        )
+    lines.append("```")
+
+    at_risk = len(report['at_risk']['chat_id'])
+    if at_risk:
+        lines.append(f"\n⚠️ *Most at risk* ({min(limit, at_risk)} of {at_risk})")
+        lines.append("```")
+        for row in at_risk_rows(report, limit):
+            lines.append(
+                f"{row['username'][:14]:<14} {to_short_name(row['subject'])[:6]:<6} "
+                f"{row['present']}/{row['total']:<4} {_pct(row['pct']):>4} +{row['needed']}"
+            )
+        lines.append("```")
+    lines.append("_/report csv for the full tables_")
+    return '\n'.join(lines)
+
+
+def _to_csv(fields: list, rows) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    writer.writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def subjects_csv(report: dict) -> bytes:
+    fields = [
+        'subject', 'students', 'mean', 'p10', 'median', 'p90',
+        'below', 'below_share', 'lectures_needed',
+    ]
+    return _to_csv(fields, ([row[field] for field in fields] for row in report['subjects']))
+
+
+def at_risk_csv(report: dict) -> bytes:
+    columns = report['at_risk']
+    return _to_csv(list(columns), zip(*(column.tolist() for column in columns.values())))
@@ -0,0 +1,263 @@
+"""
+scheduler.py
+Per-user adaptive poll scheduling.
+"""
+
+import heapq
+import logging
+import os
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+POLL_BASE_INTERVAL_SECONDS = int(os.getenv("POLL_BASE_INTERVAL_SECONDS", str(30 * 60)))
+POLL_MIN_INTERVAL_SECONDS = int(os.getenv("POLL_MIN_INTERVAL_SECONDS", str(10 * 60)))
+POLL_MAX_INTERVAL_SECONDS = int(os.getenv("POLL_MAX_INTERVAL_SECONDS", str(90 * 60)))
+POLL_BACKOFF_FACTOR = float(os.getenv("POLL_BACKOFF_FACTOR", "1.5"))
+POLL_JITTER = float(os.getenv("POLL_JITTER", "0.15"))
+POST_SLOT_WINDOW_SECONDS = int(os.getenv("POST_SLOT_WINDOW_SECONDS", str(15 * 60)))
+RESUME_SPREAD_SECONDS = int(os.getenv("RESUME_SPREAD_SECONDS", str(5 * 60)))
+COHORT_COOLDOWN_SECONDS = int(os.getenv("COHORT_COOLDOWN_SECONDS", str(POLL_MIN_INTERVAL_SECONDS)))
+
+# Times (HH:MM) at which lecture slots end
+LECTURE_SLOTS = [
+    tuple(int(part) for part in slot.split(':'))
+    for slot in os.getenv(
+        "LECTURE_SLOTS", "09:00,10:00,11:00,12:00,13:00,15:00,16:00,17:00,18:00"
+    ).split(',')
+    if slot.strip()
+]
+
+RATE_WINDOW_SECONDS = 10 * 60
+STATS_LOG_INTERVAL_SECONDS = 10 * 60
+
+logger = logging.getLogger(__name__)
+
+
+def next_slot_boundary(ts: float) -> float | None:
+    """Timestamp of the next lecture slot end after ts, on the same weekday."""
+    now = datetime.fromtimestamp(ts)
+    if now.weekday() >= 5:
+        return None
+    for hour, minute in sorted(LECTURE_SLOTS):
+        boundary = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if boundary > now:
+            return boundary.timestamp()
+    return None
+
+
+def cohort_key(attendance: dict) -> frozenset | None:
+    """Users with identical subject lists are assumed to be in the same section."""
+    return frozenset(attendance) or None
+
+
+class PollScheduler:
+    # Each user has their own next-due time in a priority queue instead of
+    # everyone being polled every POLL_INTERVAL_SECONDS. bot.poll_job calls
+    # pop_due() on every tick and record() after each poll, or requeue() for
+    # users a batch never got to.
+
+    def __init__(self):
+        # chat_id -> { 'due', 'interval', 'unchanged', 'polls', 'last_poll', 'cohort' }
+        self.users: dict = {}
+        self._heap: list = []  # (due, chat_id); stale entries are skipped on pop
+        self._cohorts: dict = {}   # cohort key -> set of chat_ids
+        self._promoted: dict = {}  # cohort key -> when it was last moved up
+        self._recent_polls: deque = deque()
+        self._last_stats = 0.0
+
+    def _push(self, chat_id: str, due: float) -> None:
+        self.users[chat_id]['due'] = due
+        heapq.heappush(self._heap, (due, chat_id))
+
+    def _jitter(self, seconds: float) -> float:
+        return seconds * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+    # ─── Membership ──────────────────────────────────────────────────────────
+
+    def sync(self, chat_ids, now: float | None = None) -> list:
+        """Adds newly registered users (spread over one interval), drops removed ones.
+
+        Returns the chat ids that were added, so the caller can set their cohorts.
+        """
+        now = now or time.time()
+        chat_ids = set(chat_ids)
+        added = list(chat_ids - self.users.keys())
+        for chat_id in added:
+            self.users[chat_id] = {
+                'due': 0.0,
+                'interval': POLL_BASE_INTERVAL_SECONDS,
+                'unchanged': 0,
+                'polls': 0,
+                'last_poll': None,
+                'cohort': None,
+            }
+            # Spread new users over one interval so they don't all start together.
+            self._push(chat_id, now + random.uniform(0, POLL_BASE_INTERVAL_SECONDS))
+        for chat_id in self.users.keys() - chat_ids:
+            self.set_cohort(chat_id, {})
+            del self.users[chat_id]
+        return added
+
+    def restore(self, saved: dict, now: float | None = None) -> list:
+        """Loads states from UserStore.load_poll_state(); returns the chat ids restored."""
+        # States are checkpointed after every poll. Users already overdue are
+        # spread over RESUME_SPREAD_SECONDS so a restart doesn't log everyone
+        # in at once.
+        now = now or time.time()
+        restored, overdue = [], 0
+        for chat_id, state in saved.items():
+            if chat_id in self.users:
+                continue
+            self.users[chat_id] = {
+                'due': 0.0,
+                'interval': state['interval'],
+                'unchanged': state['unchanged'],
+                'polls': state['polls'],
+                'last_poll': state['last_poll'],
+                'cohort': None,
+            }
+            due = state['due']
+            if due <= now:
+                overdue += 1
+                due = now + random.uniform(0, RESUME_SPREAD_SECONDS)
+            self._push(chat_id, due)
+            restored.append(chat_id)
+        if restored:
+            logger.info(
+                f"[Sched] Restored {len(restored)} user(s), {overdue} overdue "
+                f"(spread over {RESUME_SPREAD_SECONDS // 60}m)."
+            )
+        return restored
+
+    # ─── Cohorts ─────────────────────────────────────────────────────────────
+
+    # Users with the same set of subjects form a cohort, usually one class
+    # section. When a poll finds a change, the rest of the cohort is moved to
+    # the front of the queue, at most once per COHORT_COOLDOWN_SECONDS.
+
+    def set_cohort(self, chat_id: str, attendance: dict) -> None:
+        state = self.users.get(chat_id)
+        if state is None:
+            return
+        key = cohort_key(attendance)
+        old = state['cohort']
+        if key == old:
+            return
+        if old is not None:
+            members = self._cohorts[old]
+            members.discard(chat_id)
+            if not members:
+                del self._cohorts[old]
+                self._promoted.pop(old, None)
+        state['cohort'] = key
+        if key is not None:
+            self._cohorts.setdefault(key, set()).add(chat_id)
+
+    def promote_cohort(self, chat_id: str, now: float | None = None) -> list:
+        """Moves chat_id's classmates to the front of the queue; returns the ones moved."""
+        key = self.users.get(chat_id, {}).get('cohort')
+        if key is None:
+            return []
+        now = now or time.time()
+        if now - self._promoted.get(key, 0.0) < COHORT_COOLDOWN_SECONDS:
+            return []  # a classmate's change already triggered this cohort
+        self._promoted[key] = now
+
+        moved = []
+        for mate in self._cohorts[key]:
+            if mate == chat_id or self.users[mate]['due'] == float('inf'):
+                continue  # in flight already
+            self._push(mate, 0.0)
+            moved.append(mate)
+        return moved
+
+    # ─── Queue ───────────────────────────────────────────────────────────────
+
+    def pop_due(self, now: float | None = None, limit: int | None = None) -> list:
+        """Chat ids whose due time has passed, most overdue first."""
+        return self._pop(now or time.time(), limit)
+
+    def pop_promoted(self, limit: int | None = None) -> list:
+        """Chat ids promote_cohort() moved to the front of the queue."""
+        # Lets a running batch take promoted classmates as it goes, rather
+        # than leaving them for the next one.
+        return self._pop(0.0, limit)
+
+    def _pop(self, now: float, limit: int | None) -> list:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            if limit is not None and len(due) >= limit:
+                break
+            when, chat_id = heapq.heappop(self._heap)
+            state = self.users.get(chat_id)
+            if state is None or state['due'] != when:
+                continue  # removed, or rescheduled since this entry was pushed
+            state['due'] = float('inf')  # in flight until record() or requeue()
+            state['was_due'] = when
+            due.append(chat_id)
+        return due
+
+    def requeue(self, chat_id: str) -> None:
+        """Puts a popped user back unpolled, at the due time they were popped with."""
+        state = self.users.get(chat_id)
+        if state is None or state['due'] != float('inf'):
+            return
+        self._push(chat_id, state.get('was_due', time.time()))
+
+    def record(self, chat_id: str, changed: bool, failed: bool = False, now: float | None = None) -> None:
+        state = self.users.get(chat_id)
+        if state is None:
+            return
+        now = now or time.time()
+        self._recent_polls.append(now)
+        state['last_poll'] = now
+
+        if failed:
+            pass  # retry at the current rate
+        elif changed:
+            state['interval'] = POLL_MIN_INTERVAL_SECONDS
+            state['unchanged'] = 0
+        else:
+            state['unchanged'] += 1
+            state['interval'] = min(state['interval'] * POLL_BACKOFF_FACTOR, POLL_MAX_INTERVAL_SECONDS)
+        state['polls'] += 1
+
+        # A change drops the user to the minimum interval; each unchanged poll
+        # backs off up to the maximum. Jitter keeps users from re-synchronising,
+        # and a lecture slot ending before the due time pulls the poll in to
+        # just after it, which is when the ERP usually gets updated.
+        due = now + self._jitter(state['interval'])
+        boundary = next_slot_boundary(now)
+        if boundary is not None and boundary < due:
+            due = min(due, boundary + random.uniform(60, POST_SLOT_WINDOW_SECONDS))
+        self._push(chat_id, due)
+
+    # ─── Stats ───────────────────────────────────────────────────────────────
+
+    def erp_rate_per_minute(self, now: float | None = None) -> float:
+        now = now or time.time()
+        while self._recent_polls and self._recent_polls[0] < now - RATE_WINDOW_SECONDS:
+            self._recent_polls.popleft()
+        return len(self._recent_polls) / (RATE_WINDOW_SECONDS / 60)
+
+    def log_stats(self, now: float | None = None) -> None:
+        """Logs poll rates at most once every STATS_LOG_INTERVAL_SECONDS."""
+        now = now or time.time()
+        if not self.users or now - self._last_stats < STATS_LOG_INTERVAL_SECONDS:
+            return
+        self._last_stats = now
+        intervals = [state['interval'] for state in self.users.values()]
+        overdue = sum(1 for state in self.users.values() if state['due'] <= now)
+        next_due = min((state['due'] for state in self.users.values()), default=now)
+        if next_due == float('inf'):
+            next_due = now
+        logger.info(
+            f"[Sched] {len(self.users)} user(s), ERP rate {self.erp_rate_per_minute(now):.1f} polls/min, "
+            f"per-user interval mean {sum(intervals) / len(intervals) / 60:.0f}m "
+            f"(min {min(intervals) / 60:.0f}m, max {max(intervals) / 60:.0f}m), "
+            f"{overdue} overdue, next due in {timedelta(seconds=max(0, int(next_due - now)))}."
+        )
@@ -0,0 +1,97 @@
+"""
+sessions.py
+Caches each user's authenticated ERP cookies so scrapes can skip the login.
+
+Cookies are kept in memory and mirrored to one small JSON file per user in
+SESSION_DIR, so a restart doesn't force everyone to log in again. Entries
+older than SESSION_TTL_SECONDS are treated as missing; the ERP bouncing a
+cached session back to login.htm also drops the entry.
+
+Cookie shape is Playwright's (context.cookies() / context.add_cookies()).
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+SESSION_DIR = Path(os.getenv("SESSION_DIR", Path(__file__).parent / "sessions"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(6 * 60 * 60)))
+
+logger = logging.getLogger(__name__)
+
+
+class SessionCache:
+    def __init__(self, directory: Path = SESSION_DIR, ttl: int = SESSION_TTL_SECONDS):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        # username -> (saved_at, cookies)
+        self._memory: dict = {}
+        self._dir_ready = False
+
+    def _path(self, username: str) -> Path:
+        digest = hashlib.sha256(username.encode()).hexdigest()[:32]
+        return self.directory / f"{digest}.json"
+
+    def get(self, username: str) -> list | None:
+        entry = self._memory.get(username)
+        if entry is None:
+            entry = self._read(username)
+            if entry is None:
+                return None
+            self._memory[username] = entry
+
+        saved_at, cookies = entry
+        if time.time() - saved_at > self.ttl:
+            self.invalidate(username)
+            return None
+        return cookies
+
+    def put(self, username: str, cookies: list) -> None:
+        saved_at = time.time()
+        self._memory[username] = (saved_at, cookies)
+        try:
+            self._write(self._path(username), json.dumps({'savedAt': saved_at, 'cookies': cookies}))
+        except OSError as e:
+            logger.warning(f"[Session] Could not persist session for {username}: {e}")
+
+    def _write(self, path: Path, text: str) -> None:
+        # Cookies are credentials: the directory is 0700 and the file is
+        # created 0600, then swapped in, so it is never readable by others
+        if not self._dir_ready:
+            self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+            self.directory.chmod(0o700)  # may predate this, with a looser mode
+            self._dir_ready = True
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def invalidate(self, username: str) -> None:
+        self._memory.pop(username, None)
+        try:
+            self._path(username).unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    def _read(self, username: str) -> tuple | None:
+        path = self._path(username)
+        if not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text())
+            return data['savedAt'], data['cookies']
+        except (OSError, ValueError, KeyError):
+            return None
+
+
+session_cache = SessionCache()
@@ -0,0 +1,199 @@
+"""
+shards.py
+Lease-based ownership of users across several bot instances.
+
+With SHARD_COUNT > 0 any number of bot.py processes can share one USERS_DB.
+chat_ids hash into SHARD_COUNT shards and each instance holds time-limited
+leases on some of them (the leases table, see store.py). It only schedules
+and polls users in the shards it holds.
+
+Every LEASE_RENEW_SECONDS an instance:
+  - renews its heartbeat lease and every shard lease it holds
+  - works out its fair share, ceil(shards / live instances), and takes
+    free or expired shards up to it
+  - hands back shards above it, but only ones where none of its users is
+    mid-poll; the new owner resumes those users from their poll_state
+    checkpoint, so nobody is polled twice
+  - takes or renews the 'leader' lease if nobody else holds it
+
+A dead instance stops renewing and the others take over its shards once
+LEASE_TTL_SECONDS has passed. Only the leader receives Telegram updates
+and sends notifications; the others push theirs to the outbox table and
+the leader drains it (see bot.py).
+
+SHARD_COUNT=0 (the default) keeps the single-process behaviour: this
+instance owns every user and always leads.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import random
+import socket
+import time
+import zlib
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0"))  # 0 = one instance owns everyone
+INSTANCE_ID = os.getenv("INSTANCE_ID", f"{socket.gethostname()}:{os.getpid()}")
+LEASE_TTL_SECONDS = float(os.getenv("LEASE_TTL_SECONDS", "60"))
+LEASE_RENEW_SECONDS = float(os.getenv("LEASE_RENEW_SECONDS", str(LEASE_TTL_SECONDS / 3)))
+
+LEADER_LEASE = 'leader'
+INSTANCE_PREFIX = 'instance:'
+SHARD_PREFIX = 'shard:'
+
+logger = logging.getLogger(__name__)
+
+
+def shard_of(chat_id: str, shard_count: int = SHARD_COUNT) -> int:
+    # crc32 rather than hash(): it has to agree across processes
+    return zlib.crc32(str(chat_id).encode()) % shard_count
+
+
+class ShardLeases:
+    def __init__(
+        self,
+        store,
+        shard_count: int = SHARD_COUNT,
+        instance_id: str = INSTANCE_ID,
+        ttl: float = LEASE_TTL_SECONDS,
+    ):
+        self.store = store
+        self.shard_count = shard_count
+        self.instance_id = instance_id
+        self.ttl = ttl
+
+        self.owned: set = set()
+        self.is_leader = not self.enabled
+        self.instances = 1
+        # () -> shards with a user mid-poll; those aren't handed back yet
+        self.busy_shards = set
+        # async (is_leader) -> None, called when leadership changes
+        self.on_leadership = None
+        self._task = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.shard_count > 0
+
+    def owns(self, chat_id: str) -> bool:
+        return not self.enabled or shard_of(chat_id, self.shard_count) in self.owned
+
+    def shard_of(self, chat_id: str) -> int:
+        return shard_of(chat_id, self.shard_count)
+
+    # ─── Lifecycle ───────────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        await self._renew()
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """Stops renewing and hands every lease back so the others take over straight away."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if not self.enabled:
+            return
+        await asyncio.to_thread(self.store.release_leases, self.instance_id)
+        logger.info(f"[Shard] {self.instance_id} released {len(self.owned)} shard(s).")
+        self.owned = set()
+        await self._set_leader(False)
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(LEASE_RENEW_SECONDS)
+            try:
+                await self._renew()
+            except Exception as e:
+                logger.error(f"[Shard] Lease renewal failed: {e}")
+
+    async def _renew(self) -> None:
+        # SQLite calls, possibly waiting on another instance's write lock
+        leader, share = await asyncio.to_thread(self._renew_leases)
+        # Back on the loop: nothing can be popped for polling between
+        # reading busy_shards() and dropping the shards from self.owned
+        extra = self._drop_extra(share, set(self.busy_shards()))
+        if extra:
+            await asyncio.to_thread(self._hand_back, extra)
+        await self._set_leader(leader)
+
+    async def _set_leader(self, leader: bool) -> None:
+        if leader == self.is_leader:
+            return
+        self.is_leader = leader
+        logger.info(f"[Shard] {self.instance_id} {'is now' if leader else 'is no longer'} the leader.")
+        if self.on_leadership is not None:
+            await self.on_leadership(leader)
+
+    # ─── Renewal ─────────────────────────────────────────────────────────────
+
+    def renew(self, busy: set = frozenset(), now: float | None = None) -> bool:
+        """One renewal round; returns whether this instance leads afterwards.
+
+        busy: shards with a user mid-poll, which are kept even above our share.
+        """
+        leader, share = self._renew_leases(now)
+        self._hand_back(self._drop_extra(share, busy))
+        return leader
+
+    def _renew_leases(self, now: float | None = None) -> tuple:
+        """Renews and takes leases; returns (leader, fair share of shards)."""
+        now = now or time.time()
+        expires = now + self.ttl
+        me = self.instance_id
+
+        held = self.store.renew_leases(me, expires)
+        self.store.acquire_leases([INSTANCE_PREFIX + me], me, expires, now)
+        leader = LEADER_LEASE in held or bool(self.store.acquire_leases([LEADER_LEASE], me, expires, now))
+
+        shards = {int(name[len(SHARD_PREFIX):]) for name in held if name.startswith(SHARD_PREFIX)}
+        lost = self.owned - shards
+        if lost:
+            logger.warning(f"[Shard] Lost {len(lost)} shard(s) to other instances: {sorted(lost)}")
+
+        self.instances = max(1, len(self.store.live_leases(INSTANCE_PREFIX, now)))
+        share = math.ceil(self.shard_count / self.instances)
+
+        if len(shards) < share:
+            # Start somewhere random so instances starting together don't
+            # all contend for shard 0 first
+            wanted = [s for s in range(self.shard_count) if s not in shards]
+            random.shuffle(wanted)
+            taken = self.store.acquire_leases(
+                [SHARD_PREFIX + str(s) for s in wanted], me, expires, now, limit=share - len(shards)
+            )
+            if taken:
+                shards |= {int(name[len(SHARD_PREFIX):]) for name in taken}
+                logger.info(f"[Shard] Took {len(taken)} shard(s), holding {len(shards)}/{share}.")
+
+        self.owned = shards
+        return leader, share
+
+    def _drop_extra(self, share: int, busy: set) -> list:
+        """Stops owning idle shards above share; returns them for _hand_back()."""
+        idle = sorted(self.owned - busy)
+        extra = idle[:max(0, len(self.owned) - share)]
+        self.owned = self.owned - set(extra)
+        return extra
+
+    def _hand_back(self, extra: list) -> None:
+        if not extra:
+            return
+        self.store.release_leases(self.instance_id, [SHARD_PREFIX + str(s) for s in extra])
+        logger.info(f"[Shard] Handed back {len(extra)} shard(s), holding {len(self.owned)}.")
+
+    def describe(self) -> str:
+        if not self.enabled:
+            return 'off (this instance owns every user)'
+        role = 'leader' if self.is_leader else 'follower'
+        return (
+            f"{self.instance_id} ({role}), {len(self.owned)}/{self.shard_count} shard(s), "
+            f"{self.instances} live instance(s)"
+        )
@@ -0,0 +1,155 @@
+"""
+snapshot.py
+Compact attendance snapshot with interned subject names.
+
+A scraped or stored attendance dict looks like
+    { subject_name: { "present": int, "total": int } }
+and every user carries their own copy of the same long subject names.
+Snapshot keeps one array('H') of (subject_id, present, total) triples per
+user instead; subject ids index a process-wide intern table, so each name
+is stored once no matter how many users take the course.
+
+Snapshot is a read-only Mapping with the old shape (snapshot[name] gives
+{"present", "total"}), so code written against dicts keeps working, and
+to_dict()/from_dict() convert to and from the JSON shape. Hot paths use
+rows() to get (subject, present, total) tuples without building dicts.
+
+Pickling goes through the subject names, not the ids, because the intern
+table is per process (see workers.py). Within a process it is shared by
+threads too (bot.cmd_report builds snapshots in one), so new names are
+added under a lock.
+"""
+
+import json
+import threading
+from array import array
+from collections.abc import Mapping
+
+# subject name <-> id, shared by every Snapshot in this process
+_subject_ids: dict = {}
+_subjects: list = []
+_intern_lock = threading.Lock()
+
+
+def intern_subject(name: str) -> int:
+    subject_id = _subject_ids.get(name)
+    if subject_id is None:
+        with _intern_lock:
+            # Another thread may have added it while we waited
+            subject_id = _subject_ids.get(name)
+            if subject_id is None:
+                _subjects.append(name)
+                subject_id = len(_subjects) - 1
+                _subject_ids[name] = subject_id
+    return subject_id
+
+
+def subject_name(subject_id: int) -> str:
+    return _subjects[subject_id]
+
+
+class Snapshot(Mapping):
+    __slots__ = ('data',)
+
+    def __init__(self, data: array | None = None):
+        # Flat (subject_id, present, total) triples, in table order
+        self.data = data if data is not None else array('H')
+
+    # ─── Construction / serialisation ────────────────────────────────────────
+
+    @classmethod
+    def from_rows(cls, rows) -> 'Snapshot':
+        """rows: iterable of (subject, present, total); a repeated subject keeps its last value."""
+        by_id: dict = {}
+        for subject, present, total in rows:
+            by_id[intern_subject(subject)] = (present, total)
+        data = array('H')
+        for subject_id, (present, total) in by_id.items():
+            data.extend((subject_id, present, total))
+        return cls(data)
+
+    @classmethod
+    def from_dict(cls, attendance) -> 'Snapshot':
+        if isinstance(attendance, Snapshot):
+            return attendance
+        return cls.from_rows(
+            (subject, counts['present'], counts['total']) for subject, counts in attendance.items()
+        )
+
+    @classmethod
+    def from_json(cls, text: str) -> 'Snapshot':
+        return cls.from_dict(json.loads(text))
+
+    def to_dict(self) -> dict:
+        return {subject: {'present': p, 'total': t} for subject, p, t in self.rows()}
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+    def __reduce__(self):
+        return Snapshot.from_rows, (tuple(self.rows()),)
+
+    # ─── Fast access ─────────────────────────────────────────────────────────
+
+    def rows(self):
+        """(subject, present, total) for every subject, in table order."""
+        data = self.data
+        return zip(map(_subjects.__getitem__, data[0::3]), data[1::3], data[2::3])
+
+    def counts_map(self) -> dict:
+        """{ subject: (present, total) }, for several lookups in a row."""
+        data = self.data
+        return dict(zip(map(_subjects.__getitem__, data[0::3]), zip(data[1::3], data[2::3])))
+
+    def counts(self, subject: str) -> tuple | None:
+        """(present, total) for subject, or None."""
+        subject_id = _subject_ids.get(subject)
+        if subject_id is None:
+            return None
+        data = self.data
+        for i in range(0, len(data), 3):
+            if data[i] == subject_id:
+                return data[i + 1], data[i + 2]
+        return None
+
+    def totals(self) -> tuple:
+        """(sum of present, sum of total) across subjects."""
+        data = self.data
+        return sum(data[1::3]), sum(data[2::3])
+
+    # ─── Mapping interface ───────────────────────────────────────────────────
+
+    def __getitem__(self, subject: str) -> dict:
+        counts = self.counts(subject)
+        if counts is None:
+            raise KeyError(subject)
+        return {'present': counts[0], 'total': counts[1]}
+
+    def __iter__(self):
+        return map(_subjects.__getitem__, self.data[0::3])
+
+    def __len__(self) -> int:
+        return len(self.data) // 3
+
+    def __contains__(self, subject) -> bool:
+        return self.counts(subject) is not None
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Snapshot):
+            return self.data == other.data or _by_id(self) == _by_id(other)
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f'Snapshot({self.to_dict()!r})'
+
+
+def _by_id(snapshot: Snapshot) -> dict:
+    data = snapshot.data
+    return dict(zip(data[0::3], zip(data[1::3], data[2::3])))
+
+
+def as_dict(attendance) -> dict:
+    """Plain JSON-shape dict from either representation."""
+    return attendance.to_dict() if isinstance(attendance, Snapshot) else attendance
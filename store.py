@@ -0,0 +1,516 @@
+"""
+store.py
+SQLite-backed user store (WAL mode).
+
+Users keep the same dict shape users.json had:
+  { "chat_id", "username", "password", "lastAttendance", "notificationsEnabled" }
+with lastAttendance loaded as a compact snapshot.Snapshot.
+
+Reads and updates touch a single row keyed by chat_id; poll sweeps read
+their batch with get_many(). The lastAttendance updates a sweep produces
+(mark_delivered(), once each notification is sent) are buffered and
+written together by flush_delivered(), which bot.py calls at the end of
+every poll batch, every few seconds in between and on shutdown; reads see
+buffered values straight away. migrate_json() imports an existing users.json
+once and renames it so it isn't imported again.
+
+attendance_history is delta-encoded: a scrape only appends rows for the
+subjects whose present/total differ from that subject's latest row, so it
+grows with the number of changes rather than the number of polls.
+
+poll_state holds each user's scheduler state (next due time, interval,
+last poll). A sweep checkpoints every user as soon as they're polled via
+checkpoint_poll(), so a restart resumes where it left off.
+
+leases and outbox coordinate several bot instances sharing one database
+(see shards.py): time-limited named leases, and notifications queued by
+instances that don't talk to Telegram themselves. An outbox row stays
+until flush_delivered() saves its snapshot as lastAttendance, so a leader
+that dies with it unsent leaves it for the next one. Several processes may
+write at once, so transactions that read before writing take the write
+lock up front (BEGIN IMMEDIATE) rather than failing on upgrade.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from attendance import attendance_delta
+from snapshot import Snapshot, as_dict
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    chat_id               TEXT PRIMARY KEY,
+    username              TEXT NOT NULL,
+    password              TEXT NOT NULL,
+    last_attendance       TEXT NOT NULL DEFAULT '{}',
+    notifications_enabled INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE TABLE IF NOT EXISTS attendance_history (
+    chat_id TEXT    NOT NULL,
+    subject TEXT    NOT NULL,
+    ts      INTEGER NOT NULL,
+    present INTEGER NOT NULL,
+    total   INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_history_chat_subject_ts
+    ON attendance_history (chat_id, subject, ts);
+
+CREATE TABLE IF NOT EXISTS poll_state (
+    chat_id   TEXT PRIMARY KEY,
+    next_due  REAL NOT NULL,
+    last_poll REAL,
+    interval  REAL NOT NULL,
+    unchanged INTEGER NOT NULL DEFAULT 0,
+    polls     INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS leases (
+    name    TEXT PRIMARY KEY,
+    owner   TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS outbox (
+    id       INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id  TEXT NOT NULL,
+    changes  TEXT NOT NULL,
+    snapshot TEXT NOT NULL
+);
+"""
+
+
+def _row_to_user(row) -> dict:
+    return {
+        'chat_id': row['chat_id'],
+        'username': row['username'],
+        'password': row['password'],
+        'lastAttendance': Snapshot.from_json(row['last_attendance']),
+        'notificationsEnabled': bool(row['notifications_enabled']),
+    }
+
+
+class UserStore:
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript(SCHEMA)
+        # chat_id -> (attendance, outbox_id) delivered but not written yet
+        self._delivered: dict = {}
+
+    def close(self) -> None:
+        self.flush_delivered()
+        with self._lock:
+            self._conn.close()
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    # ─── Reads ───────────────────────────────────────────────────────────────
+
+    def _to_user(self, row) -> dict:
+        user = _row_to_user(row)
+        delivered = self._delivered.get(user['chat_id'])
+        if delivered is not None:
+            user['lastAttendance'] = delivered[0]
+        return user
+
+    def get(self, chat_id: str) -> dict | None:
+        row = self._execute('SELECT * FROM users WHERE chat_id = ?', (chat_id,)).fetchone()
+        return self._to_user(row) if row else None
+
+    def get_many(self, chat_ids) -> dict:
+        chat_ids = list(chat_ids)
+        users = {}
+        # Chunked to stay under SQLite's bound-parameter limit
+        for start in range(0, len(chat_ids), 500):
+            chunk = chat_ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._execute(
+                f'SELECT * FROM users WHERE chat_id IN ({placeholders})', tuple(chunk)
+            ).fetchall()
+            users.update((row['chat_id'], self._to_user(row)) for row in rows)
+        return users
+
+    def chat_ids(self, enabled_only: bool = False) -> list:
+        sql = 'SELECT chat_id FROM users'
+        if enabled_only:
+            sql += ' WHERE notifications_enabled = 1'
+        return [row[0] for row in self._execute(sql).fetchall()]
+
+    def count(self) -> int:
+        return self._execute('SELECT COUNT(*) FROM users').fetchone()[0]
+
+    def snapshots(self) -> list:
+        """(chat_id, username, latest attendance) for every user, without credentials."""
+        rows = self._execute('SELECT chat_id, username, last_attendance FROM users').fetchall()
+        delivered = dict(self._delivered)
+        return [
+            (row[0], row[1], delivered[row[0]][0] if row[0] in delivered else Snapshot.from_json(row[2]))
+            for row in rows
+        ]
+
+    # ─── Writes ──────────────────────────────────────────────────────────────
+
+    def upsert(self, user: dict) -> None:
+        self._delivered.pop(user['chat_id'], None)
+        self._execute(
+            """
+            INSERT INTO users (chat_id, username, password, last_attendance, notifications_enabled)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET
+                username = excluded.username,
+                password = excluded.password,
+                last_attendance = excluded.last_attendance,
+                notifications_enabled = excluded.notifications_enabled
+            """,
+            (
+                user['chat_id'],
+                user['username'],
+                user['password'],
+                json.dumps(as_dict(user.get('lastAttendance', {}))),
+                int(user.get('notificationsEnabled', True)),
+            ),
+        )
+
+    def set_notifications(self, chat_id: str, enabled: bool) -> bool:
+        """Returns False if the user doesn't exist."""
+        cursor = self._execute(
+            'UPDATE users SET notifications_enabled = ? WHERE chat_id = ?',
+            (int(enabled), chat_id),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, chat_id: str) -> None:
+        with self._lock:
+            self._delivered.pop(chat_id, None)
+            with self._conn:
+                self._conn.execute('BEGIN')
+                self._conn.execute('DELETE FROM users WHERE chat_id = ?', (chat_id,))
+                self._conn.execute('DELETE FROM attendance_history WHERE chat_id = ?', (chat_id,))
+                self._conn.execute('DELETE FROM poll_state WHERE chat_id = ?', (chat_id,))
+                self._conn.execute('DELETE FROM outbox WHERE chat_id = ?', (chat_id,))
+
+    # ─── History ─────────────────────────────────────────────────────────────
+
+    def _latest_history(self, chat_id: str) -> dict:
+        rows = self._conn.execute(
+            """
+            SELECT h.subject, h.present, h.total
+            FROM attendance_history h
+            JOIN (
+                SELECT subject, MAX(ts) AS ts FROM attendance_history
+                WHERE chat_id = ? GROUP BY subject
+            ) latest ON latest.subject = h.subject AND latest.ts = h.ts
+            WHERE h.chat_id = ?
+            """,
+            (chat_id, chat_id),
+        ).fetchall()
+        return {row['subject']: {'present': row['present'], 'total': row['total']} for row in rows}
+
+    def record_history(self, chat_id: str, attendance: dict, ts: int | None = None) -> int:
+        return self.record_history_many({chat_id: attendance}, ts)
+
+    def record_history_many(self, snapshots: dict, ts: int | None = None) -> int:
+        """{ chat_id: attendance } -> rows appended (changed subjects only)."""
+        if not snapshots:
+            return 0
+        ts = int(ts if ts is not None else time.time())
+        added = 0
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                for chat_id, attendance in snapshots.items():
+                    added += self._append_history(chat_id, attendance, ts)
+        return added
+
+    def _append_history(self, chat_id: str, attendance: dict, ts: int) -> int:
+        # Caller holds the lock and an open transaction
+        delta = attendance_delta(self._latest_history(chat_id), attendance)
+        self._conn.executemany(
+            'INSERT INTO attendance_history (chat_id, subject, ts, present, total) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(chat_id, subject, ts, d['present'], d['total']) for subject, d in delta.items()],
+        )
+        return len(delta)
+
+    def history(self, chat_id: str, subject: str | None = None, limit: int = 10) -> list:
+        """
+        Most recent changes first:
+        [{ 'subject', 'ts', 'present', 'total', 'old': {present, total} | None }]
+        """
+        sql = """
+            SELECT subject, ts, present, total,
+                   LAG(present) OVER w AS old_present,
+                   LAG(total)   OVER w AS old_total
+            FROM attendance_history
+            WHERE chat_id = ? {subject_filter}
+            WINDOW w AS (PARTITION BY subject ORDER BY ts)
+            ORDER BY ts DESC
+            LIMIT ?
+        """
+        params: tuple = (chat_id,)
+        if subject is not None:
+            sql = sql.format(subject_filter='AND subject = ?')
+            params += (subject,)
+        else:
+            sql = sql.format(subject_filter='')
+
+        return [
+            {
+                'subject': row['subject'],
+                'ts': row['ts'],
+                'present': row['present'],
+                'total': row['total'],
+                'old': (
+                    {'present': row['old_present'], 'total': row['old_total']}
+                    if row['old_total'] is not None else None
+                ),
+            }
+            for row in self._execute(sql, params + (limit,)).fetchall()
+        ]
+
+    def trend(self, chat_id: str) -> list:
+        """
+        First and latest recorded values per subject:
+        [{ 'subject', 'since', 'first': {present, total}, 'last': {present, total} }]
+        """
+        rows = self._execute(
+            """
+            SELECT h.subject, h.ts, h.present, h.total, b.first_ts, b.last_ts
+            FROM attendance_history h
+            JOIN (
+                SELECT subject, MIN(ts) AS first_ts, MAX(ts) AS last_ts
+                FROM attendance_history WHERE chat_id = ? GROUP BY subject
+            ) b ON b.subject = h.subject AND h.ts IN (b.first_ts, b.last_ts)
+            WHERE h.chat_id = ?
+            ORDER BY h.subject, h.ts
+            """,
+            (chat_id, chat_id),
+        ).fetchall()
+
+        trend: dict = {}
+        for row in rows:
+            point = {'present': row['present'], 'total': row['total']}
+            entry = trend.setdefault(
+                row['subject'],
+                {'subject': row['subject'], 'since': row['first_ts'], 'first': point, 'last': point},
+            )
+            if row['ts'] == row['last_ts']:
+                entry['last'] = point
+        return list(trend.values())
+
+    # ─── Poll checkpoints ────────────────────────────────────────────────────
+
+    def checkpoint_poll(
+        self, chat_id: str, state: dict, snapshot: dict | None = None, fetched_at: float | None = None
+    ) -> None:
+        """
+        Everything one poll produced, in one transaction: the scheduler state
+        and, if the scrape succeeded, the history rows (dated fetched_at).
+        lastAttendance is left alone; it moves once the change notification
+        is delivered.
+        """
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                if snapshot is not None:
+                    self._append_history(chat_id, snapshot, int(fetched_at or time.time()))
+                self._conn.execute(
+                    """
+                    INSERT INTO poll_state (chat_id, next_due, last_poll, interval, unchanged, polls)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(chat_id) DO UPDATE SET
+                        next_due = excluded.next_due,
+                        last_poll = excluded.last_poll,
+                        interval = excluded.interval,
+                        unchanged = excluded.unchanged,
+                        polls = excluded.polls
+                    """,
+                    (
+                        chat_id,
+                        state['due'],
+                        state.get('last_poll'),
+                        state['interval'],
+                        state['unchanged'],
+                        state['polls'],
+                    ),
+                )
+
+    def load_poll_state(self, chat_ids=None) -> dict:
+        """chat_id -> { 'due', 'last_poll', 'interval', 'unchanged', 'polls' }, for all or chat_ids."""
+        if chat_ids is None:
+            rows = self._execute('SELECT * FROM poll_state').fetchall()
+        else:
+            chat_ids, rows = list(chat_ids), []
+            for start in range(0, len(chat_ids), 500):
+                chunk = chat_ids[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows += self._execute(
+                    f'SELECT * FROM poll_state WHERE chat_id IN ({placeholders})', tuple(chunk)
+                ).fetchall()
+        return {
+            row['chat_id']: {
+                'due': row['next_due'],
+                'last_poll': row['last_poll'],
+                'interval': row['interval'],
+                'unchanged': row['unchanged'],
+                'polls': row['polls'],
+            }
+            for row in rows
+        }
+
+    # ─── Leases ──────────────────────────────────────────────────────────────
+
+    def renew_leases(self, owner: str, expires: float) -> set:
+        """Extends every lease owner still holds; returns their names."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                self._conn.execute('UPDATE leases SET expires = ? WHERE owner = ?', (expires, owner))
+                rows = self._conn.execute('SELECT name FROM leases WHERE owner = ?', (owner,)).fetchall()
+        return {row[0] for row in rows}
+
+    def acquire_leases(self, names, owner: str, expires: float, now: float, limit: int | None = None) -> list:
+        """Takes the leases in names that are free or expired, up to limit; returns the ones taken."""
+        taken = []
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                for name in names:
+                    if limit is not None and len(taken) >= limit:
+                        break
+                    cursor = self._conn.execute(
+                        """
+                        INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?)
+                        ON CONFLICT(name) DO UPDATE SET
+                            owner = excluded.owner,
+                            expires = excluded.expires
+                        WHERE leases.owner = excluded.owner OR leases.expires < ?
+                        """,
+                        (name, owner, expires, now),
+                    )
+                    if cursor.rowcount > 0:
+                        taken.append(name)
+        return taken
+
+    def release_leases(self, owner: str, names=None) -> None:
+        """Gives up names (or every lease) held by owner."""
+        if names is None:
+            self._execute('DELETE FROM leases WHERE owner = ?', (owner,))
+            return
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN')
+                self._conn.executemany(
+                    'DELETE FROM leases WHERE name = ? AND owner = ?',
+                    [(name, owner) for name in names],
+                )
+
+    def live_leases(self, prefix: str, now: float) -> dict:
+        """name -> owner for unexpired leases whose name starts with prefix."""
+        rows = self._execute(
+            'SELECT name, owner FROM leases WHERE name LIKE ? AND expires >= ?',
+            (prefix + '%', now),
+        ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+    # ─── Outbox ──────────────────────────────────────────────────────────────
+
+    def push_outbox(self, chat_id: str, changes: list, snapshot) -> None:
+        self._execute(
+            'INSERT INTO outbox (chat_id, changes, snapshot) VALUES (?, ?, ?)',
+            (chat_id, json.dumps(changes), json.dumps(as_dict(snapshot))),
+        )
+
+    def read_outbox(self, after_id: int = 0, limit: int = 500) -> list:
+        """Up to limit queued (id, chat_id, changes, snapshot) with id > after_id, oldest first."""
+        rows = self._execute(
+            'SELECT id, chat_id, changes, snapshot FROM outbox WHERE id > ? ORDER BY id LIMIT ?',
+            (after_id, limit),
+        ).fetchall()
+        return [
+            (row['id'], row['chat_id'], json.loads(row['changes']), Snapshot.from_json(row['snapshot']))
+            for row in rows
+        ]
+
+    def mark_delivered(self, chat_id: str, attendance, outbox_id: int | None = None) -> None:
+        """
+        A notification reached chat_id: its snapshot becomes lastAttendance
+        and the chat's outbox rows up to outbox_id (if any) are done with,
+        as of the next flush_delivered().
+        """
+        with self._lock:
+            previous = self._delivered.get(chat_id, (None, None))[1]
+            if outbox_id is None or (previous is not None and previous > outbox_id):
+                outbox_id = previous
+            self._delivered[chat_id] = (Snapshot.from_dict(attendance), outbox_id)
+
+    def flush_delivered(self) -> int:
+        """Writes every buffered mark_delivered() in one transaction; returns how many."""
+        with self._lock:
+            if not self._delivered:
+                return 0
+            delivered, self._delivered = self._delivered, {}
+            try:
+                with self._conn:
+                    self._conn.execute('BEGIN')
+                    self._conn.executemany(
+                        'UPDATE users SET last_attendance = ? WHERE chat_id = ?',
+                        [(json.dumps(as_dict(att)), chat_id) for chat_id, (att, _) in delivered.items()],
+                    )
+                    self._conn.executemany(
+                        'DELETE FROM outbox WHERE chat_id = ? AND id <= ?',
+                        [(chat_id, outbox_id) for chat_id, (_, outbox_id) in delivered.items()
+                         if outbox_id is not None],
+                    )
+            except sqlite3.Error:
+                # Keep them for the next flush
+                for chat_id, entry in delivered.items():
+                    self._delivered.setdefault(chat_id, entry)
+                raise
+        return len(delivered)
+
+    # ─── Migration ───────────────────────────────────────────────────────────
+
+    def migrate_json(self, users_file: Path) -> int:
+        """Imports users.json (if present) and renames it to users.json.migrated."""
+        users_file = Path(users_file)
+        if not users_file.exists():
+            return 0
+
+        users = json.loads(users_file.read_text())
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN')
+                for chat_id, user in users.items():
+                    self._conn.execute(
+                        """
+                        INSERT OR IGNORE INTO users
+                            (chat_id, username, password, last_attendance, notifications_enabled)
+                        VALUES (?, ?, ?, ?, ?)
+                        """,
+                        (
+                            str(chat_id),
+                            user['username'],
+                            user['password'],
+                            json.dumps(user.get('lastAttendance', {})),
+                            int(user.get('notificationsEnabled', True)),
+                        ),
+                    )
+
+        users_file.rename(users_file.with_name(users_file.name + '.migrated'))
+        logger.info(f"[Store] Migrated {len(users)} user(s) from {users_file.name}.")
+        return len(users)
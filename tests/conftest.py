@@ -0,0 +1,58 @@
+"""
+conftest.py
+Runs benchmarks.mock_erp on a local port as the ERP for the whole session.
+
+erp.py reads ERP_BASE_URL (sessions.py SESSION_DIR, bot.py USERS_DB) at
+import time, so they are set here before any test module imports them.
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from benchmarks.bench_pipeline import _free_port  # noqa: E402
+from benchmarks.mock_erp import MockErp, serve  # noqa: E402
+
+ERP_PORT = _free_port()
+os.environ['ERP_BASE_URL'] = f'http://127.0.0.1:{ERP_PORT}'
+os.environ['SESSION_DIR'] = tempfile.mkdtemp(prefix='erp-test-sessions-')
+os.environ['USERS_DB'] = str(Path(tempfile.mkdtemp(prefix='erp-test-db-')) / 'users.db')
+
+
+@pytest.fixture(scope='session')
+def erp():
+    """The mock ERP, served from a background thread with its own event loop."""
+    mock = MockErp(latency_ms=0, jitter_ms=0)
+    loop = asyncio.new_event_loop()
+    runner = loop.run_until_complete(serve(mock, port=ERP_PORT))
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    yield mock
+    asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+@pytest.fixture
+def run():
+    """Runs a coroutine on a fresh loop, closing http_engine's pool on it afterwards."""
+    import http_engine
+
+    def _run(coro):
+        async def wrapper():
+            try:
+                return await coro
+            finally:
+                await http_engine.close()
+        return asyncio.run(wrapper())
+
+    return _run
@@ -0,0 +1,105 @@
+"""
+test_circuit.py
+CircuitBreaker: opening, probing, backoff and ignored errors.
+"""
+
+import asyncio
+
+import pytest
+
+import circuit
+from circuit import CircuitBreaker, CircuitOpen
+from http_engine import LoginFailed
+from workers import WorkerCrashed
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit.time, 'monotonic', clock)
+    return clock
+
+
+def breaker(probe_results: list) -> CircuitBreaker:
+    async def probe():
+        return probe_results.pop(0)
+    return CircuitBreaker(probe=probe, threshold=2, cooldown=10, max_cooldown=25)
+
+
+async def failing():
+    raise TimeoutError('erp down')
+
+
+async def ok():
+    return 'ok'
+
+
+def call(cb: CircuitBreaker, fn):
+    """cb.call(fn)'s result, or the exception it raised."""
+    async def main():
+        try:
+            return await cb.call(fn)
+        except Exception as e:
+            return e
+    return asyncio.run(main())
+
+
+def test_opens_after_threshold_and_short_circuits(clock):
+    cb = breaker([])
+    assert isinstance(call(cb, failing), TimeoutError)
+    assert not cb.is_open
+    assert isinstance(call(cb, failing), TimeoutError)
+    assert cb.is_open
+    # No call (and no probe) while cooling down
+    assert isinstance(call(cb, ok), CircuitOpen)
+
+
+def test_half_open_probe_closes_on_success(clock):
+    cb = breaker([True])
+    cb.record_failure(TimeoutError())
+    cb.record_failure(TimeoutError())
+    clock.now += 10
+    assert call(cb, ok) == 'ok'
+    assert not cb.is_open and cb.failures == 0
+
+
+def test_failed_probes_back_off_up_to_the_max(clock):
+    cb = breaker([False, False, False])
+    cb.record_failure(TimeoutError())
+    cb.record_failure(TimeoutError())
+    assert cb.cooldown == 10
+
+    clock.now += 10
+    assert isinstance(call(cb, ok), CircuitOpen)
+    assert cb.cooldown == 20
+    clock.now += 19
+    assert isinstance(call(cb, ok), CircuitOpen)  # still cooling down, not probed
+    clock.now += 1
+    call(cb, ok)
+    assert cb.cooldown == 25
+    clock.now += 25
+    call(cb, ok)
+    assert cb.cooldown == 25
+
+
+def test_success_resets_the_failure_count(clock):
+    cb = breaker([])
+    call(cb, failing)
+    assert call(cb, ok) == 'ok'
+    call(cb, failing)
+    assert not cb.is_open and cb.failures == 1
+
+
+def test_ignored_errors_do_not_trip(clock):
+    cb = breaker([])
+    for error in (LoginFailed('user'), WorkerCrashed(0), LoginFailed('user'), WorkerCrashed(1)):
+        cb.record_failure(error)
+    assert not cb.is_open and cb.failures == 0
@@ -0,0 +1,85 @@
+"""
+test_coalesce.py
+ScrapeCoalescer: single-flight joining, the TTL cache and cancellation.
+"""
+
+import asyncio
+
+import coalesce
+from coalesce import ScrapeCoalescer
+
+
+class Fetcher:
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.cancelled = False
+
+    async def __call__(self, username, password):
+        self.calls += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {'OS': {'present': self.calls, 'total': 10}}
+
+
+def test_concurrent_callers_share_one_scrape():
+    async def main():
+        fetch = Fetcher()
+        scrapes = ScrapeCoalescer(fetch)
+        callers = [asyncio.create_task(scrapes.get('u', 'p', max_age=0)) for _ in range(3)]
+        await asyncio.sleep(0)
+        fetch.release.set()
+        results = await asyncio.gather(*callers)
+        return fetch, results
+
+    fetch, results = asyncio.run(main())
+    assert fetch.calls == 1
+    assert results[0] == results[1] == results[2]
+
+
+def test_cache_expires_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(coalesce.time, 'time', lambda: now[0])
+
+    async def main():
+        fetch = Fetcher()
+        fetch.release.set()
+        scrapes = ScrapeCoalescer(fetch, ttl=60)
+        first = await scrapes.get('u', 'p')
+        now[0] += 59
+        cached = await scrapes.get('u', 'p')
+        now[0] += 2
+        fresh = await scrapes.get('u', 'p')
+        return fetch, first, cached, fresh
+
+    fetch, first, cached, fresh = asyncio.run(main())
+    assert cached == first == ({'OS': {'present': 1, 'total': 10}}, 1000.0)
+    assert fresh == ({'OS': {'present': 2, 'total': 10}}, 1061.0)
+    assert fetch.calls == 2
+
+
+def test_scrape_cancelled_only_when_last_waiter_leaves():
+    async def main():
+        fetch = Fetcher()
+        scrapes = ScrapeCoalescer(fetch)
+        first = asyncio.create_task(scrapes.get('u', 'p'))
+        second = asyncio.create_task(scrapes.get('u', 'p'))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.sleep(0)
+        still_running = not fetch.cancelled and 'u' in scrapes._inflight
+
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        await asyncio.sleep(0)
+        return fetch, scrapes, still_running
+
+    fetch, scrapes, still_running = asyncio.run(main())
+    assert still_running
+    assert fetch.cancelled
+    assert scrapes._inflight == {} and scrapes._waiters == {}
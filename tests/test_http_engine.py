@@ -0,0 +1,147 @@
+"""
+test_http_engine.py
+erp.py parsing and the browserless engine against benchmarks.mock_erp.
+"""
+
+import httpx
+import pytest
+
+import browser
+import http_engine
+from benchmarks.mock_erp import ATTENDANCE_PAGE, LOGIN_PAGE
+from erp import (
+    ERP_BASE_URL,
+    AttendanceNotFound,
+    LoginFormNotFound,
+    parse_attendance_table,
+    parse_login_form,
+)
+from sessions import session_cache
+
+
+def expected(erp, username: str) -> dict:
+    return {
+        subject: {'present': present, 'total': total}
+        for subject, (present, total) in erp._user_attendance(username).items()
+    }
+
+
+# ─── Parsing ─────────────────────────────────────────────────────────────────
+
+def test_parse_attendance_table():
+    rows = (
+        '<tr><td>1</td><td>Operating  Systems</td><td><a href="#">12 / 15</a></td></tr>'
+        '<tr><td>2</td><td>Computer Networks</td><td>7/7</td></tr>'
+        '<tr><td>3</td><td>No fraction</td><td>—</td></tr>'
+        '<tr><td colspan="3">Totals</td></tr>'
+    )
+    attendance = parse_attendance_table(ATTENDANCE_PAGE.format(rows=rows))
+    assert attendance.to_dict() == {
+        'Operating Systems': {'present': 12, 'total': 15},
+        'Computer Networks': {'present': 7, 'total': 7},
+    }
+
+
+def test_parse_attendance_table_without_rows():
+    with pytest.raises(AttendanceNotFound):
+        parse_attendance_table('<html><body><div id="attendanceDiv"></div></body></html>')
+
+
+def test_parse_login_form():
+    html = LOGIN_PAGE.format(csrf='abc123', failure='')
+    action, fields, user_field, pass_field = parse_login_form(html, 'http://erp.test/login.html')
+    assert action == 'http://erp.test/login.htm'
+    assert fields == {'_csrf': 'abc123'}
+    assert (user_field, pass_field) == ('j_username', 'j_password')
+
+
+def test_parse_login_form_without_password_field():
+    with pytest.raises(LoginFormNotFound):
+        parse_login_form('<form><input type="text" name="q"></form>', 'http://erp.test/')
+
+
+# ─── Login and sessions ──────────────────────────────────────────────────────
+
+def test_login_and_fetch(erp, run):
+    attendance = run(http_engine.login_and_fetch('alice', 'pass'))
+    assert attendance.to_dict() == expected(erp, 'alice')
+    assert session_cache.get('alice')
+
+
+def test_login_failed(erp, run):
+    failed = erp.stats['failed_logins']
+    with pytest.raises(http_engine.LoginFailed):
+        run(http_engine.login_and_fetch('mallory', 'wrong'))
+    assert erp.stats['failed_logins'] == failed + 1
+    assert session_cache.get('mallory') is None
+
+
+def test_cached_session_skips_login(erp, run):
+    run(http_engine.login_and_fetch('bob', 'pass'))
+    logins = erp.stats['logins']
+    attendance = run(http_engine.scrape_attendance('bob', 'pass'))
+    assert attendance.to_dict() == expected(erp, 'bob')
+    assert erp.stats['logins'] == logins
+
+
+def test_expired_session_logs_in_again(erp, run):
+    run(http_engine.login_and_fetch('carol', 'pass'))
+    logins, expired = erp.stats['logins'], erp.stats['expired']
+
+    # The ERP times the session out: the cached cookies now redirect to login
+    for sid, (username, _created_at) in list(erp.sessions.items()):
+        if username == 'carol':
+            erp.sessions[sid] = (username, 0)
+    attendance = run(http_engine.scrape_attendance('carol', 'pass'))
+
+    assert attendance.to_dict() == expected(erp, 'carol')
+    assert erp.stats['expired'] == expired + 1
+    assert erp.stats['logins'] == logins + 1
+    # ... and the new session is the one cached
+    logins = erp.stats['logins']
+    run(http_engine.scrape_attendance('carol', 'pass'))
+    assert erp.stats['logins'] == logins
+
+
+# ─── Fallback to Playwright ──────────────────────────────────────────────────
+
+@pytest.fixture
+def fake_browser(monkeypatch):
+    """Stands in for Playwright; records who it was asked to scrape."""
+    calls = []
+
+    async def scrape(username, password):
+        calls.append(username)
+        return {'Browser Subject': {'present': 1, 'total': 1}}
+
+    monkeypatch.setattr(browser, 'SCRAPE_ENGINE', 'http')
+    monkeypatch.setattr(browser, '_scrape_with_browser', scrape)
+    return calls
+
+
+def test_falls_back_when_table_is_missing(erp, run, fake_browser, monkeypatch):
+    # A logged-in page without the table, as when it is rendered by JS
+    monkeypatch.setattr(http_engine, 'ATTENDANCE_URL', f'{ERP_BASE_URL}/home.htm')
+    attendance = run(browser.scrape_attendance('dave', 'pass'))
+    assert fake_browser == ['dave']
+    assert attendance == {'Browser Subject': {'present': 1, 'total': 1}}
+
+
+def test_no_fallback_on_server_error(erp, run, fake_browser, monkeypatch):
+    monkeypatch.setattr(erp, 'error_rate', 1.0)
+    with pytest.raises(httpx.HTTPStatusError):
+        run(browser.scrape_attendance('erin', 'pass'))
+    assert fake_browser == []
+
+
+def test_no_fallback_on_transport_error(run, fake_browser, monkeypatch):
+    monkeypatch.setattr(http_engine, 'LOGIN_URL', 'http://127.0.0.1:1/login.htm')
+    with pytest.raises(httpx.TransportError):
+        run(browser.scrape_attendance('frank', 'pass'))
+    assert fake_browser == []
+
+
+def test_no_fallback_on_rejected_login(erp, run, fake_browser):
+    with pytest.raises(http_engine.LoginFailed):
+        run(browser.scrape_attendance('grace', 'wrong'))
+    assert fake_browser == []
@@ -0,0 +1,104 @@
+"""
+test_notify.py
+NotificationQueue: lastAttendance only moves once a message is delivered.
+"""
+
+import asyncio
+
+from telegram.error import BadRequest, Forbidden, NetworkError
+
+import notify
+from notify import NotificationQueue
+
+
+class FakeBot:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent: list = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.error is not None:
+            raise self.error
+        self.sent.append((chat_id, text))
+
+
+def change(subject: str, old: tuple, current: tuple) -> dict:
+    return {
+        'subject': subject,
+        'old': {'present': old[0], 'total': old[1]},
+        'current': {'present': current[0], 'total': current[1]},
+    }
+
+
+def deliver(bot, enqueued: list, **stop) -> dict:
+    """Enqueues (chat_id, changes, snapshot) and drains; returns what on_delivered saw."""
+    delivered = {}
+
+    async def main():
+        queue = NotificationQueue(lambda changes: repr(changes), senders=1)
+        queue.on_delivered = delivered.__setitem__
+        for chat_id, changes, snapshot in enqueued:
+            queue.enqueue(chat_id, changes, snapshot)
+        queue.start(bot)
+        await queue.stop(**stop)
+
+    asyncio.run(main())
+    return delivered
+
+
+def test_delivered_with_latest_snapshot():
+    bot = FakeBot()
+    delivered = deliver(bot, [
+        ('1', [change('OS', (1, 2), (2, 3))], 'snap-a'),
+        ('1', [change('OS', (2, 3), (3, 4))], 'snap-b'),
+    ])
+    assert delivered == {'1': 'snap-b'}
+    assert len(bot.sent) == 1
+
+
+def test_not_delivered_when_retries_run_out(monkeypatch):
+    monkeypatch.setattr(notify, 'NOTIFY_MAX_RETRIES', 0)
+    delivered = deliver(FakeBot(NetworkError('down')), [('1', [change('OS', (1, 2), (2, 3))], 'snap')])
+    assert delivered == {}
+
+
+def test_not_delivered_when_dropped_on_shutdown():
+    delivered = deliver(
+        FakeBot(NetworkError('down')), [('1', [change('OS', (1, 2), (2, 3))], 'snap')], drain_timeout=0.2
+    )
+    assert delivered == {}
+
+
+def test_blocked_chat_moves_baseline():
+    delivered = deliver(FakeBot(Forbidden('blocked')), [('1', [change('OS', (1, 2), (2, 3))], 'snap')])
+    assert delivered == {'1': 'snap'}
+
+
+def test_bad_request_moves_baseline_without_retrying():
+    bot = FakeBot(BadRequest('Chat not found'))
+    delivered = deliver(bot, [('1', [change('OS', (1, 2), (2, 3))], 'snap')], drain_timeout=0.5)
+    assert delivered == {'1': 'snap'}
+
+
+def test_discarded_while_sending_is_not_committed():
+    delivered = {}
+    queue = NotificationQueue(lambda changes: repr(changes), senders=1)
+    queue.on_delivered = delivered.__setitem__
+
+    class CommandFirstBot(FakeBot):
+        async def send_message(self, chat_id, text, parse_mode=None):
+            queue.discard(str(chat_id))  # a command reply got there first
+            await super().send_message(chat_id, text, parse_mode)
+
+    bot = CommandFirstBot()
+
+    async def main():
+        queue.enqueue('1', [change('OS', (1, 2), (2, 3))], 'snap-old')
+        queue.enqueue('2', [change('OS', (1, 2), (2, 3))], 'snap')
+        queue.discard('2')
+        queue.start(bot)
+        await queue.stop()
+
+    asyncio.run(main())
+    assert delivered == {}
+    assert [chat_id for chat_id, _ in bot.sent] == [1]
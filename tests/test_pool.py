@@ -0,0 +1,87 @@
+"""
+test_pool.py
+BrowserPool: no cookies or storage carry over from one borrower to the next.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from erp import LOGIN_URL
+from pool import BrowserPool
+
+
+class FakeContext:
+    def __init__(self):
+        self.cookies: list = []
+        self.local_storage: dict = {}
+        self.closed = False
+
+    async def close(self) -> None:
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts: list = []
+
+    def is_connected(self) -> bool:
+        return True
+
+    async def new_context(self) -> FakeContext:
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+    async def close(self) -> None:
+        pass
+
+
+def test_each_borrower_gets_a_fresh_context():
+    browser = FakeBrowser()
+
+    async def launch(headless=True):
+        return browser
+
+    browser_pool = BrowserPool(size=1)
+    browser_pool._playwright = SimpleNamespace(chromium=SimpleNamespace(launch=launch))
+
+    async def main():
+        async with browser_pool.context() as first:
+            first.cookies.append({'name': 'JSESSIONID', 'value': 'user-a'})
+            first.local_storage['token'] = 'user-a'
+        async with browser_pool.context() as second:
+            return first, second
+
+    first, second = asyncio.run(main())
+    assert first is not second
+    assert first.closed
+    assert second.cookies == [] and second.local_storage == {}
+    assert browser_pool._borrowed[id(browser)] == 0
+
+
+def test_no_state_carries_over_in_chromium(erp):
+    browser_pool = BrowserPool(size=1)
+
+    async def main():
+        try:
+            await browser_pool.start()
+        except Exception as e:
+            pytest.skip(f"Chromium not available: {e}")
+        try:
+            async with browser_pool.page() as page:
+                await page.goto(LOGIN_URL)
+                await page.evaluate("localStorage.setItem('token', 'user-a')")
+                await page.context.add_cookies([{'name': 'leak', 'value': 'user-a', 'url': LOGIN_URL}])
+            async with browser_pool.page() as page:
+                await page.goto(LOGIN_URL)
+                stored = await page.evaluate("localStorage.getItem('token')")
+                cookies = await page.context.cookies()
+        finally:
+            await browser_pool.close()
+        return stored, cookies
+
+    stored, cookies = asyncio.run(main())
+    assert stored is None
+    assert not [c for c in cookies if c['name'] == 'leak']
@@ -0,0 +1,40 @@
+"""
+test_processor.py
+ChatOrderedProcessor: ordered within a chat, concurrent across chats.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from processor import ChatOrderedProcessor
+
+
+def update(chat_id: int):
+    return SimpleNamespace(effective_chat=SimpleNamespace(id=chat_id))
+
+
+def test_waiting_on_chat_lock_does_not_hold_a_slot():
+    async def main():
+        processor = ChatOrderedProcessor(max_concurrent_updates=2)
+        release = asyncio.Event()
+        done = []
+
+        async def handler(name, wait=False):
+            if wait:
+                await release.wait()
+            done.append(name)
+
+        # Chat 1 sends a burst: the first update blocks, the rest queue on the lock
+        tasks = [asyncio.create_task(processor.process_update(update(1), handler('a1', wait=True)))]
+        tasks += [asyncio.create_task(processor.process_update(update(1), handler(f'a{i}'))) for i in (2, 3)]
+        await asyncio.sleep(0)
+        # ... which must not stop chat 2 from being handled
+        await asyncio.wait_for(processor.process_update(update(2), handler('b1')), 1)
+        assert done == ['b1']
+
+        release.set()
+        await asyncio.gather(*tasks)
+        assert done == ['b1', 'a1', 'a2', 'a3']
+        assert processor._chats == {}
+
+    asyncio.run(main())
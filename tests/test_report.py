@@ -0,0 +1,69 @@
+"""
+test_report.py
+cohort_report against numbers worked out by hand.
+"""
+
+import numpy as np
+
+from report import cohort_report, column_quantiles, format_report, lectures_needed, load_matrix
+
+
+def att(**subjects) -> dict:
+    return {name: {'present': p, 'total': t} for name, (p, t) in subjects.items()}
+
+
+ROWS = [
+    ('1', 'a', att(OS=(3, 4), DBMS=(10, 10))),
+    ('2', 'b', att(OS=(1, 4), DBMS=(10, 10))),
+    ('3', 'c', att(OS=(4, 4), DBMS=(10, 10))),
+    ('4', 'd', att(OS=(2, 4))),  # not enrolled in DBMS
+]
+
+
+def test_lectures_needed():
+    # (1 + 8) / (4 + 8) = 75%, (2 + 4) / (4 + 4) = 75%
+    assert lectures_needed(np.array([1, 2, 3, 4]), np.array([4, 4, 4, 4]), 75).tolist() == [8, 4, 0, 0]
+    # (3 + 1) / (4 + 1) = 80%
+    assert lectures_needed(np.array([3]), np.array([4]), 80).tolist() == [1]
+
+
+def test_column_quantiles_skip_missing():
+    values = np.array([[25.0, 100.0], [50.0, np.nan], [75.0, np.nan], [100.0, np.nan]])
+    p10, median, p90 = column_quantiles(values, np.array([4, 1]), (0.1, 0.5, 0.9))
+    assert p10.tolist() == [32.5, 100.0]
+    assert median.tolist() == [62.5, 100.0]
+    assert p90.tolist() == [92.5, 100.0]
+
+
+def test_cohort_report():
+    report = cohort_report(load_matrix(ROWS), threshold=75)
+    subjects = {row['subject']: row for row in report['subjects']}
+
+    assert subjects['OS'] == {
+        'subject': 'OS', 'students': 4, 'mean': 62.5, 'p10': 32.5, 'median': 62.5, 'p90': 92.5,
+        'below': 2, 'below_share': 0.5, 'lectures_needed': 12,
+    }
+    # Everyone already at 100%
+    assert subjects['DBMS'] == {
+        'subject': 'DBMS', 'students': 3, 'mean': 100.0, 'p10': 100.0, 'median': 100.0, 'p90': 100.0,
+        'below': 0, 'below_share': 0.0, 'lectures_needed': 0,
+    }
+    assert [row['subject'] for row in report['subjects']] == ['OS', 'DBMS']
+
+    # Overall: a 13/14, b 11/14, c 14/14, d 2/4
+    assert report['users'] == 4
+    assert report['below_overall'] == 1
+    assert report['below_any'] == 2
+    at_risk = report['at_risk']
+    assert at_risk['username'].tolist() == ['b', 'd']
+    assert at_risk['needed'].tolist() == [8, 4]
+    assert at_risk['pct'].tolist() == [25.0, 50.0]
+
+
+def test_empty_cohort():
+    report = cohort_report(load_matrix([]), threshold=75)
+    assert report['users'] == 0
+    assert report['subjects'] == []
+    assert report['below_overall'] == 0 and report['below_any'] == 0
+    assert len(report['at_risk']['chat_id']) == 0
+    assert format_report(report) == 'No users registered yet.'
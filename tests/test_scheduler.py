@@ -0,0 +1,45 @@
+"""
+test_scheduler.py
+PollScheduler queue handling.
+"""
+
+from scheduler import PollScheduler
+
+
+def test_requeue_keeps_due_time():
+    poller = PollScheduler()
+    poller.sync(['a', 'b'], now=1000.0)
+    due = {chat_id: state['due'] for chat_id, state in poller.users.items()}
+
+    popped = poller.pop_due(now=10 ** 6)
+    assert sorted(popped) == ['a', 'b']
+    poller.requeue('a')
+    poller.record('b', changed=False, now=10 ** 6)
+
+    assert poller.users['a']['due'] == due['a']
+    assert poller.users['a']['polls'] == 0
+    assert poller.users['b']['due'] > 10 ** 6
+    assert poller.pop_due(now=10 ** 6) == ['a']
+
+
+def test_requeue_ignores_users_not_in_flight():
+    poller = PollScheduler()
+    poller.sync(['a'], now=1000.0)
+    due = poller.users['a']['due']
+    poller.requeue('a')
+    poller.requeue('gone')
+    assert poller.users['a']['due'] == due
+
+
+def test_pop_promoted_only_takes_classmates():
+    poller = PollScheduler()
+    poller.sync(['a', 'b', 'c'], now=1000.0)
+    for chat_id in ('a', 'b'):
+        poller.set_cohort(chat_id, {'OS': {}, 'DBMS': {}})
+    poller.set_cohort('c', {'Maths': {}})
+
+    assert poller.pop_promoted() == []
+    assert poller.promote_cohort('a', now=2000.0) == ['b']
+    assert poller.pop_promoted() == ['b']
+    assert poller.users['b']['due'] == float('inf')
+    assert poller.pop_promoted() == []
@@ -0,0 +1,115 @@
+"""
+test_shards.py
+ShardLeases against a real UserStore, and the leader's outbox delivery.
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from shards import ShardLeases
+from store import UserStore
+
+
+def leases(store, name: str, shard_count: int = 4) -> ShardLeases:
+    return ShardLeases(store, shard_count=shard_count, instance_id=name, ttl=10)
+
+
+def test_expired_leases_are_taken_over(tmp_path):
+    store = UserStore(tmp_path / 'users.db')
+    a, b = leases(store, 'a'), leases(store, 'b')
+
+    assert a.renew(now=1000) is True
+    assert a.owned == {0, 1, 2, 3}
+    # Everything is still leased to a
+    assert b.renew(now=1001) is False
+    assert b.owned == set()
+
+    # a stops renewing; once its leases lapse b takes everything, leadership too
+    assert b.renew(now=1020) is True
+    assert b.owned == {0, 1, 2, 3}
+    assert b.instances == 1
+
+
+def test_busy_shards_are_kept_above_share(tmp_path):
+    store = UserStore(tmp_path / 'users.db')
+    a, b = leases(store, 'a'), leases(store, 'b')
+    a.renew(now=1000)
+    b.renew(now=1001)  # registers b, so a's share drops to 2
+
+    a.renew(busy={0, 1, 2}, now=1002)
+    assert a.owned == {0, 1, 2}  # only the idle shard went back
+    b.renew(now=1003)
+    assert b.owned == {3}
+
+    a.renew(now=1004)  # the polls finished
+    assert len(a.owned) == 2
+    b.renew(now=1005)
+    assert a.owned.isdisjoint(b.owned) and len(a.owned | b.owned) == 4
+
+
+def test_busy_read_after_renewal(tmp_path):
+    # A user popped while the renewal ran in its thread keeps their shard
+    store = UserStore(tmp_path / 'users.db')
+    a, b = leases(store, 'a'), leases(store, 'b')
+    a.renew()
+    b.renew()
+    busy: set = set()
+    a.busy_shards = lambda: busy
+    renew_leases = a._renew_leases
+
+    def renew_then_pop(now=None):
+        result = renew_leases(now)
+        busy.update(a.owned)  # a batch popped a user from every shard meanwhile
+        return result
+
+    a._renew_leases = renew_then_pop
+    asyncio.run(a._renew())
+    assert a.owned == {0, 1, 2, 3}
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent: list = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        self.sent.append(chat_id)
+
+
+class FakeUpdater:
+    async def start_polling(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+def test_outbox_delivered_exactly_once():
+    import bot
+
+    bot.users_store.upsert({'chat_id': '77', 'username': 'u77', 'password': 'p'})
+    # Pushed by another instance sharing the database
+    follower = UserStore(bot.USERS_DB)
+    snapshot = {'OS': {'present': 2, 'total': 3}}
+    follower.push_outbox('77', [{
+        'subject': 'OS',
+        'old': {'present': 1, 'total': 2},
+        'current': {'present': 2, 'total': 3},
+    }], snapshot)
+
+    fake = FakeBot()
+    context = SimpleNamespace(application=SimpleNamespace(bot=fake, updater=FakeUpdater()))
+
+    async def main():
+        bot.notifier.start(fake)
+        for _ in range(3):
+            await bot.drain_outbox(context)
+            await asyncio.sleep(0.1)
+        await bot.notifier.stop()
+        await bot.flush_delivered(context)
+        await bot.drain_outbox(context)  # nothing left to queue
+        await bot._set_leading(context.application, False)
+
+    asyncio.run(main())
+    assert fake.sent == [77]
+    assert follower.read_outbox() == []
+    assert follower.get('77')['lastAttendance'].to_dict() == snapshot
@@ -0,0 +1,35 @@
+"""
+test_snapshot.py
+The subject intern table under concurrent use.
+"""
+
+import threading
+
+from snapshot import Snapshot, intern_subject, subject_name
+
+
+def test_intern_subject_from_threads():
+    names = [f'Threaded Subject {i}' for i in range(200)]
+    start = threading.Barrier(8)
+    results = []
+
+    def intern_all():
+        start.wait()
+        results.append([intern_subject(name) for name in names])
+
+    threads = [threading.Thread(target=intern_all) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(ids == results[0] for ids in results)
+    assert len(set(results[0])) == len(names)
+    assert [subject_name(i) for i in results[0]] == names
+
+
+def test_snapshot_round_trip():
+    attendance = {'Operating Systems': {'present': 12, 'total': 15}}
+    snapshot = Snapshot.from_json(Snapshot.from_dict(attendance).to_json())
+    assert snapshot.to_dict() == attendance
+    assert snapshot['Operating Systems'] == {'present': 12, 'total': 15}
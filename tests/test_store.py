@@ -0,0 +1,64 @@
+"""
+test_store.py
+UserStore: buffered deliveries, and the delta-encoded attendance history.
+"""
+
+from store import UserStore
+
+
+def make_store(tmp_path) -> UserStore:
+    store = UserStore(tmp_path / 'users.db')
+    for chat_id in ('1', '2'):
+        store.upsert({'chat_id': chat_id, 'username': f'u{chat_id}', 'password': 'p'})
+    return store
+
+
+def test_delivered_visible_before_flush(tmp_path):
+    store = make_store(tmp_path)
+    store.push_outbox('1', [], {'OS': {'present': 1, 'total': 2}})
+    outbox_id = store.read_outbox()[0][0]
+
+    store.mark_delivered('1', {'OS': {'present': 1, 'total': 2}}, outbox_id)
+    store.mark_delivered('2', {'OS': {'present': 3, 'total': 4}})
+    assert store.get('1')['lastAttendance'].to_dict() == {'OS': {'present': 1, 'total': 2}}
+
+    # Nothing written yet: another connection still sees the old rows
+    other = UserStore(tmp_path / 'users.db')
+    assert other.get('2')['lastAttendance'].to_dict() == {}
+    assert len(other.read_outbox()) == 1
+
+    assert store.flush_delivered() == 2
+    assert other.get_many(['1', '2'])['2']['lastAttendance'].to_dict() == {'OS': {'present': 3, 'total': 4}}
+    assert other.read_outbox() == []
+    assert store.flush_delivered() == 0
+
+
+def test_delete_drops_buffered_delivery(tmp_path):
+    store = make_store(tmp_path)
+    store.mark_delivered('1', {'OS': {'present': 1, 'total': 2}})
+    store.delete('1')
+    assert store.flush_delivered() == 0
+    assert store.get('1') is None
+
+
+def counts(present: int, total: int) -> dict:
+    return {'present': present, 'total': total}
+
+
+def test_history_stores_only_changed_subjects(tmp_path):
+    store = make_store(tmp_path)
+    assert store.record_history('1', {'OS': counts(1, 2), 'CN': counts(3, 3)}, ts=100) == 2
+    assert store.record_history('1', {'OS': counts(1, 2), 'CN': counts(3, 3)}, ts=200) == 0
+    assert store.record_history('1', {'OS': counts(2, 3), 'CN': counts(3, 3)}, ts=300.7) == 1
+    store.checkpoint_poll('1', {'due': 0, 'interval': 60, 'unchanged': 0, 'polls': 1},
+                          {'OS': counts(2, 4), 'CN': counts(4, 4)}, fetched_at=400)
+
+    assert store.history('1', subject='OS') == [
+        {'subject': 'OS', 'ts': 400, 'present': 2, 'total': 4, 'old': counts(2, 3)},
+        {'subject': 'OS', 'ts': 300, 'present': 2, 'total': 3, 'old': counts(1, 2)},
+        {'subject': 'OS', 'ts': 100, 'present': 1, 'total': 2, 'old': None},
+    ]
+    assert sorted(store.trend('1'), key=lambda entry: entry['subject']) == [
+        {'subject': 'CN', 'since': 100, 'first': counts(3, 3), 'last': counts(4, 4)},
+        {'subject': 'OS', 'since': 100, 'first': counts(1, 2), 'last': counts(2, 4)},
+    ]
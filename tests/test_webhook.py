@@ -0,0 +1,63 @@
+"""
+test_webhook.py
+The webhook handler's secret check and payload validation.
+"""
+
+import asyncio
+
+import aiohttp
+import pytest
+
+from benchmarks.bench_pipeline import _free_port
+from webhook import SECRET_HEADER, serve
+
+SECRET = 'test-secret'
+
+
+class FakeApp:
+    bot = None
+
+    def __init__(self):
+        self.update_queue = asyncio.Queue()
+
+
+def post(payloads: list, secret: str = SECRET) -> tuple:
+    """POSTs each raw body to a fresh webhook server; returns (statuses, queued updates)."""
+    async def main():
+        app = FakeApp()
+        port = _free_port()
+        runner = await serve(app, port=port, secret=secret)
+        statuses = []
+        try:
+            async with aiohttp.ClientSession() as session:
+                for body in payloads:
+                    async with session.post(
+                        f'http://127.0.0.1:{port}/telegram',
+                        data=body,
+                        headers={SECRET_HEADER: SECRET, 'Content-Type': 'application/json'},
+                    ) as response:
+                        statuses.append(response.status)
+        finally:
+            await runner.cleanup()
+        return statuses, app.update_queue.qsize()
+
+    return asyncio.run(main())
+
+
+def test_accepts_update():
+    statuses, queued = post(['{"update_id": 1}'])
+    assert statuses == [200]
+    assert queued == 1
+
+
+@pytest.mark.parametrize('body', ['[]', '"x"', '1', 'null', '{}', 'not json'])
+def test_rejects_bad_payload(body):
+    statuses, queued = post([body])
+    assert statuses == [400]
+    assert queued == 0
+
+
+def test_rejects_wrong_secret():
+    statuses, queued = post(['{"update_id": 1}'], secret='other')
+    assert statuses == [403]
+    assert queued == 0
@@ -0,0 +1,78 @@
+"""
+test_workers.py
+Scrape worker processes against benchmarks.mock_erp.
+"""
+
+import asyncio
+
+from metrics import Metrics, metrics
+from snapshot import Snapshot
+from workers import ScrapeWorkerPool
+
+
+def test_metrics_drain_and_merge():
+    child, parent = Metrics(enabled=True), Metrics(enabled=True)
+    child.inc('scrapes_total', engine='http', result='ok')
+    child.observe('stage_seconds', 0.2, stage='http_login')
+    parent.inc('scrapes_total', engine='http', result='ok')
+    parent.observe('stage_seconds', 0.3, stage='http_login')
+
+    parent.merge(child.drain())
+    assert child.drain() == ({}, {})
+    assert parent.counter('scrapes_total', engine='http', result='ok') == 2
+    data = parent._histograms['stage_seconds'][(('stage', 'http_login'),)]
+    assert data[-1] == 2 and abs(data[-2] - 0.5) < 1e-9
+
+
+def test_worker_results_and_metrics(erp, monkeypatch):
+    # Read by the worker process when it imports browser.py
+    monkeypatch.setenv('SCRAPE_ENGINE', 'http')
+    ok_before = metrics.counter('scrapes_total', engine='http', result='ok')
+    failed_before = metrics.counter('scrape_failures_total', engine='http', type='LoginFailed')
+
+    async def main():
+        pool = ScrapeWorkerPool(size=1)
+        await pool.start()
+        try:
+            attendance = await pool.scrape('worker-user', 'pass')
+            rejected = await pool.login_and_fetch('worker-intruder', 'wrong')
+            failure = (await asyncio.gather(pool.scrape('worker-intruder', 'wrong'), return_exceptions=True))[0]
+        finally:
+            await pool.stop()
+        return attendance, rejected, failure
+
+    attendance, rejected, failure = asyncio.run(main())
+    assert isinstance(attendance, Snapshot)
+    assert attendance.to_dict() == {
+        subject: {'present': present, 'total': total}
+        for subject, (present, total) in erp._user_attendance('worker-user').items()
+    }
+    assert rejected is None
+    assert failure.kind == 'LoginFailed'
+
+    # Recorded in the worker, merged in here
+    assert metrics.counter('scrapes_total', engine='http', result='ok') == ok_before + 1
+    assert metrics.counter('scrape_failures_total', engine='http', type='LoginFailed') == failed_before + 1
+    assert metrics.counter('verify_total', result='rejected') >= 1
+
+
+def test_restarted_worker_gets_fresh_queues(erp, monkeypatch):
+    monkeypatch.setenv('SCRAPE_ENGINE', 'http')
+
+    async def main():
+        pool = ScrapeWorkerPool(size=1)
+        await pool.start()
+        try:
+            old = pool._workers[0]
+            old['process'].kill()
+            await pool._restart(0, 'test')
+            new = pool._workers[0]
+            attendance = await pool.scrape('worker-user', 'pass')
+        finally:
+            await pool.stop()
+        return old, new, attendance
+
+    old, new, attendance = asyncio.run(main())
+    assert new['results'] is not old['results'] and new['jobs'] is not old['jobs']
+    assert not old['reader'].is_alive()
+    assert isinstance(attendance, Snapshot)
@@ -0,0 +1,90 @@
+"""
+webhook.py
+Webhook mode: Telegram pushes updates to a small aiohttp server instead of
+the bot long-polling getUpdates.
+
+    BOT_MODE=webhook WEBHOOK_URL=https://bot.example.com python bot.py
+
+Every POST to WEBHOOK_PATH must carry the X-Telegram-Bot-Api-Secret-Token
+header Telegram was given in setWebhook; anything else gets a 403. Valid
+payloads are turned into Update objects and put straight on the
+Application's update queue, so handlers run exactly as in polling mode.
+
+Without WEBHOOK_URL the server still starts but setWebhook is skipped,
+which is how to test locally: POST update JSON to
+http://127.0.0.1:WEBHOOK_PORT/WEBHOOK_PATH with the secret header.
+"""
+
+import hmac
+import json
+import logging
+import os
+import secrets
+
+from aiohttp import web
+from telegram import Update
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip('/')  # public https base URL
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# A fresh secret per start is fine: setWebhook re-registers it every time
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+logger = logging.getLogger(__name__)
+
+
+def _make_handler(app, secret: str):
+    async def handle(request: web.Request) -> web.Response:
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token, secret):
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            if not isinstance(data, dict):
+                raise TypeError(f'expected a JSON object, got {type(data).__name__}')
+            update = Update.de_json(data, app.bot)
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            logger.warning(f"[Webhook] Bad update payload: {e}")
+            return web.Response(status=400)
+
+        await app.update_queue.put(update)
+        return web.Response()
+
+    return handle
+
+
+async def serve(
+    app,
+    host: str = WEBHOOK_LISTEN,
+    port: int = WEBHOOK_PORT,
+    path: str = WEBHOOK_PATH,
+    secret: str = WEBHOOK_SECRET,
+) -> web.AppRunner:
+    """Start the webhook server and register it with Telegram (if WEBHOOK_URL is set)."""
+    server = web.Application()
+    server.router.add_post(path, _make_handler(app, secret))
+    runner = web.AppRunner(server, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host, port).start()
+    except OSError:
+        await runner.cleanup()
+        raise
+    logger.info(f"[Webhook] Listening on http://{host}:{port}{path}")
+
+    if WEBHOOK_URL:
+        await app.bot.set_webhook(
+            url=WEBHOOK_URL + path,
+            secret_token=secret,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        logger.info(f"[Webhook] Registered {WEBHOOK_URL + path} with Telegram.")
+    else:
+        logger.warning("[Webhook] WEBHOOK_URL not set, not calling setWebhook (local mode).")
+    return runner
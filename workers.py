@@ -0,0 +1,312 @@
+"""
+workers.py
+Scrape worker processes, so scraping can use more than one core.
+
+With SCRAPE_WORKERS=N (> 0) the bot starts N processes, each with its own
+event loop, browser pool and HTTP pool, and dispatches scrape jobs to the
+least busy one. Results come back as snapshot.Snapshots (they pickle as
+their compact array); failures come back as ScrapeWorkerError carrying the
+original exception type name. Every reply also carries the metrics the
+worker recorded since its last one, which the parent merges into its own.
+
+Each worker has its own job and result queue, read by its own thread in
+the parent, so a worker killed halfway through a put can only wedge its
+own queue. The parent pings every worker every WORKER_HEALTH_INTERVAL_SECONDS.
+A worker that died or stopped answering is terminated (killed if it won't
+exit) and replaced with fresh queues, and the jobs it was holding fail
+with WorkerCrashed so callers can retry.
+
+SCRAPE_WORKERS=0 (default) keeps scraping in the bot process.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import queue
+import threading
+
+import http_engine
+from browser import SCRAPE_ENGINE, login_and_fetch, scrape_attendance
+from memwatch import MemoryWatchdog
+from metrics import metrics
+from pool import POOL_SIZE, browser_pool
+
+# ─── Config ──────────────────────────────────────────────────────────────────
+
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", "0"))
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", str(POOL_SIZE)))
+WORKER_HEALTH_INTERVAL_SECONDS = int(os.getenv("WORKER_HEALTH_INTERVAL_SECONDS", "10"))
+WORKER_PING_TIMEOUT_SECONDS = int(os.getenv("WORKER_PING_TIMEOUT_SECONDS", "15"))
+WORKER_TERMINATE_TIMEOUT_SECONDS = int(os.getenv("WORKER_TERMINATE_TIMEOUT_SECONDS", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeWorkerError(Exception):
+    """A scrape failed inside a worker process."""
+
+    def __init__(self, kind: str, message: str):
+        super().__init__(f'{kind}: {message}')
+        self.kind = kind
+
+
+class WorkerCrashed(ScrapeWorkerError):
+    def __init__(self, worker_id: int):
+        super().__init__('WorkerCrashed', f'scrape worker {worker_id} died')
+
+
+# ─── Child process ───────────────────────────────────────────────────────────
+
+# Job kind -> coroutine function run in the worker with (username, password)
+JOBS = {
+    'scrape': scrape_attendance,
+    'login': login_and_fetch,
+}
+
+
+def _worker_main(worker_id: int, jobs, results) -> None:
+    logging.basicConfig(
+        format=f"%(asctime)s - worker{worker_id} - %(name)s - %(levelname)s - %(message)s",
+        level=logging.INFO,
+    )
+    try:
+        asyncio.run(_worker_loop(worker_id, jobs, results))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _worker_loop(worker_id: int, jobs, results) -> None:
+    loop = asyncio.get_running_loop()
+    slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+    tasks: set = set()
+
+    async def run(job_id: int, fn, username: str, password: str) -> None:
+        async with slots:
+            try:
+                attendance = await fn(username, password)
+                results.put((job_id, worker_id, 'ok', attendance, metrics.drain()))
+            except Exception as e:
+                results.put((job_id, worker_id, 'error', (type(e).__name__, str(e)), metrics.drain()))
+
+    if SCRAPE_ENGINE == 'playwright':
+        await browser_pool.start()
+    watchdog = MemoryWatchdog(browser_pool, label=f'worker{worker_id}')
+    watchdog.start()
+    try:
+        while True:
+            job = await loop.run_in_executor(None, jobs.get)
+            if job is None:
+                break
+            kind, job_id, *args = job
+            if kind == 'ping':
+                results.put((job_id, worker_id, 'pong', None, metrics.drain()))
+                continue
+            task = asyncio.create_task(run(job_id, JOBS[kind], *args))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        await watchdog.stop()
+        await browser_pool.close()
+        await http_engine.close()
+
+
+# ─── Parent side ─────────────────────────────────────────────────────────────
+
+class ScrapeWorkerPool:
+    def __init__(self, size: int = SCRAPE_WORKERS):
+        self.size = size
+        self._ctx = mp.get_context('spawn')
+        self._workers: dict = {}   # worker_id -> { 'process', 'jobs', 'results', 'reader', 'stopped', 'pending': {job_id: future} }
+        self._job_ids = itertools.count()
+        self._loop = None
+        self._health_task = None
+        self.restarts = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._workers)
+
+    # ─── Lifecycle ───────────────────────────────────────────────────────────
+
+    async def start(self) -> None:
+        if self.size <= 0 or self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        for worker_id in range(self.size):
+            self._spawn(worker_id)
+
+        self._health_task = asyncio.create_task(self._health_loop())
+        logger.info(f"[Workers] Started {self.size} scrape worker process(es).")
+
+    async def stop(self, timeout: float = 30) -> None:
+        if not self.running:
+            return
+        if self._health_task is not None:
+            self._health_task.cancel()
+
+        for worker in self._workers.values():
+            worker['jobs'].put(None)
+        for worker_id, worker in list(self._workers.items()):
+            await self._loop.run_in_executor(None, worker['process'].join, timeout)
+            await self._reap(worker)
+            self._fail_pending(worker_id)
+        self._workers.clear()
+
+    def _spawn(self, worker_id: int) -> None:
+        jobs = self._ctx.Queue()
+        results = self._ctx.Queue()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, jobs, results),
+            name=f'scrape-worker-{worker_id}',
+            daemon=True,
+        )
+        process.start()
+        stopped = threading.Event()
+        reader = threading.Thread(
+            target=self._read_results,
+            args=(results, stopped),
+            name=f'scrape-results-{worker_id}',
+            daemon=True,
+        )
+        reader.start()
+        self._workers[worker_id] = {
+            'process': process, 'jobs': jobs, 'results': results,
+            'reader': reader, 'stopped': stopped, 'pending': {},
+        }
+
+    async def _reap(self, worker: dict) -> None:
+        """Make sure the worker's process is gone and stop reading its results."""
+        process = worker['process']
+        if process.is_alive():
+            process.terminate()
+            await self._loop.run_in_executor(None, process.join, WORKER_TERMINATE_TIMEOUT_SECONDS)
+        if process.is_alive():
+            process.kill()
+            await self._loop.run_in_executor(None, process.join, WORKER_TERMINATE_TIMEOUT_SECONDS)
+
+        worker['stopped'].set()
+        await self._loop.run_in_executor(None, worker['reader'].join, 2)
+        # The queues may be wedged by the dead process; never block on them
+        for q in (worker['jobs'], worker['results']):
+            q.cancel_join_thread()
+            q.close()
+
+    def _fail_pending(self, worker_id: int) -> None:
+        worker = self._workers.get(worker_id)
+        if worker is None:
+            return
+        for future in worker['pending'].values():
+            if not future.done():
+                future.set_exception(WorkerCrashed(worker_id))
+        worker['pending'].clear()
+
+    async def _restart(self, worker_id: int, reason: str) -> None:
+        worker = self._workers[worker_id]
+        logger.error(f"[Workers] Restarting worker {worker_id} ({reason}).")
+        self._fail_pending(worker_id)
+        await self._reap(worker)
+        self.restarts += 1
+        metrics.inc('worker_restarts_total')
+        self._spawn(worker_id)
+
+    # ─── Results ─────────────────────────────────────────────────────────────
+
+    def _read_results(self, results, stopped: threading.Event) -> None:
+        # Runs until _reap sets `stopped`; by then the worker has exited, so
+        # anything it managed to flush has already been read.
+        while True:
+            try:
+                message = results.get(timeout=0.5)
+            except queue.Empty:
+                if stopped.is_set():
+                    return
+                continue
+            except (EOFError, OSError, ValueError):
+                return
+            self._loop.call_soon_threadsafe(self._resolve, *message)
+
+    def _resolve(self, job_id: int, worker_id: int, status: str, payload, delta: tuple) -> None:
+        metrics.merge(delta)
+        worker = self._workers.get(worker_id)
+        if worker is None:
+            return
+        future = worker['pending'].pop(job_id, None)
+        if future is None or future.done():
+            return
+        if status == 'error':
+            future.set_exception(ScrapeWorkerError(*payload))
+        else:
+            future.set_result(payload)
+
+    def _submit(self, *job) -> tuple:
+        worker_id = min(self._workers, key=lambda w: len(self._workers[w]['pending']))
+        job_id = next(self._job_ids)
+        future = self._loop.create_future()
+        self._workers[worker_id]['pending'][job_id] = future
+        self._workers[worker_id]['jobs'].put((job[0], job_id, *job[1:]))
+        return worker_id, job_id, future
+
+    # ─── Health ──────────────────────────────────────────────────────────────
+
+    async def _health_loop(self) -> None:
+        while True:
+            await asyncio.sleep(WORKER_HEALTH_INTERVAL_SECONDS)
+            for worker_id in list(self._workers):
+                worker = self._workers[worker_id]
+                if not worker['process'].is_alive():
+                    await self._restart(worker_id, f"exit code {worker['process'].exitcode}")
+                    continue
+
+                job_id = next(self._job_ids)
+                future = self._loop.create_future()
+                worker['pending'][job_id] = future
+                worker['jobs'].put(('ping', job_id))
+                try:
+                    await asyncio.wait_for(future, WORKER_PING_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    worker['pending'].pop(job_id, None)
+                    await self._restart(worker_id, 'ping timeout')
+                except WorkerCrashed:
+                    pass
+
+    # ─── Public API ──────────────────────────────────────────────────────────
+
+    async def _run(self, kind: str, username: str, password: str):
+        worker_id, job_id, future = self._submit(kind, username, password)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # The worker still finishes the job; just stop tracking it
+            self._workers.get(worker_id, {}).get('pending', {}).pop(job_id, None)
+            raise
+
+    async def scrape(self, username: str, password: str) -> dict:
+        with metrics.timer('scrape_seconds', engine='worker'):
+            return await self._run('scrape', username, password)
+
+    async def login_and_fetch(self, username: str, password: str) -> dict | None:
+        return await self._run('login', username, password)
+
+
+# Shared instance, started from bot.post_init when SCRAPE_WORKERS > 0
+scrape_workers = ScrapeWorkerPool()
+
+
+async def dispatch_scrape(username: str, password: str) -> dict:
+    """Scrape in a worker process if the pool is running, else in this one."""
+    if scrape_workers.running:
+        return await scrape_workers.scrape(username, password)
+    return await scrape_attendance(username, password)
+
+
+async def dispatch_login_and_fetch(username: str, password: str) -> dict | None:
+    """browser.login_and_fetch, in a worker process if the pool is running."""
+    if scrape_workers.running:
+        return await scrape_workers.login_and_fetch(username, password)
+    return await login_and_fetch(username, password)